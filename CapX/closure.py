@@ -0,0 +1,85 @@
+class ClosureTableMixin:
+    """
+    Model mixin for the transitive closure of a self-referencing
+    many-to-many relation, such as the parents of a territory.
+
+    Subclasses define `ancestor` and `descendant` foreign keys to the node
+    model and a `depth` field, and name the relation in `parent_field`.
+    There is one row for every node and each of its ancestors, with the
+    length of the shortest path between them, plus a row of depth 0 from
+    each node to itself. Descendants of a node are then read with a single
+    indexed lookup on the ancestor.
+    """
+    parent_field = None
+
+    @classmethod
+    def node_model(cls):
+        return cls._meta.get_field('descendant').related_model
+
+    @classmethod
+    def rebuild(cls, node_ids=None):
+        """
+        Recompute the ancestor rows of the given nodes, or of all nodes when
+        None. The parent links are read with one query and walked in memory,
+        so cycles and several parents are handled.
+
+        Returns the IDs of the ancestors the nodes had before or have after
+        the change, or None when everything was rebuilt.
+        """
+        node_model = cls.node_model()
+        field = node_model._meta.get_field(cls.parent_field)
+        parents = {}
+        for child_id, parent_id in field.remote_field.through.objects.values_list(
+            field.m2m_field_name() + '_id', field.m2m_reverse_field_name() + '_id'
+        ):
+            parents.setdefault(child_id, []).append(parent_id)
+
+        if node_ids is None:
+            node_ids = list(node_model.objects.values_list('pk', flat=True))
+            cls.objects.all().delete()
+            affected = None
+        else:
+            previous = cls.objects.filter(descendant_id__in=node_ids)
+            affected = set(previous.values_list('ancestor_id', flat=True))
+            previous.delete()
+            node_ids = list(node_model.objects.filter(pk__in=node_ids).values_list('pk', flat=True))
+
+        rows = []
+        for node_id in node_ids:
+            # Breadth-first, so each ancestor is reached by its shortest path
+            depths = {node_id: 0}
+            level = [node_id]
+            while level:
+                next_level = []
+                for node in level:
+                    for parent_id in parents.get(node, []):
+                        if parent_id not in depths:
+                            depths[parent_id] = depths[node] + 1
+                            next_level.append(parent_id)
+                level = next_level
+            rows += [
+                cls(ancestor_id=ancestor_id, descendant_id=node_id, depth=depth)
+                for ancestor_id, depth in depths.items()
+            ]
+        cls.objects.bulk_create(rows, batch_size=1000)
+        if affected is not None:
+            affected.update(row.ancestor_id for row in rows)
+        return affected
+
+    @classmethod
+    def ancestors(cls, node_ids):
+        """
+        Return the IDs of the given nodes and of all their ancestors.
+        """
+        return set(node_ids) | set(
+            cls.objects.filter(descendant_id__in=node_ids).values_list('ancestor_id', flat=True)
+        )
+
+    @classmethod
+    def subtree(cls, node_ids):
+        """
+        Return the IDs of the given nodes and of all their descendants.
+        """
+        return set(node_ids) | set(
+            cls.objects.filter(ancestor_id__in=node_ids).values_list('descendant_id', flat=True)
+        )
@@ -0,0 +1,76 @@
+import hashlib
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    """
+    Viewset mixin answering conditional GET requests on list and retrieve.
+
+    The ETag and Last-Modified headers are derived from the `updated_at`
+    column (or `last_modified_field`), read with a single query before the
+    objects are loaded. When the client already has the current version
+    (If-None-Match or If-Modified-Since), a 304 response is returned without
+    serializing anything or touching the related tables.
+
+    Responses whose request was marked as provisional (part of their content,
+    such as Commons thumbnails, is still being resolved in the background)
+    are sent without validators, since they change without the column.
+    """
+    last_modified_field = 'updated_at'
+
+    def _validators(self, request, key, last_modified):
+        # The representation also depends on the URL (filters, cursor) and
+        # on the renderer chosen for the request
+        renderer = getattr(request, 'accepted_renderer', None)
+        tag = f'{request.get_full_path()}|{getattr(renderer, "format", "")}|{key}'
+        etag = quote_etag(hashlib.md5(tag.encode()).hexdigest())
+        # HTTP dates have a precision of one second
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return etag, timestamp
+
+    def _conditional(self, request, etag, timestamp, handler, *args, **kwargs):
+        not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if not_modified is not None:
+            return not_modified
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and not getattr(request, 'provisional_response', False):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        # Filtered once, as filters such as the full-text search run a query
+        queryset = self.filter_queryset(self.get_queryset())
+        state = queryset.order_by().aggregate(
+            last_modified=Max(self.last_modified_field), count=Count('pk')
+        )
+        etag, timestamp = self._validators(
+            request, f'{state["count"]}|{state["last_modified"]}', state['last_modified']
+        )
+        return self._conditional(request, etag, timestamp, lambda request: self._list(queryset))
+
+    def _list(self, queryset):
+        # ListModelMixin.list, on the queryset filtered above
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            state = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            ).values_list('pk', self.last_modified_field).first()
+        except (TypeError, ValueError, ValidationError):
+            state = None
+        if state is None:
+            # Let the regular path answer with 404
+            return super().retrieve(request, *args, **kwargs)
+        etag, timestamp = self._validators(request, f'{state[0]}|{state[1]}', state[1])
+        return self._conditional(request, etag, timestamp, super().retrieve, *args, **kwargs)
@@ -0,0 +1,115 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework.serializers import BaseSerializer
+from drf_spectacular.utils import OpenApiParameter, OpenApiTypes
+
+
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        required=False,
+        description='Comma-separated list of the fields to return. Defaults to all fields.',
+    ),
+    OpenApiParameter(
+        'omit',
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        required=False,
+        description='Comma-separated list of the fields not to return.',
+    ),
+]
+
+
+def sparse_fields(request, names):
+    """
+    Return the subset of the field names requested with the `fields` and
+    `omit` query parameters. Only read requests are trimmed, so writes
+    always validate every field.
+    """
+    names = set(names)
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return names
+    fields = request.query_params.get('fields')
+    omit = request.query_params.get('omit')
+    if fields:
+        names &= set(fields.split(','))
+    if omit:
+        names -= set(omit.split(','))
+    return names
+
+
+def is_sparse(request):
+    return request is not None and request.method in ('GET', 'HEAD') and \
+        bool(request.query_params.get('fields') or request.query_params.get('omit'))
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Serializer mixin dropping the fields left out by the `fields` and `omit`
+    query parameters.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if is_sparse(request):
+            for name in set(self.fields) - sparse_fields(request, self.fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsetViewMixin:
+    """
+    Viewset mixin trimming the queryset to the fields the serializer returns:
+    the columns of the other fields are deferred and their select_related
+    and prefetch_related lookups are dropped. Fields whose source is not a
+    model field leave the queryset untouched.
+    """
+
+    def sparse_queryset(self, queryset):
+        if not is_sparse(self.request):
+            return queryset
+
+        model = queryset.model
+        # The cursor of the pagination is read from the ordering fields
+        ordering = getattr(self, 'cursor_ordering', ())
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        columns = {model._meta.pk.name, *(field.lstrip('-') for field in ordering)}
+        relations = set()
+        for field in self.get_serializer().fields.values():
+            source = field.source.split('.')[0]
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                return queryset
+            if model_field.many_to_many:
+                relations.add(source)
+            elif model_field.concrete:
+                columns.add(source)
+                if model_field.is_relation and (isinstance(field, BaseSerializer) or '.' in field.source):
+                    relations.add(source)
+
+        prefetches = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if (lookup.prefetch_through if isinstance(lookup, Prefetch) else lookup).split('__')[0] in relations
+        ]
+        select = queryset.query.select_related
+        queryset = queryset.prefetch_related(None).prefetch_related(*prefetches)
+        if isinstance(select, dict):
+            paths = [
+                path for name, nested in select.items() if name in relations
+                for path in _select_related_paths(name, nested)
+            ]
+            # select_related() without arguments would follow every relation
+            queryset = queryset.select_related(None)
+            if paths:
+                queryset = queryset.select_related(*paths)
+        return queryset.only(*columns)
+
+
+def _select_related_paths(name, nested):
+    if not nested:
+        return [name]
+    return [path for child, grandchildren in nested.items() for path in _select_related_paths(f'{name}__{child}', grandchildren)]
@@ -150,6 +150,7 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_METADATA_CLASS': 'CapX.metadata.CustomMetadata',
+    'DEFAULT_PAGINATION_CLASS': 'CapX.pagination.OptionalCursorPagination',
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 REST_AUTH_SERIALIZERS = {
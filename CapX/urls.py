@@ -24,7 +24,7 @@ from skills.views import SkillViewSet, ListSkillViewSet, SkillByTypeViewSet
 from users.views import (
     ProfileViewSet, UsersViewSet, ListTerritoryViewSet, 
     ListLanguageViewSet, ListWikimediaProjectViewSet, 
-    UsersBySkillViewSet, UsersByTagViewSet, TerritoryViewSet
+    UsersBySkillViewSet, UsersByTagViewSet, TerritoryViewSet, TagSearchViewSet
 )
 from bugs.views import BugViewSet, AttachmentViewSet
 from orgs.views import OrganizationViewSet, ListOrganizationViewSet, OrganizationTypeViewSet
@@ -60,6 +60,7 @@ urlpatterns = [
     path('api-auth/', include("rest_framework.urls", namespace="rest_framework")),
     path('', include('social_django.urls')),
     path('api/login/', include('rest_social_auth.urls_knox')),
+    path('tags/search/', TagSearchViewSet.as_view({'get': 'list'}), name='tags_search'),
     path('tags/<str:tag_type>/<int:tag_id>/', UsersByTagViewSet.as_view({'get': 'list'}), name='tags'),
     path("schema/", SpectacularAPIView.as_view(), name="schema"),
     path("", SpectacularSwaggerView.as_view(url_name="schema"),name="swagger-ui",),
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0002_alter_bug_bug_type_alter_bug_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bug',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='attachment',
+            name='uploaded_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
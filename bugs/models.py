@@ -35,7 +35,7 @@ class Bug(models.Model):
         max_length=20, blank=True, default="to_do",
         help_text="Status of the bug (to be set by the staff)."
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -46,7 +46,7 @@ class Attachment(models.Model):
     file = models.FileField(
         upload_to='attachments/', null=True, blank=True
     )
-    uploaded_at = models.DateTimeField(auto_now_add=True)
+    uploaded_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -23,6 +23,7 @@ from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiPara
 )
 class BugViewSet(viewsets.ModelViewSet):
     serializer_class = BugSerializer
+    cursor_ordering = ('-created_at', '-pk')
 
     def get_queryset(self):
         user = self.request.user
@@ -105,6 +106,7 @@ class BugViewSet(viewsets.ModelViewSet):
 )
 class AttachmentViewSet(viewsets.ModelViewSet):
     serializer_class = AttachmentSerializer
+    cursor_ordering = ('-uploaded_at', '-pk')
 
     def get_queryset(self):
         user = self.request.user
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_alter_eventorganizations_organization_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='events',
+            name='time_begin',
+            field=models.DateTimeField(db_index=True, help_text='Start time of the event.', verbose_name='Start Time'),
+        ),
+        migrations.AlterField(
+            model_name='eventparticipant',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, help_text='Time when the participation was created.'),
+        ),
+        migrations.AlterField(
+            model_name='eventorganizations',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, help_text='Time when the participation was created.'),
+        ),
+    ]
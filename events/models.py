@@ -1,7 +1,11 @@
 from django.db import models
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
 from users.models import Profile, CustomUser
 from django.conf import settings
 from orgs.models import Organization
+from skills.models import Skill
 from django.core.validators import RegexValidator
 
 
@@ -47,6 +51,7 @@ class Events(models.Model):
         )]
     )
     time_begin = models.DateTimeField(
+        db_index=True,
         verbose_name="Start Time",
         help_text="Start time of the event."
     )
@@ -126,6 +131,7 @@ class EventParticipant(models.Model):
     )
     created_at = models.DateTimeField(
         auto_now_add=True,
+        db_index=True,
         help_text="Time when the participation was created."
     )
     updated_at = models.DateTimeField(
@@ -167,6 +173,7 @@ class EventOrganizations(models.Model):
     )
     created_at = models.DateTimeField(
         auto_now_add=True,
+        db_index=True,
         help_text="Time when the participation was created."
     )
     updated_at = models.DateTimeField(
@@ -175,4 +182,33 @@ class EventOrganizations(models.Model):
     )
 
     def __str__(self):
-        return f"{self.organization} - {self.event}"
\ No newline at end of file
+        return f"{self.organization} - {self.event}"
+
+
+def touch_event(event_id):
+    # Participants, organizations and skills are serialized inside the event
+    Events.objects.filter(pk=event_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=EventParticipant)
+@receiver(post_delete, sender=EventParticipant)
+@receiver(post_save, sender=EventOrganizations)
+@receiver(post_delete, sender=EventOrganizations)
+def touch_event_participation(sender, instance, **kwargs):
+    touch_event(instance.event_id)
+
+
+@receiver(m2m_changed, sender=Events.related_skills.through)
+def touch_event_skills(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        touch_event(instance.pk)
+    elif reverse and action in ('post_add', 'post_remove') and pk_set:
+        Events.objects.filter(pk__in=pk_set).update(updated_at=timezone.now())
+    elif reverse and action == 'pre_clear':
+        Events.objects.filter(related_skills=instance).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Skill)
+def touch_skill_events(sender, instance, **kwargs):
+    # Deleting a skill removes it from the events without m2m_changed
+    Events.objects.filter(related_skills=instance).update(updated_at=timezone.now())
@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from .models import Events, EventParticipant, EventOrganizations
+from CapX.fieldsets import SparseFieldsetSerializerMixin
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Events
         fields = '__all__'
@@ -1,11 +1,14 @@
 from django.contrib.auth.models import User
 from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
 from events.models import Events, EventParticipant, EventOrganizations
 from events.serializers import EventParticipantSerializer
 from users.models import CustomUser
 from orgs.models import Organization, OrganizationType
+from skills.models import Skill
 import secrets
 
 class EventViewSetTests(TestCase):
@@ -32,6 +35,62 @@ class EventViewSetTests(TestCase):
         response = self.client.get('/events/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_list_events_paginated_by_start_time(self):
+        Events.objects.create(
+            name='Earlier Event',
+            type_of_location='virtual',
+            time_begin='2021-01-10 10:00:00+00:00',
+            time_end='2021-01-10 12:00:00+00:00',
+        )
+        response = self.client.get('/events/?page_size=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([event['name'] for event in response.data['results']], ['Earlier Event'])
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([event['name'] for event in response.data['results']], ['Test Event'])
+        self.assertIsNone(response.data['next'])
+
+    def test_retrieve_event_not_modified(self):
+        url = f'/events/{self.event.id}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        EventParticipant.objects.create(event=self.event, participant=self.regular_user, role='volunteer')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_event_modified_by_skill_deletion(self):
+        skill = Skill.objects.create(skill_wikidata_item='Q28865')
+        self.event.related_skills.add(skill)
+        url = f'/events/{self.event.id}/'
+        etag = self.client.get(url)['ETag']
+
+        skill.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['related_skills'], [])
+
+    def test_retrieve_event_not_found(self):
+        response = self.client.get('/events/0/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_events_sparse_fieldset(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/events/', {'fields': 'id,name,time_begin'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'time_begin'})
+        # The related tables are not read
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('events_eventparticipant', sql)
+        self.assertNotIn('events_events_related_skills', sql)
+        self.assertNotIn('"type_of_location"', sql)
+
+        response = self.client.get('/events/', {'omit': 'team,organizations'})
+        self.assertIn('related_skills', response.data[0])
+        self.assertNotIn('team', response.data[0])
+
     def test_create_event(self):
         response = self.client.post('/events/', {
             'name': 'New Event',
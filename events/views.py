@@ -2,25 +2,33 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
 from .models import Events, EventParticipant, EventOrganizations
 from .serializers import EventSerializer, EventParticipantSerializer, EventOrganizationsSerializer
+from CapX.conditional import ConditionalGetMixin
+from CapX.fieldsets import SparseFieldsetViewMixin, SPARSE_FIELDSET_PARAMETERS
 from drf_spectacular.utils import extend_schema, extend_schema_view
 
 @extend_schema_view(
     list=extend_schema(
         summary='List events.',
-        description='This endpoint lists all events.'
+        description='This endpoint lists all events.',
+        parameters=SPARSE_FIELDSET_PARAMETERS
     ),
     retrieve=extend_schema(
         summary='Retrieve an event.',
-        description='This endpoint retrieves an event.'
+        description='This endpoint retrieves an event.',
+        parameters=SPARSE_FIELDSET_PARAMETERS
     ),
     create=extend_schema(
         summary='Create an event.',
         description='This endpoint creates an event.'
     )
 )
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Events.objects.all()
     serializer_class = EventSerializer
+    cursor_ordering = ('time_begin', 'pk')
+
+    def get_queryset(self):
+        return self.sparse_queryset(Events.objects.prefetch_related('team', 'organizations', 'related_skills'))
 
     @extend_schema(
         summary='Update an event.',
@@ -67,6 +75,7 @@ class EventViewSet(viewsets.ModelViewSet):
 class EventParticipantViewSet(viewsets.ModelViewSet):
     queryset = EventParticipant.objects.all()
     serializer_class = EventParticipantSerializer
+    cursor_ordering = ('-created_at', '-pk')
     
     # On retrieve, only the field confirmed_organizer and confirmed_participant are editable
     @extend_schema(
@@ -177,6 +186,7 @@ class EventParticipantViewSet(viewsets.ModelViewSet):
 class EventOrganizationsViewSet(viewsets.ModelViewSet):
     queryset = EventOrganizations.objects.all()
     serializer_class = EventOrganizationsSerializer
+    cursor_ordering = ('-created_at', '-pk')
     
     # On retrieve, only the field confirmed_organizer and confirmed_organization are editable
     @extend_schema(
@@ -1,11 +1,16 @@
 from rest_framework import serializers
 from orgs.models import Organization, OrganizationType
 from users.models import CustomUser
+from CapX.fieldsets import SparseFieldsetSerializerMixin
+from users.commons import CommonsThumbnailField, CommonsThumbnailListSerializer
 
     
-class OrganizationSerializer(serializers.ModelSerializer):
+class OrganizationSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    profile_image_thumbnail = CommonsThumbnailField(source='profile_image')
+
     class Meta:
         model = Organization
+        list_serializer_class = CommonsThumbnailListSerializer
         fields = '__all__'
         read_only_fields = ['creation_date']
 
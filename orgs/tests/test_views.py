@@ -188,6 +188,42 @@ class OrganizationViewSetTestCase(APITestCase):
         response = self.client.delete('/organizations/1/')
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+class OrganizationTerritoryFilterTestCase(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)), is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        organization_type = OrganizationType.objects.create(type_name='Type 1', type_code='TYPE1')
+        self.america = Territory.objects.create(territory_name='South America')
+        self.brazil = Territory.objects.create(territory_name='Brazil')
+        self.brazil.parent_territory.add(self.america)
+        self.organization = Organization.objects.create(display_name='WMB', type=organization_type)
+        self.organization.territory.add(self.brazil)
+
+    def test_list_by_territory(self):
+        response = self.client.get('/organizations/', {'territory': self.brazil.pk})
+        self.assertEqual([org['id'] for org in response.data], [self.organization.pk])
+
+        response = self.client.get('/organizations/', {'territory': self.america.pk})
+        self.assertEqual(response.data, [])
+
+    def test_list_by_territory_with_descendants(self):
+        response = self.client.get('/organizations/', {'territory': self.america.pk, 'include_descendants': 'true'})
+        self.assertEqual([org['id'] for org in response.data], [self.organization.pk])
+
+    def test_retrieve_sparse_fieldset(self):
+        response = self.client.get(f'/organizations/{self.organization.pk}/', {'fields': 'id,display_name'})
+        self.assertEqual(response.data, {'id': self.organization.pk, 'display_name': 'WMB'})
+
+        response = self.client.get(f'/organizations/{self.organization.pk}/', {'omit': 'managers'})
+        self.assertEqual(response.data['territory'], ['Brazil'])
+        self.assertNotIn('managers', response.data)
+
+    def test_list_by_invalid_territory(self):
+        response = self.client.get('/organizations/', {'territory': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class ListOrganizationsViewSetTestCase(APITestCase):
     def setUp(self):
         self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)))
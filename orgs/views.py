@@ -2,8 +2,10 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
 from .models import Organization, OrganizationType
 from .serializers import OrganizationSerializer, OrganizationTypeSerializer
-from users.models import CustomUser as User, Territory
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
+from users.models import CustomUser as User, Territory, TerritoryClosure
+from users.taxonomy import CachedTaxonomyListMixin
+from CapX.fieldsets import SparseFieldsetViewMixin, SPARSE_FIELDSET_PARAMETERS
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiTypes
 
 @extend_schema_view(
     list=extend_schema(
@@ -19,27 +21,68 @@ from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiPara
         description='This endpoint deletes an organization by its ID. Only staff members can delete organizations.',
     ),
 )
-class OrganizationViewSet(viewsets.ModelViewSet):
+class OrganizationViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Organization.objects.all()
     serializer_class = OrganizationSerializer
 
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Organization.objects.all()
+            queryset = Organization.objects.all()
         else:
-            return Organization.objects.filter(managers__isnull=False)
+            queryset = Organization.objects.filter(managers__isnull=False)
+        queryset = queryset.prefetch_related('territory', 'managers')
+
+        territory = self.request.query_params.get('territory')
+        if self.action == 'list' and territory:
+            if self.request.query_params.get('include_descendants', 'false').lower() in ('true', '1'):
+                descendants = TerritoryClosure.objects.filter(ancestor_id=territory).values('descendant_id')
+                queryset = queryset.filter(pk__in=Organization.territory.through.objects.filter(
+                    territory_id__in=descendants
+                ).values('organization_id'))
+            else:
+                queryset = queryset.filter(territory=territory)
+        return self.sparse_queryset(queryset)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'territory',
+                OpenApiTypes.INT,
+                OpenApiParameter.QUERY,
+                required=False,
+                description='Only list the organizations of this territory.',
+            ),
+            OpenApiParameter(
+                'include_descendants',
+                OpenApiTypes.BOOL,
+                OpenApiParameter.QUERY,
+                required=False,
+                description='Also list the organizations of every territory under the given one.',
+            ),
+            *SPARSE_FIELDSET_PARAMETERS,
+        ],
+    )
+    def list(self, request, *args, **kwargs):
+        territory = request.query_params.get('territory')
+        if territory and not territory.isdigit():
+            return Response({'message': 'Territory ID must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
     
     @extend_schema(
         summary='Retrieve an organization by ID.',
         description='This endpoint retrieves an organization by its ID.',
+        parameters=SPARSE_FIELDSET_PARAMETERS,
     )  
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
         data = serializer.data
-        data['territory'] = [Territory.objects.get(id=id).territory_name for id in data['territory']]
-        data['managers'] = [User.objects.get(id=id).username for id in data['managers']]
+        if 'territory' in data:
+            data['territory'] = [Territory.objects.get(id=id).territory_name for id in data['territory']]
+        if 'managers' in data:
+            usernames = dict(User.objects.filter(pk__in=data['managers']).values_list('pk', 'username'))
+            data['managers'] = [usernames[id] for id in data['managers']]
         return Response(data)
 
     @extend_schema(
@@ -76,7 +119,7 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         return Response("You do not have permission to delete this organization.", status=status.HTTP_403_FORBIDDEN)
 
 
-class ListOrganizationViewSet(viewsets.ReadOnlyModelViewSet):
+class ListOrganizationViewSet(CachedTaxonomyListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Organization.objects.all()
     serializer_class = OrganizationSerializer
 
@@ -86,9 +129,7 @@ class ListOrganizationViewSet(viewsets.ReadOnlyModelViewSet):
         description='Depracated. This endpoint lists all organizations. Use the /organizations/ endpoint instead.',
     )
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        data = {org.id: str(org) for org in queryset}
-        return Response(data)
+        return super().list(request, *args, **kwargs)
 
     @extend_schema(exclude=True)
     def retrieve(self, request, *args, **kwargs):
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from users.models import refresh_skill_counts
+
+
+class Command(BaseCommand):
+    help = 'Recounts the profiles that know, offer and want each skill. ' \
+        'Meant to run periodically, so the counters are repaired after bulk writes.'
+
+    def handle(self, *args, **options):
+        refresh_skill_counts()
+        self.stdout.write(self.style.SUCCESS('Refreshed the skill counts.'))
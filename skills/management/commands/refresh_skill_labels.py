@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from skills.models import Skill
+from skills.wikidata import fetch_labels, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Fetches the Wikidata labels of the skills in every configured language. ' \
+        'Meant to run periodically, so label changes on Wikidata are picked up.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Only fetch the labels of the skills without any label.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Number of Wikidata items requested at once (at most 50).'
+        )
+
+    def handle(self, *args, **options):
+        skill_ids = None
+        if options['missing']:
+            skill_ids = list(Skill.objects.filter(labels__isnull=True).values_list('pk', flat=True))
+        count = fetch_labels(skill_ids, batch_size=min(options['batch_size'], BATCH_SIZE))
+        self.stdout.write(self.style.SUCCESS(f'Fetched the labels of {count} skills.'))
@@ -0,0 +1,92 @@
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from events.models import Events
+from skills.models import Skill, SkillClosure
+from users.models import Profile, refresh_skill_counts, touch_profiles
+
+
+# Many-to-many relations to skills whose rows are moved by a merge
+SKILL_RELATIONS = (
+    (Profile, 'skills_known'),
+    (Profile, 'skills_available'),
+    (Profile, 'skills_wanted'),
+    (Events, 'related_skills'),
+)
+
+
+def repoint_rows(through, column, other_column, source_id, target_id, self_referencing=False):
+    """
+    Move the rows of a many-to-many table from the source to the target
+    with one INSERT ... SELECT, leaving out the rows the target already has,
+    then delete the rows of the source. For a relation between skills, the
+    rows that would link the target to itself are left out too. Returns the
+    number of rows added to the target.
+    """
+    quote = connection.ops.quote_name
+    table = quote(through._meta.db_table)
+    column_name, other_name = quote(column), quote(other_column)
+    sql = (
+        f'INSERT INTO {table} ({other_name}, {column_name}) '
+        f'SELECT source.{other_name}, %s FROM {table} source '
+        f'WHERE source.{column_name} = %s AND NOT EXISTS ('
+        f'SELECT 1 FROM {table} existing '
+        f'WHERE existing.{other_name} = source.{other_name} AND existing.{column_name} = %s)'
+    )
+    params = [target_id, source_id, target_id]
+    if self_referencing:
+        sql += f' AND source.{other_name} <> %s'
+        params.append(target_id)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        moved = cursor.rowcount
+    through.objects.filter(**{column: source_id}).delete()
+    return moved
+
+
+def merge_skills(source, target):
+    """
+    Merge the source skill into the target and delete it, in one
+    transaction. Profiles, events and subskills of the source are moved to
+    the target with set-based queries, whatever their number. Returns the
+    number of rows moved for each relation. Raises ValueError when the
+    target is the source or one of its subskills.
+    """
+    if source.pk == target.pk:
+        raise ValueError('A skill cannot be merged into itself.')
+    if target.pk in SkillClosure.subtree([source.pk]):
+        raise ValueError('A skill cannot be merged into one of its subskills.')
+
+    with transaction.atomic():
+        # The bulk queries send no m2m_changed, so the holders are touched here
+        touch_profiles(Profile.objects.filter(
+            Q(skills_known=source) | Q(skills_available=source) | Q(skills_wanted=source)
+        ))
+        Events.objects.filter(related_skills=source).update(updated_at=timezone.now())
+        subtree = SkillClosure.subtree([source.pk, target.pk])
+
+        counts = {}
+        for model, name in SKILL_RELATIONS:
+            field = model._meta.get_field(name)
+            counts[name] = repoint_rows(
+                field.remote_field.through,
+                field.m2m_reverse_name(), field.m2m_column_name(),
+                source.pk, target.pk,
+            )
+
+        # The types of the source, then the skills it is a type of
+        field = Skill._meta.get_field('skill_type')
+        through = field.remote_field.through
+        counts['skill_type'] = sum(
+            repoint_rows(through, column, other_column, source.pk, target.pk, self_referencing=True)
+            for column, other_column in (
+                (field.m2m_column_name(), field.m2m_reverse_name()),
+                (field.m2m_reverse_name(), field.m2m_column_name()),
+            )
+        )
+
+        refresh_skill_counts([target.pk])
+        SkillClosure.rebuild(subtree)
+        # Deleting the source invalidates the taxonomy caches and the tag index
+        source.delete()
+    return counts
@@ -0,0 +1,54 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_skill_closure(apps, schema_editor):
+    Skill = apps.get_model('skills', 'Skill')
+    SkillClosure = apps.get_model('skills', 'SkillClosure')
+
+    parents = {}
+    for child_id, parent_id in Skill.skill_type.through.objects.values_list(
+        'from_skill_id', 'to_skill_id'
+    ):
+        parents.setdefault(child_id, []).append(parent_id)
+
+    rows = []
+    for skill_id in Skill.objects.values_list('pk', flat=True):
+        depths = {skill_id: 0}
+        level = [skill_id]
+        while level:
+            next_level = []
+            for node in level:
+                for parent_id in parents.get(node, []):
+                    if parent_id not in depths:
+                        depths[parent_id] = depths[node] + 1
+                        next_level.append(parent_id)
+            level = next_level
+        rows += [
+            SkillClosure(ancestor_id=ancestor_id, descendant_id=skill_id, depth=depth)
+            for ancestor_id, depth in depths.items()
+        ]
+    SkillClosure.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0003_remove_skill_skill_description_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkillClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(verbose_name='Depth')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closure_descendants', to='skills.skill', verbose_name='Ancestor')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closure_ancestors', to='skills.skill', verbose_name='Descendant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_skill_closure')],
+            },
+        ),
+        migrations.RunPython(build_skill_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0004_skillclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkillLabel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=10, verbose_name='Language')),
+                ('label', models.CharField(max_length=250, verbose_name='Label')),
+                ('fetched_at', models.DateTimeField(verbose_name='Fetched at')),
+                ('skill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='labels', to='skills.skill', verbose_name='Skill')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('skill', 'language'), name='unique_skill_label')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_skills(apps, schema_editor):
+    Skill = apps.get_model('skills', 'Skill')
+    Profile = apps.get_model('users', 'Profile')
+    counts = {}
+    for name, count_field in (('skills_known', 'known_count'), ('skills_available', 'available_count'), ('skills_wanted', 'wanted_count')):
+        field = Profile._meta.get_field(name)
+        column = field.m2m_reverse_field_name() + '_id'
+        rows = field.remote_field.through.objects.filter(**{column: OuterRef('pk')}).order_by()
+        counts[count_field] = Coalesce(
+            Subquery(rows.values(column).annotate(count=Count('*')).values('count'), output_field=IntegerField()),
+            Value(0),
+        )
+    Skill.objects.update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0005_skilllabel'),
+        ('users', '0020_customuser_unique_username_lower'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='skill',
+            name='known_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Known count'),
+        ),
+        migrations.AddField(
+            model_name='skill',
+            name='available_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Available count'),
+        ),
+        migrations.AddField(
+            model_name='skill',
+            name='wanted_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Wanted count'),
+        ),
+        migrations.RunPython(count_skills, migrations.RunPython.noop),
+    ]
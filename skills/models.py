@@ -1,6 +1,9 @@
 from django.db import models
 from django.core.validators import RegexValidator
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
 from django.utils import timezone
+from CapX.closure import ClosureTableMixin
 
 
 qid_form_validator = RegexValidator(regex=r"^Q\d+$", message="Field must be in the format \"Q123456789\"")
@@ -19,6 +22,112 @@ class Skill(models.Model):
         help_text="ID of the another skill that this skill is a subtype of."
     )
     skill_date_of_creation = models.DateTimeField(default=timezone.now)
+    # Number of profiles holding the skill in each relation, kept by users.models
+    known_count = models.PositiveIntegerField(
+        "Known count",
+        default=0, editable=False, db_index=True
+    )
+    available_count = models.PositiveIntegerField(
+        "Available count",
+        default=0, editable=False, db_index=True
+    )
+    wanted_count = models.PositiveIntegerField(
+        "Wanted count",
+        default=0, editable=False, db_index=True
+    )
 
     def __str__(self):
-        return self.skill_wikidata_item
\ No newline at end of file
+        return self.skill_wikidata_item
+
+
+class SkillClosure(ClosureTableMixin, models.Model):
+    """
+    Transitive closure of Skill.skill_type, see ClosureTableMixin.
+    """
+    parent_field = 'skill_type'
+
+    ancestor = models.ForeignKey(
+        Skill,
+        verbose_name="Ancestor",
+        on_delete=models.CASCADE,
+        related_name="closure_descendants"
+    )
+    descendant = models.ForeignKey(
+        Skill,
+        verbose_name="Descendant",
+        on_delete=models.CASCADE,
+        related_name="closure_ancestors"
+    )
+    depth = models.PositiveIntegerField(
+        verbose_name="Depth"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_skill_closure'),
+        ]
+
+    def __str__(self):
+        return f'{self.ancestor_id} > {self.descendant_id}'
+
+
+class SkillLabel(models.Model):
+    """
+    Label of the Wikidata item of a skill in one of the LANGUAGES, filled in
+    by skills.wikidata.
+    """
+    skill = models.ForeignKey(
+        Skill,
+        verbose_name="Skill",
+        on_delete=models.CASCADE,
+        related_name="labels"
+    )
+    language = models.CharField(
+        verbose_name="Language",
+        max_length=10
+    )
+    label = models.CharField(
+        verbose_name="Label",
+        max_length=250
+    )
+    fetched_at = models.DateTimeField(
+        verbose_name="Fetched at"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['skill', 'language'], name='unique_skill_label'),
+        ]
+
+    def __str__(self):
+        return f'{self.label} ({self.language})'
+
+
+@receiver(post_save, sender=Skill)
+def add_skill_closure(sender, instance, created, **kwargs):
+    if created:
+        SkillClosure.rebuild([instance.pk])
+
+
+@receiver(m2m_changed, sender=Skill.skill_type.through)
+def update_skill_closure(sender, instance, action, reverse, pk_set, **kwargs):
+    # Changing the types of a skill moves all of its subskills
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        SkillClosure.rebuild(SkillClosure.subtree([instance.pk]))
+    elif reverse and action in ('post_add', 'post_remove') and pk_set:
+        SkillClosure.rebuild(SkillClosure.subtree(pk_set))
+    elif reverse and action == 'pre_clear':
+        instance._closure_subtree = SkillClosure.subtree(instance.skill_set.values_list('pk', flat=True))
+    elif reverse and action == 'post_clear':
+        SkillClosure.rebuild(getattr(instance, '_closure_subtree', None))
+
+
+@receiver(pre_delete, sender=Skill)
+def collect_skill_subtree(sender, instance, **kwargs):
+    # The type links of the subskills are deleted without m2m_changed
+    instance._closure_subtree = SkillClosure.subtree([instance.pk]) - {instance.pk}
+
+
+@receiver(post_delete, sender=Skill)
+def delete_skill_closure(sender, instance, **kwargs):
+    SkillClosure.rebuild(getattr(instance, '_closure_subtree', None))
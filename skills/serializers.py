@@ -1,16 +1,28 @@
 from rest_framework import serializers
+from drf_spectacular.utils import extend_schema_field
 from .models import Skill
 
 
 class SkillSerializer(serializers.ModelSerializer):
+    labels = serializers.SerializerMethodField()
+
     class Meta:
         model = Skill
         fields = [
             'id',
             'skill_wikidata_item',
             'skill_type',
+            'labels',
+            'known_count',
+            'available_count',
+            'wanted_count',
         ]
 
+    @extend_schema_field({'type': 'object', 'additionalProperties': {'type': 'string'}})
+    def get_labels(self, skill):
+        # Read from the label store, never from Wikidata
+        return {label.language: label.label for label in skill.labels.all()}
+
 class ListSkillSerializer(serializers.ModelSerializer):
     class Meta:
         model = Skill
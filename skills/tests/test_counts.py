@@ -0,0 +1,73 @@
+import secrets
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+from skills.models import Skill
+from users.models import CustomUser, Profile
+
+
+class SkillCountTestCase(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.profile = Profile.objects.get(user=self.user)
+        self.python = Skill.objects.create(skill_wikidata_item='Q28865')
+        self.django = Skill.objects.create(skill_wikidata_item='Q842014')
+
+    def counts(self, skill):
+        skill.refresh_from_db()
+        return skill.known_count, skill.available_count, skill.wanted_count
+
+    def test_counts_follow_profiles(self):
+        other = Profile.objects.get(user=CustomUser.objects.create(username='other'))
+        self.profile.skills_known.add(self.python, self.django)
+        self.profile.skills_wanted.add(self.python)
+        other.skills_known.add(self.python)
+        # Adding a skill twice or removing one that is not linked changes nothing
+        other.skills_known.add(self.python)
+        other.skills_available.remove(self.python)
+        self.assertEqual(self.counts(self.python), (2, 0, 1))
+
+        self.profile.skills_known.remove(self.python)
+        self.profile.skills_wanted.clear()
+        self.assertEqual(self.counts(self.python), (1, 0, 0))
+        self.assertEqual(self.counts(self.django), (1, 0, 0))
+
+        self.profile.set_relation('skills_known', [self.python.pk])
+        self.assertEqual(self.counts(self.python), (2, 0, 0))
+        self.assertEqual(self.counts(self.django), (0, 0, 0))
+
+        other.user.delete()
+        self.assertEqual(self.counts(self.python), (1, 0, 0))
+
+    def test_counts_follow_skills(self):
+        other = Profile.objects.get(user=CustomUser.objects.create(username='other'))
+        self.python.user_available_skills.add(self.profile, other)
+        self.assertEqual(self.counts(self.python), (0, 2, 0))
+        self.python.user_available_skills.remove(other)
+        self.assertEqual(self.counts(self.python), (0, 1, 0))
+        self.python.user_available_skills.clear()
+        self.assertEqual(self.counts(self.python), (0, 0, 0))
+
+    def test_refresh_skill_counts(self):
+        self.profile.skills_known.add(self.python)
+        Skill.objects.update(known_count=10, wanted_count=3)
+        call_command('refresh_skill_counts', stdout=StringIO())
+        self.assertEqual(self.counts(self.python), (1, 0, 0))
+        self.assertEqual(self.counts(self.django), (0, 0, 0))
+
+    def test_order_skills_by_count(self):
+        other = Profile.objects.get(user=CustomUser.objects.create(username='other'))
+        self.profile.skills_known.add(self.django)
+        other.skills_known.add(self.django)
+        self.profile.skills_wanted.add(self.python)
+        # The skills and their types and labels, without counting the profiles
+        with self.assertNumQueries(3):
+            response = self.client.get('/skill/', {'ordering': '-known_count'})
+        self.assertEqual([skill['id'] for skill in response.data], [self.django.pk, self.python.pk])
+        self.assertEqual(response.data[0]['known_count'], 2)
+
+        response = self.client.get('/skill/', {'ordering': '-wanted_count'})
+        self.assertEqual([skill['id'] for skill in response.data], [self.python.pk, self.django.pk])
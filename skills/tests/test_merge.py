@@ -0,0 +1,111 @@
+import secrets
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+from events.models import Events
+from skills.merge import merge_skills
+from skills.models import Skill, SkillClosure
+from users.models import CustomUser, Profile
+from users.tagindex import tag_index
+
+
+class SkillMergeTestCase(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)))
+        self.user.is_staff = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.profile = Profile.objects.get(user=self.user)
+        self.programming = Skill.objects.create(skill_wikidata_item='Q80006')
+        self.python = Skill.objects.create(skill_wikidata_item='Q28865')
+        self.python_duplicate = Skill.objects.create(skill_wikidata_item='Q100000000')
+        self.django = Skill.objects.create(skill_wikidata_item='Q842014')
+        self.python_duplicate.skill_type.add(self.programming)
+        self.django.skill_type.add(self.python_duplicate)
+
+    def test_merge_profiles_and_events(self):
+        other = Profile.objects.get(user=CustomUser.objects.create(username='other'))
+        self.profile.skills_known.add(self.python, self.python_duplicate)
+        self.profile.skills_wanted.add(self.python_duplicate)
+        other.skills_available.add(self.python_duplicate)
+        event = Events.objects.create(
+            name='Sample Event',
+            type_of_location='virtual',
+            time_begin='2021-10-10 10:00:00+00:00',
+            time_end='2021-10-10 12:00:00+00:00',
+            creator=self.user,
+        )
+        event.related_skills.add(self.python_duplicate)
+        updated_at = Profile.objects.get(pk=other.pk).updated_at
+
+        counts = merge_skills(self.python_duplicate, self.python)
+        self.assertEqual(counts, {
+            'skills_known': 0,
+            'skills_available': 1,
+            'skills_wanted': 1,
+            'related_skills': 1,
+            'skill_type': 2,
+        })
+        self.assertFalse(Skill.objects.filter(pk=self.python_duplicate.pk).exists())
+        self.assertEqual(list(self.profile.skills_known.all()), [self.python])
+        self.assertEqual(list(self.profile.skills_wanted.all()), [self.python])
+        self.assertEqual(list(other.skills_available.all()), [self.python])
+        self.assertEqual(list(event.related_skills.all()), [self.python])
+        self.assertGreater(Profile.objects.get(pk=other.pk).updated_at, updated_at)
+        self.python.refresh_from_db()
+        self.assertEqual((self.python.known_count, self.python.available_count, self.python.wanted_count), (1, 1, 1))
+
+    def test_merge_skill_types(self):
+        merge_skills(self.python_duplicate, self.python)
+        self.assertEqual(list(self.python.skill_type.all()), [self.programming])
+        self.assertEqual(list(self.django.skill_type.all()), [self.python])
+        self.assertEqual(
+            SkillClosure.subtree([self.programming.pk]),
+            {self.programming.pk, self.python.pk, self.django.pk},
+        )
+
+    def test_merge_into_subskill(self):
+        with self.assertRaises(ValueError):
+            merge_skills(self.programming, self.django)
+        self.assertTrue(Skill.objects.filter(pk=self.programming.pk).exists())
+        self.assertEqual(
+            SkillClosure.ancestors([self.django.pk]),
+            {self.django.pk, self.python_duplicate.pk, self.programming.pk},
+        )
+
+    def test_merge_into_parent_skill(self):
+        # The link between the two skills is dropped instead of becoming a loop
+        merge_skills(self.python_duplicate, self.programming)
+        self.assertEqual(list(self.django.skill_type.all()), [self.programming])
+        self.assertEqual(list(self.programming.skill_type.all()), [])
+        self.assertEqual(SkillClosure.ancestors([self.django.pk]), {self.django.pk, self.programming.pk})
+
+    def test_merge_endpoint(self):
+        self.profile.skills_known.add(self.python_duplicate)
+        tag_index.build()
+        url = f'/skill/{self.python_duplicate.pk}/merge/'
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'into': self.python.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['skills_known'], 1)
+        response = self.client.get(f'/tags/skill_known/{self.python.pk}/')
+        self.assertEqual([profile['username'] for profile in response.data], ['test'])
+
+    def test_merge_endpoint_errors(self):
+        url = f'/skill/{self.python_duplicate.pk}/merge/'
+        response = self.client.post(url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {'into': self.python_duplicate.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {'into': 999999}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(url, {'into': self.django.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.post(url, {'into': self.python.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertTrue(Skill.objects.filter(pk=self.python_duplicate.pk).exists())
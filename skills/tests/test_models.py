@@ -1,6 +1,6 @@
 from django.test import TestCase
 from django.utils import timezone
-from skills.models import Skill
+from skills.models import Skill, SkillClosure
 
 class SkillModelTest(TestCase):
     def test_skill_creation(self):
@@ -15,3 +15,33 @@ class SkillModelTest(TestCase):
             skill_wikidata_item="Q123456789"
         )
         self.assertEqual(str(skill), "Q123456789")
+
+
+class SkillClosureTest(TestCase):
+    def setUp(self):
+        self.programming = Skill.objects.create(skill_wikidata_item='Q80006')
+        self.python = Skill.objects.create(skill_wikidata_item='Q28865')
+        self.django = Skill.objects.create(skill_wikidata_item='Q842014')
+        self.python.skill_type.add(self.programming)
+        self.django.skill_type.add(self.python)
+
+    def ancestors(self, skill):
+        return dict(SkillClosure.objects.filter(descendant=skill).values_list('ancestor_id', 'depth'))
+
+    def test_closure(self):
+        self.assertEqual(self.ancestors(self.django), {self.django.pk: 0, self.python.pk: 1, self.programming.pk: 2})
+        self.assertEqual(SkillClosure.subtree([self.programming.pk]), {self.programming.pk, self.python.pk, self.django.pk})
+
+    def test_move_subtree(self):
+        software = Skill.objects.create(skill_wikidata_item='Q7397')
+        self.python.skill_type.set([software])
+        self.assertEqual(self.ancestors(self.django), {self.django.pk: 0, self.python.pk: 1, software.pk: 2})
+
+        # Clearing from the parent side detaches the children too
+        software.skill_set.clear()
+        self.assertEqual(self.ancestors(self.django), {self.django.pk: 0, self.python.pk: 1})
+
+    def test_delete(self):
+        self.python.delete()
+        self.assertEqual(self.ancestors(self.django), {self.django.pk: 0})
+        self.assertEqual(SkillClosure.subtree([self.programming.pk]), {self.programming.pk})
@@ -150,4 +150,37 @@ class SkillByTypeTestCase(TestCase):
 
     def test_get_skills_by_type_not_provided(self):
         response = self.client.get('/skills_by_type/')
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class SkillTreeTestCase(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.programming = Skill.objects.create(skill_wikidata_item='Q80006')
+        self.python = Skill.objects.create(skill_wikidata_item='Q28865')
+        self.python.skill_type.add(self.programming)
+
+    def test_skill_tree(self):
+        response = self.client.get('/skill/tree/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{
+            'id': self.programming.pk,
+            'skill_wikidata_item': 'Q80006',
+            'children': [{'id': self.python.pk, 'skill_wikidata_item': 'Q28865', 'children': []}],
+        }])
+
+    def test_skill_tree_cache(self):
+        self.client.get('/skill/tree/')
+        # Only the version token is read inside a transaction
+        with self.assertNumQueries(1):
+            self.client.get('/skill/tree/')
+
+        django = Skill.objects.create(skill_wikidata_item='Q842014')
+        django.skill_type.add(self.python)
+        response = self.client.get('/skill/tree/')
+        self.assertEqual(response.data[0]['children'][0]['children'][0]['id'], django.pk)
+
+        self.python.skill_type.clear()
+        response = self.client.get('/skill/tree/')
+        self.assertEqual([node['id'] for node in response.data], [self.programming.pk, self.python.pk])
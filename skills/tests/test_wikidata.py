@@ -0,0 +1,78 @@
+import secrets
+from unittest.mock import patch
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from skills.models import Skill, SkillLabel
+from skills import wikidata
+from skills.wikidata import LocalLabelBackend, WikidataUnavailable, fetch_labels
+from users.models import CustomUser
+
+
+class FailingBackend:
+    def fetch(self, qids, languages):
+        raise WikidataUnavailable('Wikidata is down.')
+
+
+@override_settings(WIKIDATA_LABEL_BACKEND='skills.wikidata.LocalLabelBackend')
+class SkillLabelTestCase(TestCase):
+    def setUp(self):
+        LocalLabelBackend.calls.clear()
+        self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.python = Skill.objects.create(skill_wikidata_item='Q28865')
+        # Callbacks never run in these tests, so the batches are left queued
+        wikidata._pending_batches().clear()
+
+    def test_fetch_in_batches(self):
+        Skill.objects.bulk_create([Skill(skill_wikidata_item=f'Q{number}') for number in range(1, 60)])
+        self.assertEqual(fetch_labels(), 60)
+        self.assertEqual([len(batch) for batch in LocalLabelBackend.calls], [50, 10])
+        self.assertEqual(SkillLabel.objects.count(), 60 * 4)
+        self.assertEqual(self.python.labels.get(language='pt-br').label, 'Q28865 (pt-br)')
+
+    def test_unavailable_backend_keeps_labels(self):
+        fetch_labels()
+        with override_settings(WIKIDATA_LABEL_BACKEND='skills.tests.test_wikidata.FailingBackend'):
+            with self.assertLogs('skills.wikidata', 'WARNING'):
+                self.assertEqual(fetch_labels(), 0)
+        self.assertEqual(self.python.labels.count(), 4)
+
+    def test_skill_labels(self):
+        fetch_labels()
+        calls = len(LocalLabelBackend.calls)
+        # The skills, their types and their labels
+        with self.assertNumQueries(3):
+            response = self.client.get('/skill/')
+        self.assertEqual(response.data[0]['labels']['en'], 'Q28865 (en)')
+        self.assertEqual(len(LocalLabelBackend.calls), calls)
+
+    def test_list_skills_in_language(self):
+        response = self.client.get('/list_skills/', {'language': 'es'})
+        self.assertEqual(response.data, {self.python.pk: 'Q28865'})
+
+        call_command('refresh_skill_labels', '--missing', stdout=StringIO())
+        response = self.client.get('/list_skills/', {'language': 'es'})
+        self.assertEqual(response.data, {self.python.pk: 'Q28865 (es)'})
+        self.assertEqual(self.client.get('/list_skills/').data, {self.python.pk: 'Q28865'})
+
+        response = self.client.get('/list_skills/', {'language': 'xx'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_labels_fetched_after_save(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            programming = Skill.objects.create(skill_wikidata_item='Q80006')
+            self.python.save()
+        # One fetch for all the skills saved in the transaction
+        self.assertEqual(len(callbacks), 1)
+        with patch('skills.wikidata.start_label_fetch') as start:
+            callbacks[0]()
+        start.assert_called_once_with(sorted([self.python.pk, programming.pk]))
+
+    def test_labels_not_fetched_for_fixtures(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Skill(pk=100, skill_wikidata_item='Q80006').save_base(raw=True)
+        self.assertEqual(callbacks, [])
@@ -1,13 +1,17 @@
-from .models import Skill
+from .models import Skill, SkillClosure
 from .serializers import SkillSerializer, ListSkillSerializer
+from .merge import merge_skills
+from users.taxonomy import CachedTaxonomyListMixin, skill_tree_cache, skill_label_caches
 from rest_framework import status, viewsets, filters
 from rest_framework.response import Response
+from rest_framework.decorators import action
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiTypes, OpenApiExample, OpenApiResponse
 
 @extend_schema_view(
     list=extend_schema(
         summary='List all skills.',
-        description='This endpoint lists all skills.',
+        description='This endpoint lists all skills. Use ordering=-known_count, -available_count ' \
+            'or -wanted_count to sort them by the number of users who know, offer or want them.',
     ),
     retrieve=extend_schema(
         summary='Retrieve a skill by ID.',
@@ -16,10 +20,21 @@ from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiPara
 )
 class SkillViewSet(viewsets.ModelViewSet):
     serializer_class = SkillSerializer
-    queryset = Skill.objects.all()
-    filter_backends = [filters.SearchFilter]
+    queryset = Skill.objects.prefetch_related('skill_type', 'labels')
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['skill_wikidata_item']
+    # The counters are indexed columns of Skill
+    ordering_fields = ['id', 'known_count', 'available_count', 'wanted_count']
 
+    @extend_schema(
+        summary='Skill tree.',
+        description='This endpoint lists the skills as a tree, starting from the skills without a ' \
+            'skill type. Skills with several skill types appear under each of them.',
+    )
+    @action(detail=False)
+    def tree(self, request, *args, **kwargs):
+        payload, _ = skill_tree_cache.get()
+        return Response(payload)
 
     @extend_schema(
         summary='Creates a new skill.',
@@ -80,24 +95,81 @@ class SkillViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ListSkillViewSet (viewsets.ReadOnlyModelViewSet):
+    @extend_schema(
+        summary='Merges a skill into another.',
+        description='This endpoint moves the profiles, events and subskills of a skill to the skill ' \
+            'given in "into", then deletes it, in a single transaction. Returns the number of rows ' \
+            'moved for each relation. Only staff members are allowed to merge skills.',
+        request={'application/json': {'type': 'object', 'properties': {'into': {'type': 'integer'}}}},
+        examples=[OpenApiExample('Merge', value={'into': 1}, request_only=True)],
+    )
+    @action(detail=True, methods=['post'])
+    def merge(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return Response(
+                {"detail": "Only staff can merge skills."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        source = self.get_object()
+
+        into = request.data.get('into')
+        if not str(into).isdigit():
+            return Response(
+                {"detail": "The skill to merge into must be given as an integer in \"into\"."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if int(into) == source.pk:
+            return Response(
+                {"detail": "A skill cannot be merged into itself."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        target = Skill.objects.filter(pk=into).first()
+        if target is None:
+            return Response(
+                {"detail": "The skill to merge into does not exist."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        if target.pk in SkillClosure.subtree([source.pk]):
+            return Response(
+                {"detail": "A skill cannot be merged into one of its subskills."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(merge_skills(source, target))
+
+
+class ListSkillViewSet (CachedTaxonomyListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Skill.objects.all()
     serializer_class = ListSkillSerializer
 
+    def get_taxonomy_cache(self):
+        language = self.request.query_params.get('language')
+        if language:
+            return skill_label_caches[language]
+        return super().get_taxonomy_cache()
+
     @extend_schema(
         summary='List all skills.',
         deprecated=True,
         description='Depracated. This endpoint lists all skills. Use the /skills/ endpoint instead.',
+        parameters=[
+            OpenApiParameter(
+                'language',
+                OpenApiTypes.STR,
+                OpenApiParameter.QUERY,
+                required=False,
+                description='List the Wikidata labels of the skills in this language instead of their ' \
+                    'Wikidata item IDs. Skills without a label in the language keep their item ID.',
+                enum=list(skill_label_caches),
+            ),
+        ],
     )
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-
-        aggregated_data = {}
-        for item in serializer.data:
-            aggregated_data.update(item)
-
-        return Response(aggregated_data)
+        language = request.query_params.get('language')
+        if language and language not in skill_label_caches:
+            return Response({'message': f'Invalid language. Options are: {", ".join(skill_label_caches)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
 
     @extend_schema(exclude=True)
     def retrieve(self, request, *args, **kwargs):
@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+from functools import partial
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from skills.models import Skill, SkillLabel
+from users.taxonomy import skill_label_caches
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'skills.wikidata.WikidataAPIBackend'
+# Maximum number of items in one request to the Wikidata API
+BATCH_SIZE = 50
+
+
+class WikidataUnavailable(Exception):
+    pass
+
+
+class WikidataAPIBackend:
+    """
+    Resolves labels with the wbgetentities API of Wikidata.
+    """
+    url = 'https://www.wikidata.org/w/api.php'
+    timeout = 10
+
+    def fetch(self, qids, languages):
+        """
+        Return a {qid: {language: label}} dict for a list of item IDs. Items
+        or labels that do not exist are left out.
+        """
+        try:
+            response = requests.get(self.url, params={
+                'action': 'wbgetentities',
+                'format': 'json',
+                'props': 'labels',
+                'ids': '|'.join(qids),
+                'languages': '|'.join(languages),
+            }, headers={'User-Agent': 'CapX backend (Capacity Exchange)'}, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as error:
+            raise WikidataUnavailable(str(error)) from error
+        if 'error' in data:
+            raise WikidataUnavailable(data['error'].get('info', ''))
+
+        return {
+            qid: {language: label['value'] for language, label in entity.get('labels', {}).items()}
+            for qid, entity in data.get('entities', {}).items()
+            if 'missing' not in entity
+        }
+
+
+class LocalLabelBackend:
+    """
+    Offline backend for development and tests, labelling each item with its
+    ID and the language. Every batch it receives is recorded in `calls`.
+    """
+    calls = []
+
+    def fetch(self, qids, languages):
+        self.calls.append(list(qids))
+        return {qid: {language: f'{qid} ({language})' for language in languages} for qid in qids}
+
+
+def get_backend():
+    return import_string(getattr(settings, 'WIKIDATA_LABEL_BACKEND', DEFAULT_BACKEND))()
+
+
+def label_languages():
+    return [code for code, _ in settings.LANGUAGES]
+
+
+def fetch_labels(skill_ids=None, batch_size=BATCH_SIZE):
+    """
+    Fetch the labels of the given skills, or of all skills when None, in
+    every language of LANGUAGES, and replace the stored ones. Batches the
+    backend fails on keep their previous labels. Returns the number of
+    skills fetched.
+    """
+    skills = Skill.objects.all()
+    if skill_ids is not None:
+        skills = skills.filter(pk__in=skill_ids)
+    items = list(skills.order_by('pk').values_list('skill_wikidata_item', 'pk'))
+    backend = get_backend()
+    languages = label_languages()
+
+    count = 0
+    for start in range(0, len(items), batch_size):
+        batch = dict(items[start:start + batch_size])
+        try:
+            results = backend.fetch(list(batch), languages)
+        except WikidataUnavailable:
+            logger.warning('Could not fetch the labels of %s skills.', len(batch), exc_info=True)
+            continue
+        fetched_at = timezone.now()
+        rows = [
+            SkillLabel(skill_id=skill_id, language=language, label=label[:250], fetched_at=fetched_at)
+            for qid, skill_id in batch.items()
+            for language, label in results.get(qid, {}).items() if language in languages
+        ]
+        with transaction.atomic():
+            SkillLabel.objects.filter(skill_id__in=batch.values()).delete()
+            SkillLabel.objects.bulk_create(rows, ignore_conflicts=True)
+        count += len(batch)
+
+    for cache in skill_label_caches.values():
+        cache.invalidate()
+    return count
+
+
+def start_label_fetch(skill_ids):
+    threading.Thread(target=_run_in_thread, args=(skill_ids,), daemon=True).start()
+
+
+def _run_in_thread(skill_ids):
+    try:
+        fetch_labels(skill_ids)
+    except Exception:
+        # The labels are fetched again by refresh_skill_labels
+        logger.exception('Fetching the labels of skills %s failed.', skill_ids)
+    finally:
+        connection.close()
+
+
+# Skills saved by the open transaction of each connection of this thread,
+# whose labels are fetched in one batch on commit. Rolling back drops the
+# callback but not the batch, so a batch is queued again after a while, and
+# by any save outside a transaction; until then, refresh_skill_labels
+# fetches the labels it misses.
+_pending = threading.local()
+PENDING_TIMEOUT = 60
+
+
+def _pending_batches():
+    if not hasattr(_pending, 'batches'):
+        _pending.batches = {}
+    return _pending.batches
+
+
+def flush_label_fetch(using):
+    skill_ids, _ = _pending_batches().pop(using, (set(), None))
+    if skill_ids:
+        start_label_fetch(sorted(skill_ids))
+
+
+@receiver(post_save, sender=Skill)
+def queue_label_fetch(sender, instance, raw=False, using=None, **kwargs):
+    # Fixtures are loaded as is, their labels are fetched by refresh_skill_labels
+    if raw:
+        return
+    # The Wikidata item may have changed, so the labels are always replaced
+    batches = _pending_batches()
+    skill_ids, queued_at = batches.get(using, (set(), None))
+    skill_ids.add(instance.pk)
+    now = time.monotonic()
+    if queued_at is not None and now - queued_at < PENDING_TIMEOUT and not transaction.get_autocommit(using):
+        return
+    batches[using] = (skill_ids, now)
+    transaction.on_commit(partial(flush_label_fetch, using), using=using)
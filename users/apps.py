@@ -7,3 +7,6 @@ class UserConfig(AppConfig):
 
     def ready(self):
         import users.schema
+        import users.search
+        import users.tagindex
+        import users.taxonomy
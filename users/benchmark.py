@@ -0,0 +1,207 @@
+import re
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlencode, urlparse
+import jwt
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+from rest_framework.test import APIClient
+from rest_social_auth.serializers import KnoxSerializer
+from social_core.backends.mediawiki import MediaWiki
+from users.models import CustomUser, create_user_profile
+
+
+CONSUMER_KEY = 'benchmark-key'
+CONSUMER_SECRET = 'benchmark-consumer-secret-for-the-login-benchmark'
+LOGIN_URL = '/api/login/social/knox_user/'
+
+
+class FakeMediaWikiHandler(BaseHTTPRequestHandler):
+    """
+    Answers the three Special:OAuth requests made by the MediaWiki backend of
+    social_core. Tokens carry the number of the simulated user, so each
+    user gets the same identity on every login.
+    """
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.respond()
+
+    def respond(self):
+        title = parse_qs(urlparse(self.path).query).get('title', [''])[0].lower()
+        header = self.headers.get('Authorization', '')
+        token = re.search(r'oauth_token="(.*?)"', header)
+        token = token.group(1) if token else ''
+
+        if title == 'special:oauth/initiate':
+            self.server.requests += 1
+            body = urlencode({
+                'oauth_token': f'request-{self.server.requests}',
+                'oauth_token_secret': 'secret',
+                'oauth_callback_confirmed': 'true',
+            })
+        elif title == 'special:oauth/token':
+            body = urlencode({'oauth_token': token.replace('request-', 'access-'), 'oauth_token_secret': 'secret'})
+        elif title == 'special:oauth/identify':
+            number = self.server.users.get(token.replace('access-', ''), token)
+            body = jwt.encode({
+                'iss': self.server.url,
+                'aud': CONSUMER_KEY,
+                'iat': time.time(),
+                'nonce': re.search(r'oauth_nonce="(.*?)"', header).group(1),
+                'sub': str(number),
+                'username': f'Benchmark user {number}',
+                'email': f'benchmark{number}@example.org',
+            }, CONSUMER_SECRET, algorithm='HS256')
+        else:
+            self.send_error(404)
+            return
+
+        content = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeMediaWiki:
+    """
+    Local stand-in for the MediaWiki OAuth provider, served from a thread.
+    """
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeMediaWikiHandler)
+        self.server.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.server.requests = 0
+        # Maps the number of each request token to the simulated user
+        self.server.users = {}
+        self.url = self.server.url + '/w/index.php'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StepTimer:
+    """
+    Collects the wall time and the number of queries of named steps.
+    """
+
+    def __init__(self):
+        self.steps = {}
+
+    @contextmanager
+    def measure(self, name):
+        # Queries are counted by a wrapper, since connection.queries is
+        # cleared at the start of each request. Savepoints are left out, as
+        # they depend on the transaction the login runs in.
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            if 'SAVEPOINT' not in sql:
+                queries.append(sql)
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count):
+            yield
+        calls, elapsed, total = self.steps.get(name, (0, 0.0, 0))
+        self.steps[name] = (calls + 1, elapsed + time.perf_counter() - started, total + len(queries))
+
+    def wrap(self, name, function):
+        def wrapper(*args, **kwargs):
+            with self.measure(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def report(self):
+        """
+        Return (step, calls, average milliseconds, average queries) rows.
+        """
+        return [
+            (name, calls, elapsed * 1000 / calls, count / calls)
+            for name, (calls, elapsed, count) in self.steps.items()
+        ]
+
+
+@contextmanager
+def instrumented(timer, provider):
+    """
+    Point the MediaWiki backend to the fake provider and time the OAuth
+    requests, each pipeline step, the profile creation and the knox token.
+    """
+    with ExitStack() as stack:
+        stack.enter_context(override_settings(
+            SOCIAL_AUTH_MEDIAWIKI_URL=provider.url,
+            SOCIAL_AUTH_MEDIAWIKI_KEY=CONSUMER_KEY,
+            SOCIAL_AUTH_MEDIAWIKI_SECRET=CONSUMER_SECRET,
+            SOCIAL_AUTH_MEDIAWIKI_CALLBACK='oob',
+        ))
+        for name in ('unauthorized_token', 'access_token', 'get_user_details'):
+            stack.enter_context(mock.patch.object(
+                MediaWiki, name, timer.wrap(f'oauth: {name}', getattr(MediaWiki, name))
+            ))
+        # social_core imports each pipeline step by path when it runs it
+        for path in settings.SOCIAL_AUTH_PIPELINE:
+            stack.enter_context(mock.patch(path, timer.wrap(f'pipeline: {path.rsplit(".", 1)[1]}', import_string(path))))
+        stack.enter_context(mock.patch.object(
+            KnoxSerializer, 'get_token', timer.wrap('knox: get_token', KnoxSerializer.get_token)
+        ))
+
+        # Part of the create_user step, also reported on its own
+        post_save.disconnect(create_user_profile, sender=CustomUser)
+        timed_receiver = timer.wrap('signal: create_user_profile', create_user_profile)
+        post_save.connect(timed_receiver, sender=CustomUser, weak=False)
+        try:
+            yield
+        finally:
+            post_save.disconnect(timed_receiver, sender=CustomUser)
+            post_save.connect(create_user_profile, sender=CustomUser)
+
+
+def run_login_benchmark(users=10):
+    """
+    Log in `users` new users, then log all of them in again, through
+    /api/login/ against a local fake MediaWiki. Returns the report of the
+    first-time and of the returning logins.
+    """
+    reports = {}
+    with FakeMediaWiki() as provider:
+        for phase in ('first-time', 'returning'):
+            timer = StepTimer()
+            with instrumented(timer, provider):
+                for number in range(1, users + 1):
+                    with timer.measure('total'):
+                        login(APIClient(), provider, number)
+            reports[phase] = timer.report()
+    return reports
+
+
+def login(client, provider, number):
+    response = client.post(LOGIN_URL, {'provider': 'mediawiki'}, format='json')
+    request_token = response.data['oauth_token'][0]
+    provider.server.users[request_token.replace('request-', '')] = number
+    response = client.post(LOGIN_URL, {
+        'provider': 'mediawiki',
+        'oauth_token': request_token,
+        'oauth_token_secret': response.data['oauth_token_secret'][0],
+        'oauth_verifier': 'verifier',
+    }, format='json')
+    if response.status_code != 200 or 'token' not in response.data:
+        raise RuntimeError(f'Login failed with status {response.status_code}: {response.data}')
+    return response.data
@@ -0,0 +1,270 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from functools import partial
+from urllib.parse import parse_qs, quote, unquote, urlparse
+import requests
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from users.models import CommonsThumbnail
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'users.commons.CommonsAPIBackend'
+DEFAULT_WIDTH = 200
+# Maximum number of titles in one request to the MediaWiki API
+BATCH_SIZE = 50
+# Thumbnails are looked up again after this long, missing files sooner, and
+# files the backend failed on sooner still
+MAX_AGE = timedelta(days=30)
+MISSING_MAX_AGE = timedelta(days=1)
+FAILED_MAX_AGE = timedelta(minutes=10)
+
+
+class CommonsUnavailable(Exception):
+    pass
+
+
+class CommonsAPIBackend:
+    """
+    Resolves thumbnails with the imageinfo API of Wikimedia Commons.
+    """
+    url = 'https://commons.wikimedia.org/w/api.php'
+    timeout = 5
+
+    def fetch(self, titles, width):
+        """
+        Return a {title: thumbnail URL} dict for a list of file titles, with
+        None for the files that do not exist.
+        """
+        try:
+            response = requests.get(self.url, params={
+                'action': 'query',
+                'format': 'json',
+                'formatversion': 2,
+                'prop': 'imageinfo',
+                'iiprop': 'url',
+                'iiurlwidth': width,
+                'titles': '|'.join(titles),
+            }, headers={'User-Agent': 'CapX backend (Capacity Exchange)'}, timeout=self.timeout)
+            response.raise_for_status()
+            query = response.json().get('query', {})
+        except (requests.RequestException, ValueError) as error:
+            raise CommonsUnavailable(str(error)) from error
+
+        # The API answers with the normalized titles
+        normalized = {item['to']: item['from'] for item in query.get('normalized', [])}
+        thumbnails = dict.fromkeys(titles)
+        for page in query.get('pages', []):
+            info = page.get('imageinfo')
+            title = normalized.get(page.get('title'), page.get('title'))
+            if title in thumbnails and info:
+                thumbnails[title] = info[0].get('thumburl') or info[0].get('url')
+        return thumbnails
+
+
+class LocalThumbnailBackend:
+    """
+    Offline backend for development and tests, building upload.wikimedia.org
+    style URLs without any request. Every batch it receives is recorded in
+    `calls`.
+    """
+    calls = []
+
+    def fetch(self, titles, width):
+        self.calls.append(list(titles))
+        return {
+            title: f'https://upload.wikimedia.org/wikipedia/commons/thumb/{quote(name)}/{width}px-{quote(name)}'
+            for title in titles
+            for name in [title.split(':', 1)[1].replace(' ', '_')]
+        }
+
+
+def get_backend():
+    return import_string(getattr(settings, 'COMMONS_THUMBNAIL_BACKEND', DEFAULT_BACKEND))()
+
+
+def commons_file_title(url):
+    """
+    Return the title of the Commons file a URL points to, such as
+    'File:Example.jpg' for https://commons.wikimedia.org/wiki/File:Example.jpg,
+    or None for any other URL.
+    """
+    parsed = urlparse(url)
+    if parsed.netloc != 'commons.wikimedia.org':
+        return None
+    if parsed.path.startswith('/wiki/'):
+        title = unquote(parsed.path[len('/wiki/'):])
+    else:
+        title = parse_qs(parsed.query).get('title', [''])[0]
+    namespace, _, name = title.replace('_', ' ').partition(':')
+    if namespace.lower() not in ('file', 'image') or not name.strip():
+        return None
+    return 'File:' + name.strip()
+
+
+def resolve_thumbnails(urls, width=None, pending=None):
+    """
+    Return a {url: thumbnail URL} dict for image URLs, read from the cache
+    only. Titles that are not cached or whose entry expired are looked up
+    in the background, and resolve to None or to their expired entry until
+    then; their URLs are added to the `pending` set when given. URLs that
+    are not Commons file pages and files that do not exist resolve to None.
+    Direct upload.wikimedia.org links are kept.
+    """
+    width = width or getattr(settings, 'COMMONS_THUMBNAIL_WIDTH', DEFAULT_WIDTH)
+    thumbnails = {}
+    titles = {}
+    for url in set(filter(None, urls)):
+        if urlparse(url).netloc == 'upload.wikimedia.org':
+            thumbnails[url] = url
+        elif (title := commons_file_title(url)) is None:
+            thumbnails[url] = None
+        else:
+            titles.setdefault(title, []).append(url)
+    if not titles:
+        return thumbnails
+
+    now = timezone.now()
+    resolved = {}
+    expired = []
+    for title, thumbnail_url, expires_at in CommonsThumbnail.objects.filter(
+        file_title__in=titles, width=width
+    ).values_list('file_title', 'thumbnail_url', 'expires_at'):
+        resolved[title] = thumbnail_url
+        if expires_at <= now:
+            expired.append(title)
+    queued = [title for title in titles if title not in resolved] + expired
+    queue_thumbnail_fetch(queued, width)
+    if pending is not None:
+        pending.update(url for title in queued for url in titles[title])
+
+    for title, title_urls in titles.items():
+        for url in title_urls:
+            thumbnails[url] = resolved.get(title)
+    return thumbnails
+
+
+# Time at which each (title, width) pair was queued by this process. Pairs
+# queued by a transaction that rolled back are queued again after a while.
+_pending = {}
+_pending_lock = threading.Lock()
+PENDING_TIMEOUT = 60
+
+
+def queue_thumbnail_fetch(titles, width):
+    """
+    Look up file titles in a background thread once the current
+    transaction commits, leaving out the ones already being looked up.
+    """
+    now = time.monotonic()
+    with _pending_lock:
+        titles = sorted({
+            title for title in titles
+            if now - _pending.get((title, width), now - PENDING_TIMEOUT) >= PENDING_TIMEOUT
+        })
+        _pending.update(((title, width), now) for title in titles)
+    if titles:
+        transaction.on_commit(partial(start_thumbnail_fetch, titles, width), robust=True)
+
+
+def start_thumbnail_fetch(titles, width):
+    threading.Thread(target=_run_in_thread, args=(titles, width), daemon=True).start()
+
+
+def _run_in_thread(titles, width):
+    try:
+        fetch_thumbnails(titles, width)
+    except Exception:
+        logger.exception('Resolving %s Commons thumbnails failed.', len(titles))
+    finally:
+        with _pending_lock:
+            for title in titles:
+                _pending.pop((title, width), None)
+        connection.close()
+
+
+def fetch_thumbnails(titles, width):
+    """
+    Look up file titles with the backend, BATCH_SIZE at a time, and store
+    the results in the cache. Titles of the batches the backend fails on are
+    stored as failed for FAILED_MAX_AGE, keeping their previous thumbnail,
+    so an outage is not retried on every request.
+    """
+    backend = get_backend()
+    resolved = {}
+    for start in range(0, len(titles), BATCH_SIZE):
+        batch = titles[start:start + BATCH_SIZE]
+        fetched_at = timezone.now()
+        try:
+            results = backend.fetch(batch, width)
+        except CommonsUnavailable:
+            logger.warning('Could not resolve %s Commons thumbnails.', len(batch), exc_info=True)
+            entries = CommonsThumbnail.objects.filter(file_title__in=batch, width=width)
+            entries.update(expires_at=fetched_at + FAILED_MAX_AGE)
+            known = set(entries.values_list('file_title', flat=True))
+            CommonsThumbnail.objects.bulk_create([
+                CommonsThumbnail(
+                    file_title=title, width=width, thumbnail_url=None,
+                    fetched_at=fetched_at, expires_at=fetched_at + FAILED_MAX_AGE,
+                )
+                for title in batch if title not in known
+            ], ignore_conflicts=True)
+            continue
+        with transaction.atomic():
+            CommonsThumbnail.objects.filter(file_title__in=batch, width=width).delete()
+            # Another process may have stored the same titles meanwhile
+            CommonsThumbnail.objects.bulk_create([
+                CommonsThumbnail(
+                    file_title=title, width=width, thumbnail_url=results.get(title), fetched_at=fetched_at,
+                    expires_at=fetched_at + (MAX_AGE if results.get(title) else MISSING_MAX_AGE),
+                )
+                for title in batch
+            ], ignore_conflicts=True)
+        resolved.update((title, results.get(title)) for title in batch)
+    return resolved
+
+
+def resolve_context_thumbnails(context, urls):
+    """
+    Resolve image URLs into the thumbnails of a serializer context. When
+    some are still being looked up, the request is marked as provisional so
+    ConditionalGetMixin sends the response without validators, and clients
+    do not keep the missing thumbnails once they are resolved.
+    """
+    pending = set()
+    context.setdefault('commons_thumbnails', {}).update(resolve_thumbnails(urls, pending=pending))
+    request = context.get('request')
+    if pending and request is not None:
+        request.provisional_response = True
+
+
+class CommonsThumbnailField(serializers.ReadOnlyField):
+    """
+    Read-only field with the cached thumbnail URL of a Commons image URL.
+    Lists using CommonsThumbnailListSerializer read all their thumbnails in
+    one query, other serializers one at a time.
+    """
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        if value not in self.context.get('commons_thumbnails', {}):
+            resolve_context_thumbnails(self.context, [value])
+        return self.context['commons_thumbnails'][value]
+
+
+class CommonsThumbnailListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(items)
+        fields = [field for field in self.child.fields.values() if isinstance(field, CommonsThumbnailField)]
+        urls = [field.get_attribute(item) for item in items for field in fields]
+        resolve_context_thumbnails(self.context, urls)
+        return super().to_representation(items)
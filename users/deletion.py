@@ -0,0 +1,124 @@
+import logging
+import threading
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from knox.models import AuthToken
+from rest_framework.authtoken.models import Token
+from social_django.models import UserSocialAuth
+from bugs.models import Bug, Attachment
+from events.models import Events, EventParticipant
+from orgs.models import Organization
+from users.models import CustomUser, Profile, ProfileQuerySet, AccountDeletion
+
+
+logger = logging.getLogger(__name__)
+
+# Number of rows deleted per statement, so no statement holds locks for long
+BATCH_SIZE = 500
+# Deletions started longer ago than this are assumed to have been interrupted
+STALE_AFTER = timedelta(hours=1)
+
+
+def request_account_deletion(user):
+    """
+    Deactivate an account, revoke its tokens and queue it for deletion. The
+    deletion starts in a background thread once the transaction commits.
+    """
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        AuthToken.objects.filter(user=user).delete()
+        Token.objects.filter(user=user).delete()
+        deletion, _ = AccountDeletion.objects.get_or_create(user=user)
+        transaction.on_commit(lambda: start_account_deletion(deletion.pk))
+    return deletion
+
+
+def start_account_deletion(deletion_id):
+    threading.Thread(target=_run_in_thread, args=(deletion_id,), daemon=True).start()
+
+
+def _run_in_thread(deletion_id):
+    try:
+        process_account_deletion(deletion_id)
+    except Exception:
+        # The deletion stays queued and is retried by process_account_deletions
+        logger.exception('Account deletion %s failed.', deletion_id)
+    finally:
+        connection.close()
+
+
+def _claimable():
+    # Not started yet, or started so long ago the worker must have died
+    return Q(started_at__isnull=True) | Q(started_at__lt=timezone.now() - STALE_AFTER)
+
+
+def delete_in_batches(queryset, batch_size=BATCH_SIZE):
+    """
+    Delete the rows of a queryset a batch of primary keys at a time. Each
+    batch is its own statement, with the usual delete signals.
+    """
+    count = 0
+    model = queryset.model
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return count
+        count += model.objects.filter(pk__in=ids).delete()[0]
+
+
+def process_account_deletion(deletion_id, batch_size=BATCH_SIZE):
+    """
+    Delete a queued account and everything that references it, in batches.
+    Returns False if the deletion was already claimed by another worker.
+    """
+    claimed = AccountDeletion.objects.filter(_claimable(), pk=deletion_id).update(started_at=timezone.now())
+    if not claimed:
+        return False
+    user = CustomUser.objects.get(deletion__pk=deletion_id)
+
+    # Removing the tags through the relations keeps the tag index, the
+    # territory counts and the search index current
+    profile = Profile.objects.filter(user=user).first()
+    if profile is not None:
+        for name in ProfileQuerySet.RELATED_FIELDS:
+            profile.set_relation(name, [])
+
+    delete_in_batches(UserSocialAuth.objects.filter(user=user), batch_size)
+    delete_in_batches(EventParticipant.objects.filter(participant=user), batch_size)
+    delete_in_batches(Organization.managers.through.objects.filter(customuser=user), batch_size)
+    while True:
+        ids = list(Events.objects.filter(creator=user).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        Events.objects.filter(pk__in=ids).update(creator=None, updated_at=timezone.now())
+
+    attachments = Attachment.objects.filter(bug__user=user)
+    while True:
+        batch = list(attachments[:batch_size])
+        if not batch:
+            break
+        for attachment in batch:
+            if attachment.file:
+                attachment.file.delete(save=False)
+        Attachment.objects.filter(pk__in=[attachment.pk for attachment in batch]).delete()
+    delete_in_batches(Bug.objects.filter(user=user), batch_size)
+
+    # Only the profile and a few rows are left for the cascade
+    user.delete()
+    return True
+
+
+def process_account_deletions(batch_size=BATCH_SIZE):
+    """
+    Process the queued deletions that were not started, or were interrupted.
+    Returns the number of accounts deleted.
+    """
+    count = 0
+    pending = AccountDeletion.objects.filter(_claimable())
+    for deletion_id in pending.order_by('requested_at').values_list('pk', flat=True):
+        if process_account_deletion(deletion_id, batch_size):
+            count += 1
+    return count
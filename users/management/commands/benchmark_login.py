@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from users.benchmark import run_login_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks /api/login/ against a local fake MediaWiki OAuth provider, reporting ' \
+        'the wall time and queries of each login step for first-time and returning users. ' \
+        'Runs on a temporary test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=20,
+            help='Number of simulated users.'
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            reports = run_login_benchmark(options['users'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for phase, rows in reports.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{phase.capitalize()} logins ({options["users"]} users)'))
+            self.stdout.write(f'{"Step":<45}{"Calls":>8}{"ms/call":>12}{"queries/call":>15}')
+            for name, calls, milliseconds, queries in rows:
+                self.stdout.write(f'{name:<45}{calls:>8}{milliseconds:>12.2f}{queries:>15.1f}')
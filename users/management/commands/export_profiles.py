@@ -0,0 +1,57 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from users.models import Profile, ProfileQuerySet
+
+
+# Fields of each JSONL record, read from the user and from the profile.
+# Relations are stored as lists of tag IDs.
+USER_FIELDS = ('username', 'email', 'date_joined', 'is_active')
+PROFILE_FIELDS = (
+    'profile_image', 'display_name', 'pronoun', 'about', 'wikidata_qid',
+    'wiki_alt', 'team', 'contact', 'social',
+)
+RELATED_FIELDS = ProfileQuerySet.RELATED_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Exports the users and their profiles as JSON lines, one profile per line.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', nargs='?', default='-',
+            help='File to write to. Defaults to the standard output.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of profiles read from the database at a time.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['output'] == '-':
+            count = self.export(self.stdout, options['batch_size'])
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                count = self.export(output, options['batch_size'])
+
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f'Exported {count} profiles in {elapsed:.1f}s ({count / max(elapsed, 1e-6):.0f} profiles/s).'
+        )
+
+    def export(self, output, batch_size):
+        # Profiles are streamed in chunks, each with its relations prefetched
+        profiles = Profile.objects.with_relations().order_by('pk').iterator(chunk_size=batch_size)
+        count = 0
+        for profile in profiles:
+            record = {field: getattr(profile.user, field) for field in USER_FIELDS}
+            record.update({field: getattr(profile, field) for field in PROFILE_FIELDS})
+            record.update({
+                field: [obj.pk for obj in getattr(profile, field).all()]
+                for field in RELATED_FIELDS
+            })
+            output.write(json.dumps(record, cls=DjangoJSONEncoder) + '\n')
+            count += 1
+        return count
@@ -0,0 +1,129 @@
+import json
+import sys
+import time
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from users.models import CustomUser, Profile, TerritoryRollup, refresh_skill_counts
+from users.search import index_profiles
+from users.tagindex import tag_index
+from users.management.commands.export_profiles import USER_FIELDS, PROFILE_FIELDS, RELATED_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Imports users and their profiles from JSON lines written by export_profiles. ' \
+        'Users whose username already exists are skipped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', nargs='?', default='-',
+            help='File to read from. Defaults to the standard input.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of profiles written to the database at a time.'
+        )
+
+    def handle(self, *args, **options):
+        # Tag IDs are checked against the existing tags before being inserted
+        self.valid_ids = {
+            field: set(Profile._meta.get_field(field).related_model.objects.values_list('pk', flat=True))
+            for field in RELATED_FIELDS
+        }
+        self.imported = self.skipped = self.unknown_tags = 0
+        self.verbosity = options['verbosity']
+        started = time.monotonic()
+
+        if options['input'] == '-':
+            self.load(sys.stdin, options['batch_size'])
+        else:
+            with open(options['input'], encoding='utf-8') as source:
+                self.load(source, options['batch_size'])
+
+        # Bulk inserts do not send the signals that keep the tag index and
+        # the territory and skill counts current
+        tag_index.invalidate()
+        TerritoryRollup.refresh()
+        refresh_skill_counts()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.imported} profiles in {elapsed:.1f}s '
+            f'({self.imported / max(elapsed, 1e-6):.0f} profiles/s). '
+            f'Skipped {self.skipped} existing users and {self.unknown_tags} unknown tags.'
+        ))
+
+    def load(self, source, batch_size):
+        lines = (line for line in source if line.strip())
+        line_number = 0
+        while True:
+            batch = list(islice(lines, batch_size))
+            if not batch:
+                break
+            records = []
+            for line in batch:
+                line_number += 1
+                try:
+                    records.append(json.loads(line))
+                except ValueError as error:
+                    raise CommandError(f'Invalid JSON on record {line_number}: {error}')
+            self.import_batch(records)
+            if self.verbosity > 1:
+                self.stdout.write(f'{line_number} records read.')
+
+    @transaction.atomic
+    def import_batch(self, records):
+        existing = set(CustomUser.objects.filter(
+            username__in=[record['username'] for record in records]
+        ).values_list('username', flat=True))
+        new_records = {}
+        for record in records:
+            if record['username'] in existing or record['username'] in new_records:
+                self.skipped += 1
+            else:
+                new_records[record['username']] = record
+        if not new_records:
+            return
+
+        # bulk_create does not send post_save, so create_user_profile is not
+        # called and the profiles are created in bulk below. It does not call
+        # CustomUser.save either, which sets username_lower.
+        password = make_password(None)
+        CustomUser.objects.bulk_create([
+            CustomUser(
+                password=password, username_lower=record['username'].lower(),
+                **{field: record[field] for field in USER_FIELDS if field in record}
+            )
+            for record in new_records.values()
+        ])
+        # Primary keys are not returned by bulk_create on every database
+        user_ids = dict(CustomUser.objects.filter(username__in=new_records).values_list('username', 'pk'))
+
+        Profile.objects.bulk_create([
+            Profile(user_id=user_ids[username], **{field: record[field] for field in PROFILE_FIELDS if field in record})
+            for username, record in new_records.items()
+        ])
+        profiles = list(Profile.objects.select_related('user').filter(user_id__in=user_ids.values()))
+        profile_ids = {profile.user.username: profile.pk for profile in profiles}
+        # bulk_create does not call Profile.save, which renders the cards
+        for profile in profiles:
+            profile.card = profile.render_card()
+        Profile.objects.bulk_update(profiles, ['card'], batch_size=500)
+
+        for field in RELATED_FIELDS:
+            relation = Profile._meta.get_field(field)
+            through = relation.remote_field.through
+            source = relation.m2m_field_name() + '_id'
+            target = relation.m2m_reverse_field_name() + '_id'
+            rows = []
+            for username, record in new_records.items():
+                for tag_id in record.get(field) or []:
+                    if tag_id in self.valid_ids[field]:
+                        rows.append(through(**{source: profile_ids[username], target: tag_id}))
+                    else:
+                        self.unknown_tags += 1
+            through.objects.bulk_create(rows, ignore_conflicts=True)
+
+        index_profiles(profiles)
+        self.imported += len(new_records)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from users.deletion import process_account_deletions, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Deletes the accounts queued for deletion that were not deleted in the background, ' \
+        'for instance because the server restarted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Number of rows deleted at a time.'
+        )
+
+    def handle(self, *args, **options):
+        count = process_account_deletions(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} accounts.'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from users.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of the profiles.'
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} profiles.'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from users.similarity import refresh_similar_profiles, stale_profile_ids, TOP_K
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the similar profiles of the profiles changed since the last run. ' \
+        'Meant to run periodically, with --full from time to time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Recompute the similar profiles of every profile.'
+        )
+        parser.add_argument(
+            '--top', type=int, default=TOP_K,
+            help='Number of similar profiles stored for each profile.'
+        )
+
+    def handle(self, *args, **options):
+        profile_ids = None if options['full'] else stale_profile_ids()
+        count = refresh_similar_profiles(profile_ids, k=options['top'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed the similar profiles of {count} profiles.'))
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+
+SQLITE_CREATE = """
+CREATE VIRTUAL TABLE users_profile_search USING fts5(
+    username, email, display_name, about, team,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+MYSQL_CREATE = """
+CREATE TABLE users_profile_search (
+    profile_id bigint NOT NULL PRIMARY KEY,
+    username varchar(100) NOT NULL,
+    email varchar(255) NOT NULL,
+    display_name varchar(387) NOT NULL,
+    about longtext NOT NULL,
+    team varchar(128) NOT NULL,
+    FULLTEXT KEY users_profile_search_fulltext (username, email, display_name, about, team)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+POPULATE = """
+INSERT INTO users_profile_search ({key}, username, email, display_name, about, team)
+SELECT p.id, u.username, COALESCE(u.email, ''), p.display_name, p.about, p.team
+FROM users_profile p INNER JOIN users_customuser u ON u.id = p.user_id
+"""
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        schema_editor.execute(POPULATE.format(key='rowid'))
+    elif vendor == 'mysql':
+        schema_editor.execute(MYSQL_CREATE)
+        schema_editor.execute(POPULATE.format(key='profile_id'))
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'mysql'):
+        schema_editor.execute('DROP TABLE users_profile_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_language_language_autonym'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_cacheversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='Time when the profile, its user or its relations were last updated.', verbose_name='Updated at'),
+            preserve_default=False,
+        ),
+    ]
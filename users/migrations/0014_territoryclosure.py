@@ -0,0 +1,54 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_territory_closure(apps, schema_editor):
+    Territory = apps.get_model('users', 'Territory')
+    TerritoryClosure = apps.get_model('users', 'TerritoryClosure')
+
+    parents = {}
+    for child_id, parent_id in Territory.parent_territory.through.objects.values_list(
+        'from_territory_id', 'to_territory_id'
+    ):
+        parents.setdefault(child_id, []).append(parent_id)
+
+    rows = []
+    for territory_id in Territory.objects.values_list('pk', flat=True):
+        depths = {territory_id: 0}
+        level = [territory_id]
+        while level:
+            next_level = []
+            for node in level:
+                for parent_id in parents.get(node, []):
+                    if parent_id not in depths:
+                        depths[parent_id] = depths[node] + 1
+                        next_level.append(parent_id)
+            level = next_level
+        rows += [
+            TerritoryClosure(ancestor_id=ancestor_id, descendant_id=territory_id, depth=depth)
+            for ancestor_id, depth in depths.items()
+        ]
+    TerritoryClosure.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_profile_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerritoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(verbose_name='Depth')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closure_descendants', to='users.territory', verbose_name='Ancestor')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closure_ancestors', to='users.territory', verbose_name='Descendant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_territory_closure')],
+            },
+        ),
+        migrations.RunPython(build_territory_closure, migrations.RunPython.noop),
+    ]
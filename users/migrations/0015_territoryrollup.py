@@ -0,0 +1,40 @@
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def build_territory_rollup(apps, schema_editor):
+    Territory = apps.get_model('users', 'Territory')
+    TerritoryClosure = apps.get_model('users', 'TerritoryClosure')
+    TerritoryRollup = apps.get_model('users', 'TerritoryRollup')
+
+    counts = {}
+    for relation, field in (('descendant__user_territory', 'user_count'), ('descendant__territory', 'organization_count')):
+        rows = TerritoryClosure.objects.values('ancestor_id').annotate(count=Count(relation, distinct=True))
+        for row in rows:
+            counts.setdefault(row['ancestor_id'], {})[field] = row['count']
+
+    TerritoryRollup.objects.bulk_create([
+        TerritoryRollup(territory_id=territory_id, **counts.get(territory_id, {}))
+        for territory_id in Territory.objects.values_list('pk', flat=True)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orgs', '0005_alter_organization_territory'),
+        ('users', '0014_territoryclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerritoryRollup',
+            fields=[
+                ('territory', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to='users.territory', verbose_name='Territory')),
+                ('user_count', models.PositiveIntegerField(default=0, verbose_name='User count')),
+                ('organization_count', models.PositiveIntegerField(default=0, verbose_name='Organization count')),
+            ],
+        ),
+        migrations.RunPython(build_territory_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_territoryrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('requested_at', models.DateTimeField(auto_now_add=True, verbose_name='Requested at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started at')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='deletion', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_accountdeletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Score')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Rank')),
+                ('computed_at', models.DateTimeField(verbose_name='Computed at')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_profiles', to='users.profile', verbose_name='Profile')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.profile', verbose_name='Similar profile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('profile', 'rank'), name='unique_similar_profile_rank')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_similarprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommonsThumbnail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_title', models.CharField(max_length=255, verbose_name='File title')),
+                ('width', models.PositiveSmallIntegerField(verbose_name='Width')),
+                ('thumbnail_url', models.URLField(blank=True, max_length=1000, null=True, verbose_name='Thumbnail URL')),
+                ('fetched_at', models.DateTimeField(verbose_name='Fetched at')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('file_title', 'width'), name='unique_commons_thumbnail')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+def render_cards(apps, schema_editor):
+    Profile = apps.get_model('users', 'Profile')
+    profiles = []
+    for profile in Profile.objects.select_related('user').only('display_name', 'profile_image', 'user__username').iterator(chunk_size=500):
+        profile.card = {
+            'display_name': profile.display_name,
+            'username': profile.user.username,
+            'profile_image': profile.profile_image,
+        }
+        profiles.append(profile)
+    Profile.objects.bulk_update(profiles, ['card'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_commonsthumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='card',
+            field=models.JSONField(default=dict, editable=False, help_text='Display name, username and image of the profile, as listed in the directory.', verbose_name='Card'),
+        ),
+        migrations.RunPython(render_cards, migrations.RunPython.noop),
+    ]
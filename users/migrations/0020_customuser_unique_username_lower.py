@@ -0,0 +1,16 @@
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_profile_card'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('username'), name='unique_username_lower'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from datetime import timedelta
+from django.db import migrations, models
+from django.db.models import F
+
+
+def set_expiry(apps, schema_editor):
+    CommonsThumbnail = apps.get_model('users', 'CommonsThumbnail')
+    CommonsThumbnail.objects.filter(thumbnail_url__isnull=False).update(expires_at=F('fetched_at') + timedelta(days=30))
+    CommonsThumbnail.objects.filter(thumbnail_url__isnull=True).update(expires_at=F('fetched_at') + timedelta(days=1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0020_customuser_unique_username_lower'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commonsthumbnail',
+            name='expires_at',
+            field=models.DateTimeField(null=True, verbose_name='Expires at'),
+        ),
+        migrations.RunPython(set_expiry, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='commonsthumbnail',
+            name='expires_at',
+            field=models.DateTimeField(verbose_name='Expires at'),
+        ),
+    ]
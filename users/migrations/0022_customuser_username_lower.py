@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+def set_username_lower(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    users = list(CustomUser.objects.only('username'))
+    for user in users:
+        user.username_lower = user.username.lower()
+    CustomUser.objects.bulk_update(users, ['username_lower'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0021_commonsthumbnail_expires_at'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='customuser',
+            name='unique_username_lower',
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='username_lower',
+            field=models.CharField(editable=False, max_length=100, null=True, verbose_name='Lowercased username'),
+        ),
+        migrations.RunPython(set_username_lower, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customuser',
+            name='username_lower',
+            field=models.CharField(db_index=True, editable=False, max_length=100, verbose_name='Lowercased username'),
+        ),
+    ]
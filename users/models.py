@@ -1,11 +1,14 @@
-from django.db import models
+import uuid
+from django.db import models, transaction
+from django.db.models import Case, Count, Exists, OuterRef, Q, F, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, UserManager
 from django.dispatch import receiver
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from orgs.models import Organization
 from skills.models import Skill
-from users.submodels import Territory, Language, WikimediaProject
+from users.submodels import Territory, TerritoryClosure, Language, WikimediaProject
 from django.core.validators import RegexValidator
 
 
@@ -15,6 +18,15 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         max_length=100,
         unique=True
     )
+    # Kept in step with username by save(), and backs the case-insensitive
+    # username lookups with a plain index on every database. It is not
+    # unique, as MediaWiki usernames are case-sensitive after the first letter.
+    username_lower = models.CharField(
+        "Lowercased username",
+        max_length=100,
+        db_index=True,
+        editable=False
+    )
     email = models.EmailField(
         "Email address",
         max_length=255,
@@ -42,6 +54,104 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'username'
     EMAIL_FIELD = 'email'
 
+    def save(self, *args, **kwargs):
+        self.username_lower = self.username.lower()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'username' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'username_lower'}
+        super().save(*args, **kwargs)
+
+
+# Tag types accepted by the tag endpoints and the Profile relation they map to
+TAG_FIELDS = {
+    'skill_known': 'skills_known',
+    'skill_available': 'skills_available',
+    'skill_wanted': 'skills_wanted',
+    'language': 'language',
+    'territory': 'territory',
+    'wikimedia_project': 'wikimedia_project',
+    'affiliation': 'affiliation',
+}
+
+
+def tag_through(tag_type):
+    """
+    Return the through model of a tag type and the name of its tag column.
+    """
+    field = Profile._meta.get_field(TAG_FIELDS[tag_type])
+    return field.remote_field.through, field.m2m_reverse_field_name() + '_id'
+
+
+class ProfileQuerySet(models.QuerySet):
+    # Many-to-many relations serialized as lists of IDs by ProfileSerializer
+    RELATED_FIELDS = (
+        'territory',
+        'language',
+        'affiliation',
+        'wikimedia_project',
+        'skills_known',
+        'skills_available',
+        'skills_wanted',
+    )
+
+    def with_relations(self):
+        """
+        Load the user and every many-to-many relation of the profiles in bulk,
+        so serializing a page of profiles runs a fixed number of queries.
+        """
+        return self.select_related('user').prefetch_related(*self.RELATED_FIELDS)
+
+    def with_tags(self, tags, match_all=True):
+        """
+        Filter the profiles by a list of (tag_type, tag_id) pairs, keeping the
+        profiles that have all of them, or any of them if match_all is False.
+        Each tag becomes an EXISTS clause, so the filter stays a single query.
+        """
+        condition = Q()
+        for tag_type, tag_id in tags:
+            through, column = tag_through(tag_type)
+            exists = Q(Exists(through.objects.filter(profile_id=OuterRef('pk'), **{column: tag_id})))
+            condition = condition & exists if match_all else condition | exists
+        return self.filter(condition)
+
+    def tag_facets(self):
+        """
+        Count the profiles of the queryset for each tag, as a dictionary of
+        {tag_type: {tag_id: count}}, with one UNION ALL query over the
+        through tables.
+        """
+        profile_ids = self.values('pk')
+        counts = []
+        for tag_type in TAG_FIELDS:
+            through, column = tag_through(tag_type)
+            counts.append(
+                through.objects.filter(profile_id__in=profile_ids)
+                .values(column)
+                .annotate(facet=Value(tag_type), tag=F(column), count=Count('pk'))
+                .values('facet', 'tag', 'count')
+            )
+        facets = {tag_type: {} for tag_type in TAG_FIELDS}
+        for row in counts[0].union(*counts[1:], all=True):
+            facets[row['facet']][row['tag']] = row['count']
+        return facets
+
+    def cards(self):
+        """
+        Read the ID and the stored card of each profile, from the profile
+        table alone.
+        """
+        return self.values('pk', 'card')
+
+    def refresh_cards(self):
+        """
+        Regenerate the stored cards of the profiles, after writes that do not
+        go through Profile.save.
+        """
+        profiles = list(self.select_related('user').only('display_name', 'profile_image', 'user__username'))
+        for profile in profiles:
+            profile.card = profile.render_card()
+        self.model.objects.bulk_update(profiles, ['card'], batch_size=500)
+
 
 class Profile(models.Model):
     PRONOUNS = (
@@ -178,12 +288,637 @@ class Profile(models.Model):
         verbose_name="Social medias", 
         help_text="json"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Updated at",
+        help_text="Time when the profile, its user or its relations were last updated."
+    )
+    card = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name="Card",
+        help_text="Display name, username and image of the profile, as listed in the directory."
+    )
+
+    # Fields of the profile copied into its card
+    CARD_FIELDS = ('display_name', 'profile_image')
+
+    objects = ProfileQuerySet.as_manager()
 
     def __str__(self):
         return self.user.username
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(self.CARD_FIELDS):
+            self.card = self.render_card()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'card'}
+        super().save(*args, **kwargs)
+
+    def render_card(self):
+        """
+        Return the small summary of the profile listed by the directory
+        endpoints. The profile ID is read from its own column.
+        """
+        return {
+            'display_name': self.display_name,
+            'username': self.user.username,
+            'profile_image': self.profile_image,
+        }
+
+    def set_relation(self, name, ids):
+        """
+        Replace the objects of a many-to-many relation with the given IDs,
+        deleting and inserting only the through rows that changed.
+
+        The current IDs are read from the prefetch cache when the relation was
+        prefetched. m2m_changed is sent as the related manager would.
+        """
+        field = self._meta.get_field(name)
+        through = field.remote_field.through
+        source = field.m2m_field_name() + '_id'
+        target = field.m2m_reverse_field_name() + '_id'
+
+        current = {obj.pk for obj in getattr(self, name).all()}
+        new = set(ids)
+        changes = (
+            ('remove', current - new),
+            ('add', new - current),
+        )
+        for action, pk_set in changes:
+            if not pk_set:
+                continue
+            signal = {
+                'sender': through, 'instance': self, 'reverse': False,
+                'model': field.related_model, 'pk_set': pk_set, 'using': self._state.db,
+            }
+            m2m_changed.send(action='pre_' + action, **signal)
+            if action == 'remove':
+                through.objects.filter(**{source: self.pk, target + '__in': pk_set}).delete()
+            else:
+                through.objects.bulk_create([through(**{source: self.pk, target: pk}) for pk in pk_set])
+            m2m_changed.send(action='post_' + action, **signal)
+
+    def skill_matches(self, limit=20):
+        """
+        Rank the other profiles by how well they complement this one: the
+        skills they can teach that this profile wants, plus the skills they
+        want that this profile can teach.
+
+        The matching skills are counted in SQL with a subquery per direction
+        over the skill through tables, so only the `limit` best profiles are
+        read, then their skills are listed with one UNION ALL query. Returns
+        a list of (profile_id, can_teach, wants_to_learn) with lists of skill
+        IDs, best match first.
+        """
+        available = Profile.skills_available.through.objects
+        wanted = Profile.skills_wanted.through.objects
+        can_teach = (
+            available
+            .filter(skill_id__in=wanted.filter(profile_id=self.pk).values('skill_id'))
+            .exclude(profile_id=self.pk)
+        )
+        wants_to_learn = (
+            wanted
+            .filter(skill_id__in=available.filter(profile_id=self.pk).values('skill_id'))
+            .exclude(profile_id=self.pk)
+        )
+
+        def count(rows):
+            rows = rows.filter(profile_id=OuterRef('pk')).order_by().values('profile_id')
+            return Coalesce(
+                Subquery(rows.annotate(count=Count('*')).values('count'), output_field=models.IntegerField()),
+                Value(0),
+            )
+
+        # Profiles matching in both directions first, then by number of skills
+        ranked = list(
+            Profile.objects
+            .filter(Q(pk__in=can_teach.values('profile_id')) | Q(pk__in=wants_to_learn.values('profile_id')))
+            .annotate(teach=count(can_teach), learn=count(wants_to_learn))
+            .annotate(
+                mutual=Case(When(teach__gt=0, learn__gt=0, then=Value(1)), default=Value(0)),
+                score=F('teach') + F('learn'),
+            )
+            .order_by('-mutual', '-score', 'pk')
+            .values_list('pk', flat=True)[:limit]
+        )
+        if not ranked:
+            return []
+
+        matches = {profile_id: ([], []) for profile_id in ranked}
+        rows = can_teach.filter(profile_id__in=ranked).values('profile_id', 'skill_id').annotate(direction=Value('teach')).union(
+            wants_to_learn.filter(profile_id__in=ranked).values('profile_id', 'skill_id').annotate(direction=Value('learn')),
+            all=True,
+        )
+        for row in rows:
+            matches[row['profile_id']][0 if row['direction'] == 'teach' else 1].append(row['skill_id'])
+        return [
+            (profile_id, sorted(teach), sorted(learn))
+            for profile_id, (teach, learn) in matches.items()
+        ]
+
+
+class CacheVersion(models.Model):
+    """
+    Version token of a derived data set kept in memory by each process.
+
+    Writers bump the token in the same transaction as the change, or right
+    after it commits, so a process can tell its copy is stale when its token
+    no longer matches the database, including after changes made by other
+    processes.
+    """
+    name = models.CharField(
+        verbose_name="Name",
+        max_length=64,
+        unique=True
+    )
+    token = models.CharField(
+        verbose_name="Token",
+        max_length=32
+    )
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def get(cls, name):
+        return cls.objects.filter(name=name).values_list('token', flat=True).first() or ''
+
+    @classmethod
+    def bump(cls, name):
+        """
+        Replace the token of a data set and return the (old, new) tokens.
+
+        The token is swapped with a conditional UPDATE instead of a locking
+        read, retried if another writer swapped it first, so concurrent
+        writers do not queue on the row.
+        """
+        token = uuid.uuid4().hex
+        while True:
+            previous = cls.get(name)
+            if not previous:
+                _, created = cls.objects.get_or_create(name=name, defaults={'token': token})
+                if created:
+                    return '', token
+                continue
+            if cls.objects.filter(name=name, token=previous).update(token=token):
+                return previous, token
+
+
+
+class AccountDeletion(models.Model):
+    """
+    Pending deletion of an account, processed in the background by
+    users.deletion. The row is deleted together with the user.
+    """
+    user = models.OneToOneField(
+        CustomUser,
+        verbose_name="User",
+        on_delete=models.CASCADE,
+        related_name="deletion"
+    )
+    requested_at = models.DateTimeField(
+        verbose_name="Requested at",
+        auto_now_add=True
+    )
+    started_at = models.DateTimeField(
+        verbose_name="Started at",
+        null=True,
+        blank=True
+    )
+
+    def __str__(self):
+        return str(self.user_id)
+
+class SimilarProfile(models.Model):
+    """
+    Precomputed neighbour of a profile by similarity of skills, languages
+    and Wikimedia projects, maintained by users.similarity.
+    """
+    profile = models.ForeignKey(
+        Profile,
+        verbose_name="Profile",
+        on_delete=models.CASCADE,
+        related_name="similar_profiles"
+    )
+    similar = models.ForeignKey(
+        Profile,
+        verbose_name="Similar profile",
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    score = models.FloatField(
+        verbose_name="Score"
+    )
+    rank = models.PositiveSmallIntegerField(
+        verbose_name="Rank"
+    )
+    computed_at = models.DateTimeField(
+        verbose_name="Computed at"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'rank'], name='unique_similar_profile_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.profile_id} ~ {self.similar_id}'
+
+
+class TerritoryRollup(models.Model):
+    """
+    Number of users and organizations in a territory or in any territory
+    under it, each counted once.
+    """
+    territory = models.OneToOneField(
+        Territory,
+        verbose_name="Territory",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="rollup"
+    )
+    user_count = models.PositiveIntegerField(
+        verbose_name="User count",
+        default=0
+    )
+    organization_count = models.PositiveIntegerField(
+        verbose_name="Organization count",
+        default=0
+    )
+
+    def __str__(self):
+        return str(self.territory_id)
+
+    @classmethod
+    def refresh(cls, territory_ids=None):
+        """
+        Recount the given territories, or all territories when None, from the
+        territory closure with one grouped query per relation. Changes of the
+        territories of profiles and organizations are applied as deltas by
+        update_territory_rollup, this is for changes of the territory tree,
+        imports and reconciliation.
+        """
+        closure = TerritoryClosure.objects.all()
+        territories = Territory.objects.all()
+        if territory_ids is not None:
+            closure = closure.filter(ancestor_id__in=territory_ids)
+            territories = territories.filter(pk__in=territory_ids)
+        territory_ids = list(territories.values_list('pk', flat=True))
+
+        counts = {}
+        for relation, field in (('descendant__user_territory', 'user_count'), ('descendant__territory', 'organization_count')):
+            rows = closure.values('ancestor_id').annotate(count=Count(relation, distinct=True))
+            for row in rows:
+                counts.setdefault(row['ancestor_id'], {})[field] = row['count']
+
+        with transaction.atomic():
+            cls.objects.filter(territory_id__in=territory_ids).delete()
+            cls.objects.bulk_create([
+                cls(territory_id=territory_id, **counts.get(territory_id, {}))
+                for territory_id in territory_ids
+            ], batch_size=1000)
+
+
+class CommonsThumbnail(models.Model):
+    """
+    Thumbnail URL of a Commons file at a given width, as resolved by
+    users.commons. A missing thumbnail URL means the file does not exist,
+    or could not be looked up yet. Expired entries are still served while
+    they are looked up again.
+    """
+    file_title = models.CharField(
+        verbose_name="File title",
+        max_length=255
+    )
+    width = models.PositiveSmallIntegerField(
+        verbose_name="Width"
+    )
+    thumbnail_url = models.URLField(
+        verbose_name="Thumbnail URL",
+        max_length=1000,
+        null=True,
+        blank=True
+    )
+    fetched_at = models.DateTimeField(
+        verbose_name="Fetched at"
+    )
+    expires_at = models.DateTimeField(
+        verbose_name="Expires at"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['file_title', 'width'], name='unique_commons_thumbnail'),
+        ]
+
+    def __str__(self):
+        return f'{self.file_title} ({self.width}px)'
 
 @receiver(post_save, sender=CustomUser)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
+
+
+
+def touch_profiles(profiles):
+    """
+    Set updated_at of a queryset of profiles to now, without saving them.
+    """
+    profiles.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=CustomUser)
+def touch_user_profile(sender, instance, created, **kwargs):
+    # The user is serialized inside the profile
+    if not created:
+        touch_profiles(Profile.objects.filter(user=instance))
+
+
+@receiver(post_save, sender=CustomUser)
+def refresh_user_card(sender, instance, created, update_fields, **kwargs):
+    # New users get their card with their profile
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    profiles = Profile.objects.filter(user=instance)
+    if any(card.get('username') != instance.username for card in profiles.values_list('card', flat=True)):
+        profiles.refresh_cards()
+
+
+@receiver(m2m_changed)
+def touch_profile_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    names = [
+        name for name in ProfileQuerySet.RELATED_FIELDS
+        if Profile._meta.get_field(name).remote_field.through is sender
+    ]
+    if not names:
+        return
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        instance.updated_at = timezone.now()
+        touch_profiles(Profile.objects.filter(pk=instance.pk))
+    elif reverse and action in ('post_add', 'post_remove') and pk_set:
+        touch_profiles(Profile.objects.filter(pk__in=pk_set))
+    elif reverse and action == 'pre_clear':
+        touch_profiles(Profile.objects.filter(**{names[0]: instance}))
+
+
+def touch_tag_holders(sender, instance, **kwargs):
+    # Deleting a tag removes it from the profiles without m2m_changed
+    for name in ProfileQuerySet.RELATED_FIELDS:
+        if Profile._meta.get_field(name).related_model is sender:
+            touch_profiles(Profile.objects.filter(**{name: instance}))
+
+
+for name in ProfileQuerySet.RELATED_FIELDS:
+    pre_delete.connect(
+        touch_tag_holders,
+        sender=Profile._meta.get_field(name).remote_field.model,
+        dispatch_uid='touch_tag_holders',
+    )
+
+
+# Counter of Skill kept for each skill tag type
+SKILL_COUNT_FIELDS = {
+    'skill_known': 'known_count',
+    'skill_available': 'available_count',
+    'skill_wanted': 'wanted_count',
+}
+
+
+def refresh_skill_counts(skill_ids=None):
+    """
+    Recount the profiles holding the given skills, or all skills when None,
+    with a single UPDATE. The counters are kept current by the m2m_changed
+    receivers below, this repairs them after bulk writes.
+    """
+    counts = {}
+    for tag_type, count_field in SKILL_COUNT_FIELDS.items():
+        through, column = tag_through(tag_type)
+        rows = through.objects.filter(**{column: OuterRef('pk')}).order_by().values(column)
+        counts[count_field] = Coalesce(
+            Subquery(rows.annotate(count=Count('*')).values('count'), output_field=models.IntegerField()),
+            Value(0),
+        )
+    skills = Skill.objects.all()
+    if skill_ids is not None:
+        skills = skills.filter(pk__in=skill_ids)
+    skills.update(**counts)
+
+
+def adjust_skill_counts(count_field, skill_ids, delta):
+    if skill_ids and delta:
+        Skill.objects.filter(pk__in=skill_ids).update(**{count_field: F(count_field) + delta})
+
+
+def skill_count_relation(sender):
+    """
+    Return the through model, profile column, skill column and counter of
+    a skill relation of Profile, or None for other relations.
+    """
+    for tag_type, count_field in SKILL_COUNT_FIELDS.items():
+        through, column = tag_through(tag_type)
+        if through is sender:
+            field = Profile._meta.get_field(TAG_FIELDS[tag_type])
+            return through, field.m2m_field_name() + '_id', column, count_field
+    return None
+
+
+@receiver(m2m_changed)
+def update_skill_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    relation = skill_count_relation(sender)
+    if relation is None:
+        return
+    through, profile_column, skill_column, count_field = relation
+    # pk_set of a removal may hold IDs that were not linked, so the links are read first
+    if not reverse:
+        # The instance is a profile
+        links = through.objects.filter(**{profile_column: instance.pk})
+        if action == 'post_add':
+            adjust_skill_counts(count_field, pk_set, 1)
+        elif action == 'pre_remove':
+            instance._removed_skills = set(links.filter(**{skill_column + '__in': pk_set}).values_list(skill_column, flat=True))
+        elif action == 'pre_clear':
+            instance._removed_skills = set(links.values_list(skill_column, flat=True))
+        elif action in ('post_remove', 'post_clear'):
+            adjust_skill_counts(count_field, getattr(instance, '_removed_skills', set()), -1)
+    else:
+        # The instance is a skill
+        links = through.objects.filter(**{skill_column: instance.pk})
+        if action == 'post_add':
+            adjust_skill_counts(count_field, [instance.pk], len(pk_set))
+        elif action == 'pre_remove':
+            instance._removed_profiles = links.filter(**{profile_column + '__in': pk_set}).count()
+        elif action == 'post_remove':
+            adjust_skill_counts(count_field, [instance.pk], -getattr(instance, '_removed_profiles', 0))
+        elif action == 'post_clear':
+            Skill.objects.filter(pk=instance.pk).update(**{count_field: 0})
+
+
+@receiver(pre_delete, sender=Profile)
+def collect_profile_skills(sender, instance, **kwargs):
+    # Deleting a profile removes its skills without m2m_changed
+    instance._counted_skills = {
+        count_field: set(getattr(instance, TAG_FIELDS[tag_type]).values_list('pk', flat=True))
+        for tag_type, count_field in SKILL_COUNT_FIELDS.items()
+    }
+
+
+@receiver(post_delete, sender=Profile)
+def discount_profile_skills(sender, instance, **kwargs):
+    for count_field, skill_ids in getattr(instance, '_counted_skills', {}).items():
+        adjust_skill_counts(count_field, skill_ids, -1)
+
+
+def rebuild_territory_closure(territory_ids):
+    # The rollups of the ancestors the territories left or joined change too
+    TerritoryRollup.refresh(TerritoryClosure.rebuild(territory_ids))
+
+
+@receiver(post_save, sender=Territory)
+def add_territory_closure(sender, instance, created, **kwargs):
+    if created:
+        rebuild_territory_closure([instance.pk])
+
+
+@receiver(m2m_changed, sender=Territory.parent_territory.through)
+def update_territory_closure(sender, instance, action, reverse, pk_set, **kwargs):
+    # Changing the parents of a territory moves its whole subtree
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        rebuild_territory_closure(TerritoryClosure.subtree([instance.pk]))
+    elif reverse and action in ('post_add', 'post_remove') and pk_set:
+        rebuild_territory_closure(TerritoryClosure.subtree(pk_set))
+    elif reverse and action == 'pre_clear':
+        instance._closure_subtree = TerritoryClosure.subtree(
+            instance.territory_parent.values_list('pk', flat=True)
+        )
+    elif reverse and action == 'post_clear':
+        rebuild_territory_closure(getattr(instance, '_closure_subtree', None))
+
+
+@receiver(pre_delete, sender=Territory)
+def collect_territory_subtree(sender, instance, **kwargs):
+    # The parent links of the descendants are deleted without m2m_changed
+    instance._closure_subtree = TerritoryClosure.subtree([instance.pk]) - {instance.pk}
+    instance._closure_ancestors = TerritoryClosure.ancestors([instance.pk]) - {instance.pk}
+
+
+@receiver(post_delete, sender=Territory)
+def delete_territory_closure(sender, instance, **kwargs):
+    affected = TerritoryClosure.rebuild(getattr(instance, '_closure_subtree', None))
+    if affected is not None:
+        affected |= getattr(instance, '_closure_ancestors', set())
+    TerritoryRollup.refresh(affected)
+
+
+def territory_relations():
+    # Territory relation of each model counted by TerritoryRollup, and its counter
+    return {
+        Profile.territory.through: (Profile.territory.field, 'user_count'),
+        Organization.territory.through: (Organization.territory.field, 'organization_count'),
+    }
+
+
+def adjust_territory_rollup(count_field, changes):
+    """
+    Apply the changes of the territories of some profiles or organizations
+    to the rollups of the territories above them, without recounting.
+
+    `changes` holds a (changed, kept, sign) tuple per holder: the IDs of the
+    territories it gained (sign 1) or lost (sign -1), and of the ones it
+    still has. A holder enters or leaves the subtree of an ancestor only if
+    none of its kept territories is under it, since it is counted once.
+    """
+    changes = [(changed, kept, sign) for changed, kept, sign in changes if changed]
+    territory_ids = set()
+    for changed, kept, _ in changes:
+        territory_ids |= set(changed) | set(kept)
+    if not territory_ids:
+        return
+    ancestors = {}
+    for descendant_id, ancestor_id in TerritoryClosure.objects.filter(
+        descendant_id__in=territory_ids
+    ).values_list('descendant_id', 'ancestor_id'):
+        ancestors.setdefault(descendant_id, set()).add(ancestor_id)
+
+    deltas = {}
+    for changed, kept, sign in changes:
+        covered = set().union(*(ancestors.get(territory_id, set()) for territory_id in kept))
+        for ancestor_id in set().union(*(ancestors.get(territory_id, set()) for territory_id in changed)) - covered:
+            deltas[ancestor_id] = deltas.get(ancestor_id, 0) + sign
+
+    groups = {}
+    for ancestor_id, delta in deltas.items():
+        if delta:
+            groups.setdefault(delta, []).append(ancestor_id)
+    for delta, ancestor_ids in groups.items():
+        updated = TerritoryRollup.objects.filter(territory_id__in=ancestor_ids).update(
+            **{count_field: F(count_field) + delta}
+        )
+        if updated < len(ancestor_ids):
+            # Territories without a rollup yet are counted from scratch
+            existing = TerritoryRollup.objects.filter(territory_id__in=ancestor_ids).values_list('territory_id', flat=True)
+            TerritoryRollup.refresh(set(ancestor_ids) - set(existing))
+
+
+@receiver(m2m_changed)
+def update_territory_rollup(sender, instance, action, reverse, pk_set, **kwargs):
+    relations = territory_relations()
+    if sender not in relations:
+        return
+    field, count_field = relations[sender]
+    holder_column = field.m2m_field_name() + '_id'
+    territory_column = field.m2m_reverse_field_name() + '_id'
+    links = sender.objects.all()
+
+    if not reverse:
+        # The instance is a profile or an organization, pk_set its territories
+        links = links.filter(**{holder_column: instance.pk})
+        if action == 'pre_remove':
+            instance._rollup_territories = set(
+                links.filter(**{territory_column + '__in': pk_set}).values_list(territory_column, flat=True)
+            )
+        elif action == 'pre_clear':
+            instance._rollup_territories = set(links.values_list(territory_column, flat=True))
+        elif action in ('post_add', 'post_remove', 'post_clear'):
+            changed = pk_set if action == 'post_add' else getattr(instance, '_rollup_territories', set())
+            kept = set(links.values_list(territory_column, flat=True)) - set(changed)
+            adjust_territory_rollup(count_field, [(changed, kept, 1 if action == 'post_add' else -1)])
+        return
+
+    # The instance is a territory, pk_set the profiles or organizations
+    if action == 'pre_remove':
+        instance._rollup_holders = set(
+            links.filter(**{territory_column: instance.pk, holder_column + '__in': pk_set})
+            .values_list(holder_column, flat=True)
+        )
+    elif action == 'pre_clear':
+        instance._rollup_holders = set(
+            links.filter(**{territory_column: instance.pk}).values_list(holder_column, flat=True)
+        )
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        holder_ids = pk_set if action == 'post_add' else getattr(instance, '_rollup_holders', set())
+        kept = {holder_id: set() for holder_id in holder_ids or ()}
+        for holder_id, territory_id in links.filter(**{holder_column + '__in': list(kept)}).exclude(
+            **{territory_column: instance.pk}
+        ).values_list(holder_column, territory_column):
+            kept[holder_id].add(territory_id)
+        sign = 1 if action == 'post_add' else -1
+        adjust_territory_rollup(count_field, [({instance.pk}, territories, sign) for territories in kept.values()])
+
+
+def collect_rollup_territories(sender, instance, **kwargs):
+    # Deleting a profile or an organization removes its territories without m2m_changed
+    instance._rollup_territories = set(instance.territory.values_list('pk', flat=True))
+
+
+def discount_rollup_territories(sender, instance, **kwargs):
+    count_field = 'user_count' if sender is Profile else 'organization_count'
+    adjust_territory_rollup(count_field, [(getattr(instance, '_rollup_territories', set()), set(), -1)])
+
+
+for model in (Profile, Organization):
+    pre_delete.connect(collect_rollup_territories, sender=model, dispatch_uid=f'rollup_{model.__name__}')
+    post_delete.connect(discount_rollup_territories, sender=model, dispatch_uid=f'rollup_{model.__name__}')
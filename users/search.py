@@ -0,0 +1,212 @@
+import re
+import sys
+from django.db import connection
+from django.db.models import Case, When, IntegerField
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework import filters
+from users.models import Profile, CustomUser
+
+
+SEARCH_TABLE = 'users_profile_search'
+
+# Columns copied into the search table, in the order they are stored
+SEARCH_COLUMNS = ('username', 'email', 'display_name', 'about', 'team')
+
+
+def _clean_terms(terms):
+    # Keep only the word characters of each term, so user input cannot
+    # inject operators of the full-text query syntax
+    cleaned = []
+    for term in terms:
+        cleaned += re.findall(r'\w+', term)
+    return cleaned
+
+
+class SQLiteSearchBackend:
+    """
+    Full-text index stored in an SQLite FTS5 virtual table, ranked with BM25.
+    """
+    # BM25 weights of the columns in SEARCH_COLUMNS
+    weights = (10.0, 5.0, 8.0, 1.0, 2.0)
+
+    def index(self, cursor, rows):
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [[row[0]] for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, {", ".join(SEARCH_COLUMNS)}) '
+            f'VALUES (%s, {", ".join(["%s"] * len(SEARCH_COLUMNS))})',
+            rows
+        )
+
+    def delete(self, cursor, profile_id):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [profile_id])
+
+    def search(self, cursor, terms, limit):
+        query = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        cursor.execute(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+            f'ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s',
+            [query, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class MySQLSearchBackend:
+    """
+    Full-text index stored in an InnoDB table with a FULLTEXT key, ranked by
+    the relevance returned by MATCH ... AGAINST.
+    """
+
+    def index(self, cursor, rows):
+        cursor.executemany(
+            f'REPLACE INTO {SEARCH_TABLE} (profile_id, {", ".join(SEARCH_COLUMNS)}) '
+            f'VALUES (%s, {", ".join(["%s"] * len(SEARCH_COLUMNS))})',
+            rows
+        )
+
+    def delete(self, cursor, profile_id):
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE profile_id = %s', [profile_id])
+
+    def search(self, cursor, terms, limit):
+        query = ' '.join(f'+{term}*' for term in terms)
+        match = f'MATCH ({", ".join(SEARCH_COLUMNS)}) AGAINST (%s IN BOOLEAN MODE)'
+        cursor.execute(
+            f'SELECT profile_id FROM {SEARCH_TABLE} WHERE {match} '
+            f'ORDER BY {match} DESC LIMIT %s',
+            [query, query, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'mysql': MySQLSearchBackend,
+}
+
+
+def get_search_backend():
+    """
+    Return the search backend for the database in use, or None if the
+    database has no full-text index.
+    """
+    backend = SEARCH_BACKENDS.get(connection.vendor)
+    return backend() if backend else None
+
+
+def index_profiles(profiles):
+    """
+    Write the search rows of a batch of profiles, with their users loaded.
+    """
+    backend = get_search_backend()
+    if backend is None or not profiles:
+        return
+    rows = [
+        (
+            profile.pk,
+            profile.user.username,
+            profile.user.email or '',
+            profile.display_name,
+            profile.about,
+            profile.team,
+        )
+        for profile in profiles
+    ]
+    with connection.cursor() as cursor:
+        backend.index(cursor, rows)
+
+
+def index_profile(profile):
+    index_profiles([profile])
+
+
+def unindex_profile(profile_id):
+    backend = get_search_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        backend.delete(cursor, profile_id)
+
+
+def search_profiles(terms, limit):
+    """
+    Return the IDs of the profiles matching all the terms, best match first.
+    """
+    backend = get_search_backend()
+    with connection.cursor() as cursor:
+        return backend.search(cursor, terms, limit)
+
+
+def rebuild_search_index(batch_size=1000):
+    backend = get_search_backend()
+    if backend is None:
+        return 0
+    count = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    batch = []
+    for profile in Profile.objects.select_related('user').iterator(chunk_size=batch_size):
+        batch.append(profile)
+        if len(batch) == batch_size:
+            index_profiles(batch)
+            count += len(batch)
+            batch = []
+    index_profiles(batch)
+    return count + len(batch)
+
+
+class ProfileSearchFilter(filters.SearchFilter):
+    """
+    Search filter backed by the full-text index of the profiles.
+
+    Results are ordered by relevance, and annotated with their rank as
+    `search_rank`, which OptionalCursorPagination pages by. Paginated
+    requests read the ranked IDs up to the end of the requested page, so
+    every match can be reached; other requests are limited to the best
+    `max_results` matches. Falls back to the regular SearchFilter when the
+    database has no full-text index.
+    """
+    max_results = 500
+
+    def filter_queryset(self, request, queryset, view):
+        if get_search_backend() is None:
+            return super().filter_queryset(request, queryset, view)
+
+        terms = _clean_terms(self.get_search_terms(request))
+        if not terms:
+            return queryset
+
+        paginator = getattr(view, 'paginator', None)
+        if paginator is not None and paginator.is_paginated(request):
+            ranks = paginator.window(request, range(sys.maxsize))
+        else:
+            ranks = range(self.max_results)
+        ids = search_profiles(terms, ranks.stop)[ranks.start:]
+        if not ids:
+            return queryset.none()
+        rank = Case(
+            *[When(pk=pk, then=position) for position, pk in enumerate(ids, start=ranks.start)],
+            output_field=IntegerField(),
+        )
+        return queryset.filter(pk__in=ids).annotate(search_rank=rank).order_by('search_rank')
+
+
+@receiver(post_save, sender=Profile)
+def update_profile_search(sender, instance, **kwargs):
+    index_profile(instance)
+
+
+@receiver(post_delete, sender=Profile)
+def delete_profile_search(sender, instance, **kwargs):
+    unindex_profile(instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+def update_user_search(sender, instance, created, **kwargs):
+    # New users are indexed when their profile is created
+    if created:
+        return
+    profile = Profile.objects.filter(user=instance).first()
+    if profile is not None:
+        profile.user = instance
+        index_profile(profile)
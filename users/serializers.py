@@ -1,7 +1,11 @@
+from itertools import islice
+from django.db import transaction
 from rest_framework import serializers
-from .models import Profile, CustomUser
+from .models import Profile, ProfileQuerySet, CustomUser
 from .submodels import Territory, Language, WikimediaProject
 from orgs.models import Organization
+from CapX.fieldsets import SparseFieldsetSerializerMixin
+from users.commons import CommonsThumbnailField, CommonsThumbnailListSerializer, resolve_thumbnails
 
    
 class UserSerializer(serializers.ModelSerializer):
@@ -51,14 +55,17 @@ class OrganizationSerializer(serializers.ModelSerializer):
         model = Organization
         fields = ['id', 'display_name']
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer()
+    profile_image_thumbnail = CommonsThumbnailField(source='profile_image')
     
     class Meta:
         model = Profile
+        list_serializer_class = CommonsThumbnailListSerializer
         fields = [
             'user',
             'profile_image',
+            'profile_image_thumbnail',
             'display_name',
             'pronoun',
             'about',
@@ -77,13 +84,24 @@ class ProfileSerializer(serializers.ModelSerializer):
         ]
 
     # Override the update method to allow write access to the nested user object
+    # and to write only the many-to-many rows that changed
     def update(self, instance, validated_data):
         user_data = validated_data.pop('user', None)
-        if user_data is not None:
-            user = instance.user
-            user.email = user_data.get('email', user.email)
-            user.save()
-        return super().update(instance, validated_data)
+        relations = {
+            name: validated_data.pop(name)
+            for name in ProfileQuerySet.RELATED_FIELDS if name in validated_data
+        }
+        with transaction.atomic():
+            if user_data is not None:
+                user = instance.user
+                email = user_data.get('email', user.email)
+                if email != user.email:
+                    user.email = email
+                    user.save()
+            instance = super().update(instance, validated_data)
+            for name, objects in relations.items():
+                instance.set_relation(name, [obj.pk for obj in objects])
+        return instance
 
 class UsersBySkillSerializer(serializers.ModelSerializer):
     user = UserSerializer()
@@ -105,12 +123,34 @@ class UsersBySkillSerializer(serializers.ModelSerializer):
 
 class UsersByTagSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username')
+    profile_image_thumbnail = CommonsThumbnailField(source='profile_image')
 
     class Meta:
         model = Profile
+        list_serializer_class = CommonsThumbnailListSerializer
         fields = [
             'id', 
             'display_name', 
             'username', 
-            'profile_image'
+            'profile_image',
+            'profile_image_thumbnail',
+        ]
+
+
+def profile_cards(rows, chunk_size=500):
+    """
+    Return the UsersByTagSerializer representation of rows of profile IDs and
+    stored cards, as read by ProfileQuerySet.cards, without loading the
+    profiles or their users. The rows are consumed chunk_size at a time, with
+    one thumbnail lookup per chunk, so an iterator over a server-side cursor
+    is never held in memory as a whole, only the cards built from it.
+    """
+    rows = iter(rows)
+    cards = []
+    while chunk := list(islice(rows, chunk_size)):
+        thumbnails = resolve_thumbnails([row['card'].get('profile_image') for row in chunk])
+        cards += [
+            {'id': row['pk'], **row['card'], 'profile_image_thumbnail': thumbnails.get(row['card'].get('profile_image'))}
+            for row in chunk
         ]
+    return cards
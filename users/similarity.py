@@ -0,0 +1,176 @@
+import heapq
+from collections import Counter
+from itertools import chain
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Value
+from django.utils import timezone
+from users.models import Profile, SimilarProfile, tag_through
+
+
+# Tags compared between profiles. The same skill known and wanted are
+# different features.
+SIMILARITY_TAG_TYPES = ('skill_known', 'skill_wanted', 'language', 'wikimedia_project')
+# Number of neighbours stored for each profile
+TOP_K = 20
+
+
+class FeatureMatrix:
+    """
+    Sparse profile x tag matrix, stored by rows and by columns: each profile
+    has the set of its features, and each feature the sorted list of the
+    profiles holding it. The Jaccard similarity of two profiles is
+    |a & b| / (|a| + |b| - |a & b|).
+
+    Features held by more than `max_postings` profiles, such as a common
+    language, still count in the scores but are not walked to find
+    candidates, so the work per profile does not grow with the number of
+    profiles. Candidates are the `max_candidates` profiles sharing the most
+    uncommon features, topped up from the common features for profiles with
+    too few of them, and each is scored with one set intersection.
+    """
+
+    def __init__(self, max_postings=None, max_candidates=None):
+        self.rows = {}
+        self.columns = {}
+        # Number of profiles holding a feature, where it is more than the
+        # loaded column
+        self.frequencies = {}
+        self.max_postings = max_postings or getattr(settings, 'SIMILARITY_MAX_POSTINGS', 200)
+        self.max_candidates = max_candidates or getattr(settings, 'SIMILARITY_MAX_CANDIDATES', 200)
+
+    @staticmethod
+    def _rows(**filters):
+        queries = []
+        for tag_type in SIMILARITY_TAG_TYPES:
+            through, column = tag_through(tag_type)
+            queries.append(
+                through.objects.filter(**filters)
+                .annotate(tag_type=Value(tag_type), tag_id=F(column))
+                .values_list('tag_type', 'tag_id', 'profile_id')
+            )
+        return queries[0].union(*queries[1:], all=True)
+
+    @classmethod
+    def load(cls, profile_ids=None, **options):
+        """
+        Load the rows needed to score the given profiles, or every row when
+        None: those of the profiles and of their candidates, read from the
+        through tables.
+        """
+        matrix = cls(**options)
+        if profile_ids is None:
+            rows = cls._rows()
+        else:
+            tags = {}
+            for tag_type, tag_id, _ in cls._rows(profile_id__in=profile_ids):
+                tags.setdefault(tag_type, set()).add(tag_id)
+            candidates = set(profile_ids)
+            for tag_type, tag_ids in tags.items():
+                through, column = tag_through(tag_type)
+                counts = dict(
+                    through.objects.filter(**{column + '__in': tag_ids})
+                    .values_list(column).annotate(count=Count('pk')).order_by()
+                )
+                matrix.frequencies.update(((tag_type, tag_id), count) for tag_id, count in counts.items())
+                common = {tag_id for tag_id, count in counts.items() if count > matrix.max_postings}
+                candidates.update(
+                    through.objects.filter(**{column + '__in': tag_ids - common}).values_list('profile_id', flat=True)
+                )
+                # The first profiles of the common features, as walked by
+                # neighbours() to top up the candidates
+                for tag_id in common:
+                    candidates.update(
+                        through.objects.filter(**{column: tag_id}).order_by('profile_id')
+                        .values_list('profile_id', flat=True)[:matrix.max_candidates + len(profile_ids)]
+                    )
+            rows = cls._rows(profile_id__in=candidates)
+
+        for tag_type, tag_id, profile_id in rows:
+            feature = (tag_type, tag_id)
+            matrix.rows.setdefault(profile_id, set()).add(feature)
+            matrix.columns.setdefault(feature, []).append(profile_id)
+        for column in matrix.columns.values():
+            column.sort()
+        return matrix
+
+    def frequency(self, feature):
+        return self.frequencies.get(feature) or len(self.columns.get(feature, ()))
+
+    def neighbours(self, profile_id, k=TOP_K):
+        """
+        Return the k profiles most similar to a profile as (profile_id,
+        score) pairs, best first. Only candidates sharing at least one
+        feature are scored.
+        """
+        row = self.rows.get(profile_id)
+        if not row:
+            return []
+        common = sorted(
+            (feature for feature in row if self.frequency(feature) > self.max_postings),
+            key=lambda feature: (self.frequency(feature), feature),
+        )
+        shared = Counter(chain.from_iterable(self.columns[feature] for feature in row.difference(common)))
+        shared.pop(profile_id, None)
+        candidates = [
+            other for other, _ in
+            heapq.nsmallest(self.max_candidates, shared.items(), key=lambda item: (-item[1], item[0]))
+        ]
+
+        if len(candidates) < k and common:
+            seen = {profile_id, *candidates}
+            for other in chain.from_iterable(self.columns[feature] for feature in common):
+                if len(candidates) >= self.max_candidates:
+                    break
+                if other not in seen:
+                    seen.add(other)
+                    candidates.append(other)
+
+        scores = (
+            (other, count / (len(row) + len(self.rows[other]) - count))
+            for other in candidates
+            for count in [len(row & self.rows[other])]
+        )
+        # Ties are broken by profile ID, so results are stable
+        return heapq.nsmallest(k, scores, key=lambda item: (-item[1], item[0]))
+
+
+def stale_profile_ids():
+    """
+    Return the IDs of the profiles changed since their neighbours were
+    computed, or never computed.
+    """
+    return list(
+        Profile.objects.annotate(computed_at=Max('similar_profiles__computed_at'))
+        .filter(Q(computed_at__isnull=True) | Q(updated_at__gt=F('computed_at')))
+        .values_list('pk', flat=True)
+    )
+
+
+def refresh_similar_profiles(profile_ids=None, k=TOP_K, batch_size=500):
+    """
+    Recompute and store the neighbours of the given profiles, or of all
+    profiles when None. Returns the number of profiles refreshed.
+
+    Neighbour lists of other profiles are not updated when a profile
+    changes, so the full refresh is meant to run periodically as well.
+    """
+    if profile_ids is None:
+        matrix = FeatureMatrix.load()
+        profile_ids = list(Profile.objects.values_list('pk', flat=True))
+    else:
+        profile_ids = list(profile_ids)
+        matrix = FeatureMatrix.load(profile_ids)
+
+    for start in range(0, len(profile_ids), batch_size):
+        batch = profile_ids[start:start + batch_size]
+        computed_at = timezone.now()
+        rows = [
+            SimilarProfile(profile_id=profile_id, similar_id=other, score=score, rank=rank, computed_at=computed_at)
+            for profile_id in batch
+            for rank, (other, score) in enumerate(matrix.neighbours(profile_id, k), start=1)
+        ]
+        with transaction.atomic():
+            SimilarProfile.objects.filter(profile_id__in=batch).delete()
+            SimilarProfile.objects.bulk_create(rows)
+    return len(profile_ids)
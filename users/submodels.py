@@ -1,4 +1,5 @@
 from django.db import models
+from CapX.closure import ClosureTableMixin
 
 class Territory(models.Model):
     territory_name = models.CharField(
@@ -20,6 +21,37 @@ class Territory(models.Model):
         return self.territory_name
 
 
+class TerritoryClosure(ClosureTableMixin, models.Model):
+    """
+    Transitive closure of Territory.parent_territory, see ClosureTableMixin.
+    """
+    parent_field = 'parent_territory'
+
+    ancestor = models.ForeignKey(
+        Territory,
+        verbose_name="Ancestor",
+        on_delete=models.CASCADE,
+        related_name="closure_descendants"
+    )
+    descendant = models.ForeignKey(
+        Territory,
+        verbose_name="Descendant",
+        on_delete=models.CASCADE,
+        related_name="closure_ancestors"
+    )
+    depth = models.PositiveIntegerField(
+        verbose_name="Depth"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_territory_closure'),
+        ]
+
+    def __str__(self):
+        return f'{self.ancestor_id} > {self.descendant_id}'
+
+
 class Language(models.Model):
     language_name = models.CharField(
         verbose_name="Language name", 
@@ -0,0 +1,224 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, Value
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+from orgs.models import Organization
+from skills.models import Skill
+from users.models import Profile, CacheVersion, TAG_FIELDS, tag_through
+from users.submodels import Territory, Language, WikimediaProject
+
+
+logger = logging.getLogger(__name__)
+
+def bitmap_members(bitmap):
+    """
+    Return the sorted positions of the bits set in an integer bitmap.
+    """
+    return [position for position, bit in enumerate(reversed(bin(bitmap)[2:])) if bit == '1']
+
+
+class TagIndex:
+    """
+    In-process index of the profiles holding each tag.
+
+    The profiles of each (tag_type, tag_id) pair are stored as a bitmap, a
+    Python integer with bit N set when profile N has the tag, so tag lookups
+    and intersections are bitwise operations.
+
+    The index is kept current in the process that writes the tags through
+    m2m_changed signals. The changes are applied and the `tag_index`
+    CacheVersion token is bumped once the write commits, so no lock is held
+    for the rest of the transaction and rolled back writes never reach the
+    index. When the token does not match the one the index was built for,
+    the index is stale (written by another process) and lookups return None,
+    so callers fall back to the database while the index is rebuilt in a
+    background thread, at most once every `rebuild_interval` seconds.
+
+    Each bitmap takes up to (highest profile ID) / 8 bytes, even for a tag
+    held by a few profiles, so the index of each process is bounded by
+    (number of tags in use) x (highest profile ID) / 8 bytes. When that bound
+    exceeds `TAG_INDEX_MAX_BYTES`, the index is not built and lookups keep
+    falling back to the database.
+    """
+    name = 'tag_index'
+    rebuild_interval = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bitmaps = {}
+        self._version = None
+        self._built_at = None
+        self._building = False
+
+    @property
+    def max_bytes(self):
+        return getattr(settings, 'TAG_INDEX_MAX_BYTES', 64 * 1024 * 1024)
+
+    def size_bound(self):
+        """
+        Return the most memory the bitmaps can take, in bytes.
+        """
+        tags = sum(
+            through.objects.values(column).distinct().count()
+            for through, column in map(tag_through, TAG_FIELDS)
+        )
+        highest = Profile.objects.aggregate(highest=Max('pk'))['highest'] or 0
+        return tags * (highest // 8 + 1)
+
+    def build(self):
+        """
+        Build the index, unless it would take more than max_bytes. Returns
+        whether it was built.
+        """
+        if (size := self.size_bound()) > self.max_bytes:
+            logger.warning('The tag index would take up to %s bytes, it is not built.', size)
+            with self._lock:
+                self._bitmaps = {}
+                self._version = None
+            return False
+        # An index built before any write would match every empty token
+        version = CacheVersion.get(self.name) or CacheVersion.bump(self.name)[1]
+        rows = []
+        for tag_type in TAG_FIELDS:
+            through, column = tag_through(tag_type)
+            rows.append(
+                through.objects
+                .annotate(tag_type=Value(tag_type), tag_id=F(column))
+                .values_list('tag_type', 'tag_id', 'profile_id')
+            )
+        bitmaps = {}
+        for tag_type, tag_id, profile_id in rows[0].union(*rows[1:], all=True):
+            key = (tag_type, tag_id)
+            bitmaps[key] = bitmaps.get(key, 0) | (1 << profile_id)
+
+        with self._lock:
+            self._bitmaps = bitmaps
+            self._version = version
+            self._built_at = time.monotonic()
+        return True
+
+    def schedule_build(self):
+        """
+        Rebuild the index in a background thread once the current transaction
+        commits, unless a rebuild is running or ran recently.
+        """
+        with self._lock:
+            if self._building:
+                return
+            if self._built_at is not None and time.monotonic() - self._built_at < self.rebuild_interval:
+                return
+            self._building = True
+            # Throttles the next rebuilds even if this one fails
+            self._built_at = time.monotonic()
+        transaction.on_commit(self._start_build, robust=True)
+
+    def _start_build(self):
+        threading.Thread(target=self._build_in_thread, daemon=True).start()
+
+    def _build_in_thread(self):
+        try:
+            self.build()
+        except Exception:
+            logger.exception('Rebuilding the tag index failed.')
+        finally:
+            self._building = False
+            connection.close()
+
+    def is_current(self):
+        return self._version is not None and self._version == CacheVersion.get(self.name)
+
+    def match(self, tags, match_all=True):
+        """
+        Return the bitmap of the profiles holding all the (tag_type, tag_id)
+        pairs, or any of them if match_all is False. Returns None if the index
+        is cold or stale.
+        """
+        if not self.is_current():
+            self.schedule_build()
+            return None
+
+        with self._lock:
+            bitmaps = [self._bitmaps.get(tag, 0) for tag in tags]
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result = result & bitmap if match_all else result | bitmap
+        return result
+
+    def facets(self, bitmap):
+        """
+        Count the profiles of a bitmap for each tag, in the format of
+        ProfileQuerySet.tag_facets.
+        """
+        facets = {tag_type: {} for tag_type in TAG_FIELDS}
+        with self._lock:
+            items = list(self._bitmaps.items())
+        for (tag_type, tag_id), tag_bitmap in items:
+            count = bin(tag_bitmap & bitmap).count('1')
+            if count:
+                facets[tag_type][tag_id] = count
+        return facets
+
+    def update(self, tag_type, pairs, add):
+        """
+        Add or remove (profile_id, tag_id) pairs of a tag type once the write
+        commits.
+        """
+        transaction.on_commit(lambda: self._apply(tag_type, pairs, add))
+
+    def _apply(self, tag_type, pairs, add):
+        previous, version = CacheVersion.bump(self.name)
+        with self._lock:
+            # Only apply the change on top of an index that was current
+            if self._version is None or self._version != previous:
+                return
+            for profile_id, tag_id in pairs:
+                key = (tag_type, tag_id)
+                if add:
+                    self._bitmaps[key] = self._bitmaps.get(key, 0) | (1 << profile_id)
+                else:
+                    self._bitmaps[key] = self._bitmaps.get(key, 0) & ~(1 << profile_id)
+            self._version = version
+
+    def invalidate(self):
+        transaction.on_commit(lambda: CacheVersion.bump(self.name))
+
+
+tag_index = TagIndex()
+
+
+def _tag_type_of_through(sender):
+    for tag_type in TAG_FIELDS:
+        if tag_through(tag_type)[0] is sender:
+            return tag_type
+    return None
+
+
+@receiver(m2m_changed)
+def update_tag_index(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    tag_type = _tag_type_of_through(sender)
+    if tag_type is None:
+        return
+    if action == 'post_clear':
+        # The cleared rows are not known anymore
+        tag_index.invalidate()
+    elif pk_set:
+        if reverse:
+            pairs = [(profile_id, instance.pk) for profile_id in pk_set]
+        else:
+            pairs = [(instance.pk, tag_id) for tag_id in pk_set]
+        tag_index.update(tag_type, pairs, add=action == 'post_add')
+
+
+def invalidate_tag_index(sender, **kwargs):
+    # Deleting a profile or a tag removes its through rows without m2m_changed
+    tag_index.invalidate()
+
+
+for model in (Profile, Skill, Language, Territory, WikimediaProject, Organization):
+    post_delete.connect(invalidate_tag_index, sender=model, dispatch_uid=f'tag_index_{model.__name__}')
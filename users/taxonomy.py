@@ -0,0 +1,173 @@
+import hashlib
+import json
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from rest_framework.response import Response
+from orgs.models import Organization
+from skills.models import Skill, SkillLabel
+from users.models import CacheVersion
+from users.submodels import Territory, Language, WikimediaProject
+from CapX.conditional import ConditionalGetMixin
+
+
+class TaxonomyCache:
+    """
+    In-process copy of the `{id: str(obj)}` listing of a taxonomy model.
+
+    Saving or deleting an object of the model drops the copy and bumps the
+    model's CacheVersion token. Other processes compare their token with the
+    database at most once every `TAXONOMY_CACHE_CHECK_INTERVAL` seconds, so
+    most requests are answered without a query. Inside a transaction the
+    token is always checked, since the listing may have been built from
+    changes that are rolled back.
+    """
+
+    def __init__(self, model, name=None):
+        self.model = model
+        self.name = name or 'taxonomy_' + model._meta.label_lower
+        self._lock = threading.Lock()
+        self._payload = None
+        self._digest = None
+        self._version = None
+        self._checked_at = None
+
+    @property
+    def check_interval(self):
+        return getattr(settings, 'TAXONOMY_CACHE_CHECK_INTERVAL', 5)
+
+    def get(self):
+        """
+        Return the listing and a digest of its content.
+        """
+        with self._lock:
+            payload, digest, version, checked_at = self._payload, self._digest, self._version, self._checked_at
+        if payload is not None and not connection.in_atomic_block \
+                and time.monotonic() - checked_at < self.check_interval:
+            return payload, digest
+
+        current = CacheVersion.get(self.name)
+        if payload is not None and current == version:
+            with self._lock:
+                self._checked_at = time.monotonic()
+            return payload, digest
+
+        # The token is read before the rows, so a concurrent write leaves the
+        # listing with an older token and it is rebuilt on the next check
+        payload = self.build()
+        digest = hashlib.md5(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        with self._lock:
+            self._payload, self._digest, self._version = payload, digest, current
+            self._checked_at = time.monotonic()
+        return payload, digest
+
+    def build(self):
+        return {obj.id: str(obj) for obj in self.model.objects.all()}
+
+    def invalidate(self):
+        with self._lock:
+            self._payload = None
+        CacheVersion.bump(self.name)
+
+
+class SkillTreeCache(TaxonomyCache):
+    """
+    In-process copy of the skill taxonomy as a nested tree, starting from the
+    skills without a type. It is built from two queries, the skills and the
+    links of Skill.skill_type, and invalidated like the listings.
+    """
+
+    def __init__(self):
+        super().__init__(Skill, name='taxonomy_skills.skill_tree')
+
+    def build(self):
+        nodes = dict(Skill.objects.order_by('id').values_list('id', 'skill_wikidata_item'))
+        parents = {}
+        for child_id, parent_id in Skill.skill_type.through.objects.values_list('from_skill_id', 'to_skill_id'):
+            parents.setdefault(child_id, []).append(parent_id)
+        children = {}
+        for skill_id in nodes:
+            for parent_id in parents.get(skill_id, [None]):
+                children.setdefault(parent_id, []).append(skill_id)
+
+        def build(skill_id, path):
+            # Skills with several types appear under each of them, and cycles
+            # are cut where a skill repeats in the path
+            path = path | {skill_id}
+            return {
+                'id': skill_id,
+                'skill_wikidata_item': nodes[skill_id],
+                'children': [build(child, path) for child in children.get(skill_id, []) if child not in path],
+            }
+
+        return [build(skill_id, frozenset()) for skill_id in children.get(None, [])]
+
+
+taxonomy_caches = {
+    model: TaxonomyCache(model)
+    for model in (Territory, Language, WikimediaProject, Skill, Organization)
+}
+
+
+class SkillLabelCache(TaxonomyCache):
+    """
+    In-process copy of the `{id: label}` listing of the skills in one
+    language, read from the stored Wikidata labels. Skills without a label
+    in the language are listed with their Wikidata item ID.
+    """
+
+    def __init__(self, language):
+        super().__init__(Skill, name=f'taxonomy_skills.skill_label_{language}')
+        self.language = language
+
+    def build(self):
+        labels = dict(SkillLabel.objects.filter(language=self.language).values_list('skill_id', 'label'))
+        return {
+            skill_id: labels.get(skill_id, qid)
+            for skill_id, qid in Skill.objects.values_list('id', 'skill_wikidata_item')
+        }
+
+
+skill_tree_cache = SkillTreeCache()
+skill_label_caches = {code: SkillLabelCache(code) for code, _ in settings.LANGUAGES}
+
+
+def invalidate_taxonomy_cache(sender, **kwargs):
+    taxonomy_caches[sender].invalidate()
+
+
+def invalidate_skill_tree(sender, action=None, **kwargs):
+    if action in (None, 'post_add', 'post_remove', 'post_clear'):
+        skill_tree_cache.invalidate()
+
+
+def invalidate_skill_labels(sender, **kwargs):
+    for cache in skill_label_caches.values():
+        cache.invalidate()
+
+
+for model in taxonomy_caches:
+    post_save.connect(invalidate_taxonomy_cache, sender=model, dispatch_uid=f'taxonomy_{model.__name__}')
+    post_delete.connect(invalidate_taxonomy_cache, sender=model, dispatch_uid=f'taxonomy_{model.__name__}')
+post_save.connect(invalidate_skill_tree, sender=Skill, dispatch_uid='skill_tree')
+post_delete.connect(invalidate_skill_tree, sender=Skill, dispatch_uid='skill_tree')
+m2m_changed.connect(invalidate_skill_tree, sender=Skill.skill_type.through, dispatch_uid='skill_tree')
+post_save.connect(invalidate_skill_labels, sender=Skill, dispatch_uid='skill_labels')
+post_delete.connect(invalidate_skill_labels, sender=Skill, dispatch_uid='skill_labels')
+
+
+class CachedTaxonomyListMixin(ConditionalGetMixin):
+    """
+    Viewset mixin serving the `{id: str(obj)}` listing of the queryset model
+    from its TaxonomyCache, with an ETag derived from the listing content.
+    """
+
+    def get_taxonomy_cache(self):
+        return taxonomy_caches[self.queryset.model]
+
+    def list(self, request, *args, **kwargs):
+        payload, digest = self.get_taxonomy_cache().get()
+        etag, _ = self._validators(request, digest, None)
+        return self._conditional(request, etag, None, lambda request: Response(payload))
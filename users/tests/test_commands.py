@@ -0,0 +1,151 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from knox.models import AuthToken
+from bugs.models import Bug, Attachment
+from events.models import Events, EventParticipant
+from orgs.models import Organization
+from skills.models import Skill
+from users.models import CustomUser, Profile, AccountDeletion, TerritoryRollup
+from users.submodels import Language, Territory
+from users.search import search_profiles
+from users.deletion import request_account_deletion, process_account_deletion
+
+
+class ProfileImportExportTestCase(TestCase):
+    def setUp(self):
+        self.skill = Skill.objects.create(skill_wikidata_item='Q28865')
+        self.language = Language.objects.create(language_name='Portuguese', language_code='pt')
+        user = CustomUser.objects.create_user(username='ana', email='ana@example.org')
+        profile = user.profile
+        profile.display_name = 'Ana'
+        profile.about = 'Wikidata editor'
+        profile.contact = [{'display_name': 'IRC', 'value': 'ana'}]
+        profile.save()
+        profile.skills_known.add(self.skill)
+        profile.language.add(self.language)
+        CustomUser.objects.create_user(username='bia')
+
+    def export(self):
+        output = StringIO()
+        call_command('export_profiles', stdout=output, stderr=StringIO())
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def import_records(self, records, **options):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as source:
+            source.write('\n'.join(json.dumps(record) for record in records))
+        self.addCleanup(os.remove, source.name)
+        output = StringIO()
+        call_command('import_profiles', source.name, stdout=output, **options)
+        return output.getvalue()
+
+    def test_export(self):
+        records = self.export()
+        self.assertEqual([record['username'] for record in records], ['ana', 'bia'])
+        self.assertEqual(records[0]['email'], 'ana@example.org')
+        self.assertEqual(records[0]['display_name'], 'Ana')
+        self.assertEqual(records[0]['skills_known'], [self.skill.pk])
+        self.assertEqual(records[0]['language'], [self.language.pk])
+        self.assertEqual(records[0]['contact'], [{'display_name': 'IRC', 'value': 'ana'}])
+        self.assertEqual(records[1]['skills_known'], [])
+
+    def test_round_trip(self):
+        records = self.export()
+        CustomUser.objects.all().delete()
+
+        output = self.import_records(records, batch_size=1)
+        self.assertIn('Imported 2 profiles', output)
+        self.assertEqual(self.export(), records)
+
+        profile = Profile.objects.get(user__username='ana')
+        self.assertFalse(profile.user.has_usable_password())
+        self.assertEqual(search_profiles(['wikidata'], 10), [profile.pk])
+
+    def test_import_skips_existing_users(self):
+        records = self.export()
+        records.append(dict(records[1], username='carlos', skills_known=[self.skill.pk, 999]))
+
+        output = self.import_records(records)
+        self.assertIn('Imported 1 profiles', output)
+        self.assertIn('Skipped 2 existing users and 1 unknown tags', output)
+        profile = Profile.objects.get(user__username='carlos')
+        self.assertEqual(list(profile.skills_known.all()), [self.skill])
+
+    def test_import_usernames_differing_in_case(self):
+        records = [{'username': 'Ana'}, {'username': 'Carlos'}, {'username': 'carlos'}]
+        output = self.import_records(records)
+        self.assertIn('Imported 3 profiles', output)
+        self.assertEqual(CustomUser.objects.filter(username_lower='carlos').count(), 2)
+
+    def test_import_invalid_json(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as source:
+            source.write('{"username": "carlos"}\nnot json\n')
+        self.addCleanup(os.remove, source.name)
+        with self.assertRaises(CommandError):
+            call_command('import_profiles', source.name, stdout=StringIO())
+
+
+class AccountDeletionTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = CustomUser.objects.create_user(username='ana')
+        self.territory = Territory.objects.create(territory_name='Brazil')
+        self.user.profile.display_name = 'Ana'
+        self.user.profile.save()
+        self.user.profile.territory.add(self.territory)
+        AuthToken.objects.create(self.user)
+        bug = Bug.objects.create(user=self.user, title='Bug', description='Bug')
+        self.attachment = Attachment.objects.create(bug=bug, file=SimpleUploadedFile('bug.txt', b'bug'))
+        self.event = Events.objects.create(
+            name='Event', type_of_location='virtual', creator=self.user,
+            time_begin=timezone.now(), time_end=timezone.now(),
+        )
+        EventParticipant.objects.create(event=self.event, participant=self.user, role='organizer')
+        self.organization = Organization.objects.create(display_name='WMB')
+        self.organization.managers.add(self.user)
+
+    def test_request_deactivates_the_account(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            request_account_deletion(self.user)
+        self.assertFalse(CustomUser.objects.get(pk=self.user.pk).is_active)
+        self.assertFalse(AuthToken.objects.filter(user=self.user).exists())
+        self.assertEqual(len(callbacks), 1)
+
+    def test_deletion_removes_everything(self):
+        path = self.attachment.file.path
+        with self.captureOnCommitCallbacks():
+            request_account_deletion(self.user)
+        output = StringIO()
+        call_command('process_account_deletions', '--batch-size', '1', stdout=output)
+        self.assertIn('Deleted 1 accounts.', output.getvalue())
+
+        self.assertFalse(CustomUser.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(Profile.objects.filter(user_id=self.user.pk).exists())
+        self.assertFalse(Bug.objects.exists())
+        self.assertFalse(Attachment.objects.exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(EventParticipant.objects.exists())
+        self.assertFalse(self.organization.managers.exists())
+        self.assertIsNone(Events.objects.get(pk=self.event.pk).creator)
+        self.assertEqual(TerritoryRollup.objects.get(territory=self.territory).user_count, 0)
+        self.assertEqual(search_profiles(['Ana'], 10), [])
+        self.assertFalse(AccountDeletion.objects.exists())
+
+    def test_deletion_is_claimed_once(self):
+        with self.captureOnCommitCallbacks():
+            deletion = request_account_deletion(self.user)
+        AccountDeletion.objects.filter(pk=deletion.pk).update(started_at=timezone.now())
+        self.assertFalse(process_account_deletion(deletion.pk))
+        self.assertTrue(CustomUser.objects.filter(pk=self.user.pk).exists())
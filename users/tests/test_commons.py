@@ -0,0 +1,164 @@
+import secrets
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from orgs.models import Organization
+from users import commons
+from users.commons import CommonsUnavailable, LocalThumbnailBackend, commons_file_title, fetch_thumbnails, resolve_thumbnails
+from users.models import CommonsThumbnail, CustomUser
+
+
+class FailingBackend:
+    def fetch(self, titles, width):
+        raise CommonsUnavailable('Commons is down.')
+
+
+def commons_url(name):
+    return f'https://commons.wikimedia.org/wiki/File:{name}'
+
+
+@override_settings(COMMONS_THUMBNAIL_BACKEND='users.commons.LocalThumbnailBackend', COMMONS_THUMBNAIL_WIDTH=120)
+class CommonsThumbnailTestCase(TestCase):
+    def setUp(self):
+        LocalThumbnailBackend.calls.clear()
+        commons._pending.clear()
+
+    def resolve(self, urls):
+        """
+        Resolve the URLs, then run the lookups they queued as the background
+        thread would, and return the first and the second resolution.
+        """
+        with self.captureOnCommitCallbacks() as callbacks:
+            first = resolve_thumbnails(urls)
+        for callback in callbacks:
+            fetch_thumbnails(*callback.args)
+            commons._pending.clear()
+        return first, resolve_thumbnails(urls)
+
+    def test_file_title(self):
+        self.assertEqual(commons_file_title(commons_url('Foo_bar.jpg')), 'File:Foo bar.jpg')
+        self.assertEqual(commons_file_title(commons_url('S%C3%A3o_Paulo.png')), 'File:São Paulo.png')
+        self.assertEqual(commons_file_title('https://commons.wikimedia.org/w/index.php?title=Image:Foo.jpg'), 'File:Foo.jpg')
+        self.assertIsNone(commons_file_title('https://commons.wikimedia.org/wiki/Main_Page'))
+        self.assertIsNone(commons_file_title('https://example.org/wiki/File:Foo.jpg'))
+
+    def test_resolve_in_one_batch(self):
+        upload = 'https://upload.wikimedia.org/wikipedia/commons/a/ab/Foo.jpg'
+        urls = [commons_url('A.jpg'), commons_url('B.jpg'), upload, 'https://example.org/c.jpg', None]
+        first, thumbnails = self.resolve(urls)
+        # Nothing is requested while resolving
+        self.assertIsNone(first[commons_url('A.jpg')])
+        self.assertEqual(first[upload], upload)
+        self.assertEqual(len(LocalThumbnailBackend.calls), 1)
+        self.assertEqual(sorted(LocalThumbnailBackend.calls[0]), ['File:A.jpg', 'File:B.jpg'])
+        self.assertTrue(thumbnails[commons_url('A.jpg')].endswith('/120px-A.jpg'))
+        self.assertIsNone(thumbnails['https://example.org/c.jpg'])
+
+    def test_lookup_queued_once(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            resolve_thumbnails([commons_url('A.jpg')])
+            resolve_thumbnails([commons_url('A.jpg'), commons_url('B.jpg')])
+        self.assertEqual([callback.args[0] for callback in callbacks], [['File:A.jpg'], ['File:B.jpg']])
+
+    def test_cached_thumbnails(self):
+        self.resolve([commons_url('A.jpg')])
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(1):
+                thumbnails = resolve_thumbnails([commons_url('A.jpg')])
+        self.assertEqual(callbacks, [])
+        self.assertTrue(thumbnails[commons_url('A.jpg')].endswith('/120px-A.jpg'))
+
+        # Expired entries are served while they are looked up again
+        CommonsThumbnail.objects.update(expires_at=timezone.now() - timedelta(days=1))
+        first, _ = self.resolve([commons_url('A.jpg')])
+        self.assertEqual(first, thumbnails)
+        self.assertEqual(len(LocalThumbnailBackend.calls), 2)
+        self.assertEqual(CommonsThumbnail.objects.count(), 1)
+
+    @override_settings(COMMONS_THUMBNAIL_BACKEND='users.tests.test_commons.FailingBackend')
+    def test_unavailable_backend(self):
+        with self.assertLogs('users.commons', 'WARNING'):
+            _, thumbnails = self.resolve([commons_url('A.jpg')])
+        self.assertIsNone(thumbnails[commons_url('A.jpg')])
+        # The failure is cached for a short while
+        entry = CommonsThumbnail.objects.get()
+        self.assertLess(entry.expires_at, timezone.now() + timedelta(hours=1))
+        with self.captureOnCommitCallbacks() as callbacks:
+            resolve_thumbnails([commons_url('A.jpg')])
+        self.assertEqual(callbacks, [])
+
+    @override_settings(COMMONS_THUMBNAIL_BACKEND='users.tests.test_commons.FailingBackend')
+    def test_unavailable_backend_keeps_thumbnails(self):
+        with override_settings(COMMONS_THUMBNAIL_BACKEND='users.commons.LocalThumbnailBackend'):
+            fetch_thumbnails(['File:A.jpg'], 120)
+        with self.assertLogs('users.commons', 'WARNING'):
+            fetch_thumbnails(['File:A.jpg'], 120)
+        self.assertTrue(resolve_thumbnails([commons_url('A.jpg')])[commons_url('A.jpg')].endswith('/120px-A.jpg'))
+
+    def test_profile_list(self):
+        user = CustomUser.objects.create_user(username='ana', password=str(secrets.randbits(16)))
+        user.profile.profile_image = commons_url('Ana.jpg')
+        user.profile.save()
+        for name in ('bia', 'caio'):
+            profile = CustomUser.objects.create_user(username=name).profile
+            profile.profile_image = commons_url(f'{name}.jpg')
+            profile.save()
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.get('/users/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(LocalThumbnailBackend.calls, [])
+        self.assertEqual(len(callbacks), 1)
+        fetch_thumbnails(*callbacks[0].args)
+        self.assertEqual(len(LocalThumbnailBackend.calls[0]), 3)
+
+        response = client.get('/users/')
+        self.assertTrue(all(profile['profile_image_thumbnail'].endswith('px-' + profile['profile_image'].split(':')[-1]) for profile in response.data))
+
+        # Left out with the other fields, with no lookup
+        CommonsThumbnail.objects.all().delete()
+        commons._pending.clear()
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.get('/users/', {'omit': 'profile_image_thumbnail'})
+        self.assertNotIn('profile_image_thumbnail', response.data[0])
+        self.assertEqual(callbacks, [])
+
+    def test_no_validators_while_pending(self):
+        user = CustomUser.objects.create_user(username='ana', password=str(secrets.randbits(16)))
+        user.profile.profile_image = commons_url('Ana.jpg')
+        user.profile.save()
+        client = APIClient()
+        client.force_authenticate(user)
+        url = f'/users/{user.profile.pk}/'
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.get(url)
+        self.assertIsNone(response.data['profile_image_thumbnail'])
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        fetch_thumbnails(*callbacks[0].args)
+
+        response = client.get(url)
+        self.assertTrue(response.data['profile_image_thumbnail'].endswith('/120px-Ana.jpg'))
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_organization(self):
+        user = CustomUser.objects.create_user(username='ana', password=str(secrets.randbits(16)))
+        organization = Organization.objects.create(display_name='Org', profile_image=commons_url('Logo.svg'))
+        organization.managers.add(user)
+        client = APIClient()
+        client.force_authenticate(user)
+        fetch_thumbnails(['File:Logo.svg'], 120)
+
+        response = client.get(f'/organizations/{organization.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        thumbnail = response.data['profile_image_thumbnail']
+        self.assertTrue(thumbnail.endswith('/120px-Logo.svg'))
+        response = client.get('/organizations/')
+        self.assertEqual(response.data[0]['profile_image_thumbnail'], thumbnail)
+        self.assertEqual(len(LocalThumbnailBackend.calls), 1)
@@ -7,6 +7,7 @@ from django.urls import reverse
 from social_core.exceptions import AuthException
 import jwt
 from users.models import Profile  # Assuming you have a Profile model associated with the user
+from users.benchmark import run_login_benchmark
 
 CustomUser = get_user_model()
 
@@ -39,3 +40,24 @@ class AccountCreationWorkflowTest(TestCase):
         # Check that the user has the correct attributes (you can add more checks as needed)
         self.assertEqual(profile.user.username, self.user_data['username'])
         self.assertEqual(profile.user.email, self.user_data['email'])
+
+
+class LoginBenchmarkTest(TestCase):
+    # Query budgets of a whole login, so changes to the login path that add
+    # queries are noticed
+    FIRST_TIME_QUERIES = 17
+    RETURNING_QUERIES = 9
+
+    def test_login_benchmark(self):
+        reports = run_login_benchmark(users=2)
+        first_time = {row[0]: row for row in reports['first-time']}
+        returning = {row[0]: row for row in reports['returning']}
+
+        self.assertEqual(CustomUser.objects.filter(username__startswith='Benchmark user').count(), 2)
+        self.assertEqual(UserSocialAuth.objects.filter(provider='mediawiki').count(), 2)
+        self.assertEqual(first_time['signal: create_user_profile'][1], 2)
+        self.assertNotIn('signal: create_user_profile', returning)
+        self.assertEqual(returning['pipeline: social_user'][1], 2)
+
+        self.assertLessEqual(first_time['total'][3], self.FIRST_TIME_QUERIES)
+        self.assertLessEqual(returning['total'][3], self.RETURNING_QUERIES)
@@ -1,8 +1,9 @@
 import secrets
 from django.test import TestCase
-from django.db import IntegrityError
+from django.test.utils import CaptureQueriesContext
+from django.db import IntegrityError, connection
 from django.core.exceptions import ValidationError
-from ..models import Territory, Language, WikimediaProject, Organization, CustomUser, \
+from ..models import Territory, TerritoryClosure, TerritoryRollup, Language, WikimediaProject, Organization, CustomUser, \
     Profile
 
 
@@ -31,6 +32,131 @@ class TerritoryModelTest(TestCase):
             Territory.objects.create(territory_name="Asia")
 
 
+class TerritoryClosureTest(TestCase):
+    def setUp(self):
+        self.world = Territory.objects.create(territory_name="World")
+        self.america = Territory.objects.create(territory_name="South America")
+        self.brazil = Territory.objects.create(territory_name="Brazil")
+        self.america.parent_territory.add(self.world)
+        self.brazil.parent_territory.add(self.america)
+
+    def closure(self):
+        return set(TerritoryClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def test_closure_is_maintained(self):
+        self.assertEqual(self.closure(), {
+            (self.world.pk, self.world.pk, 0),
+            (self.america.pk, self.america.pk, 0),
+            (self.brazil.pk, self.brazil.pk, 0),
+            (self.world.pk, self.america.pk, 1),
+            (self.america.pk, self.brazil.pk, 1),
+            (self.world.pk, self.brazil.pk, 2),
+        })
+
+    def test_moving_a_subtree(self):
+        self.america.parent_territory.clear()
+        self.assertEqual(TerritoryClosure.subtree([self.world.pk]), {self.world.pk})
+
+        self.world.territory_parent.add(self.america)
+        self.assertEqual(
+            TerritoryClosure.subtree([self.world.pk]),
+            {self.world.pk, self.america.pk, self.brazil.pk}
+        )
+
+        self.world.territory_parent.clear()
+        self.assertEqual(TerritoryClosure.subtree([self.world.pk]), {self.world.pk})
+
+    def test_deleting_a_territory(self):
+        self.america.delete()
+        self.assertEqual(self.closure(), {
+            (self.world.pk, self.world.pk, 0),
+            (self.brazil.pk, self.brazil.pk, 0),
+        })
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.brazil.parent_territory.add(self.world)
+        expected = self.closure()
+        self.assertIn((self.world.pk, self.brazil.pk, 1), expected)
+        TerritoryClosure.rebuild()
+        self.assertEqual(self.closure(), expected)
+
+
+class TerritoryRollupTest(TestCase):
+    def setUp(self):
+        self.america = Territory.objects.create(territory_name="South America")
+        self.brazil = Territory.objects.create(territory_name="Brazil")
+        self.chile = Territory.objects.create(territory_name="Chile")
+        self.brazil.parent_territory.add(self.america)
+        self.chile.parent_territory.add(self.america)
+        self.profile = CustomUser.objects.create_user(username="test").profile
+
+    def counts(self, territory):
+        rollup = TerritoryRollup.objects.get(territory=territory)
+        return rollup.user_count, rollup.organization_count
+
+    def test_users_are_counted_once_per_subtree(self):
+        self.profile.territory.add(self.brazil, self.chile)
+        self.assertEqual(self.counts(self.brazil), (1, 0))
+        self.assertEqual(self.counts(self.america), (1, 0))
+
+        self.chile.user_territory.add(CustomUser.objects.create_user(username="test2").profile)
+        self.assertEqual(self.counts(self.america), (2, 0))
+
+        self.profile.territory.clear()
+        self.assertEqual(self.counts(self.america), (1, 0))
+        self.assertEqual(self.counts(self.brazil), (0, 0))
+
+    def test_organizations_are_counted(self):
+        organization = Organization.objects.create(display_name="WMB")
+        organization.territory.add(self.brazil)
+        self.assertEqual(self.counts(self.america), (0, 1))
+
+        organization.delete()
+        self.assertEqual(self.counts(self.america), (0, 0))
+
+    def test_counts_follow_moved_territories(self):
+        self.profile.territory.add(self.brazil)
+        self.brazil.parent_territory.clear()
+        self.assertEqual(self.counts(self.america), (0, 0))
+
+        self.brazil.parent_territory.add(self.chile)
+        self.assertEqual(self.counts(self.chile), (1, 0))
+        self.assertEqual(self.counts(self.america), (1, 0))
+
+    def test_counts_after_deletions(self):
+        self.profile.territory.add(self.brazil)
+        self.brazil.delete()
+        self.assertEqual(self.counts(self.america), (0, 0))
+
+        self.profile.territory.add(self.chile)
+        self.profile.user.delete()
+        self.assertEqual(self.counts(self.america), (0, 0))
+
+    def test_changes_are_applied_without_recounting(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.profile.territory.add(self.brazil)
+            self.profile.territory.remove(self.brazil)
+        self.assertFalse([query for query in queries.captured_queries if 'COUNT(' in query['sql']])
+        self.assertEqual(self.counts(self.america), (0, 0))
+
+    def test_refresh_matches_incremental_updates(self):
+        organization = Organization.objects.create(display_name="WMB")
+        other = CustomUser.objects.create_user(username="test2").profile
+        self.profile.territory.add(self.brazil, self.chile)
+        self.profile.territory.remove(self.chile, self.america)
+        self.america.user_territory.add(self.profile, other)
+        self.brazil.user_territory.remove(self.profile)
+        self.chile.territory.add(organization)
+        other.territory.add(self.chile)
+        self.america.user_territory.clear()
+        expected = set(TerritoryRollup.objects.values_list('territory_id', 'user_count', 'organization_count'))
+        TerritoryRollup.refresh()
+        self.assertEqual(
+            set(TerritoryRollup.objects.values_list('territory_id', 'user_count', 'organization_count')),
+            expected
+        )
+
+
 class LanguageModelTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -92,6 +218,17 @@ class CustomUserModelTest(TestCase):
                 password=str(secrets.randbits(16)),
             )
 
+    def test_usernames_differing_in_case(self):
+        # MediaWiki usernames are case-sensitive after the first letter
+        user = CustomUser.objects.create_user(username="AbrahMovic")
+        self.assertEqual(user.username_lower, self.user.username_lower)
+
+    def test_username_lower_follows_username(self):
+        self.assertEqual(self.user.username_lower, "abrahmovic")
+        self.user.username = "Marina"
+        self.user.save(update_fields=["username"])
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk).username_lower, "marina")
+
 
 class ProfileModelTest(TestCase):
     @classmethod
@@ -158,3 +295,16 @@ class ProfileModelTest(TestCase):
             username="Anthony",
         )
         self.assertEqual(str(user.profile), "Anthony")
+
+    def test_card(self):
+        profile = self.user.profile
+        profile.display_name = 'Abrahmo'
+        profile.save(update_fields=['display_name'])
+        self.assertEqual(
+            Profile.objects.get(pk=profile.pk).card,
+            {'display_name': 'Abrahmo', 'username': 'Abrahmovic', 'profile_image': None}
+        )
+
+        self.user.username = 'Abrahmo'
+        self.user.save()
+        self.assertEqual(Profile.objects.get(pk=profile.pk).card['username'], 'Abrahmo')
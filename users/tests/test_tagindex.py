@@ -0,0 +1,162 @@
+import re
+import secrets
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+from skills.models import Skill
+from users.models import CustomUser, CacheVersion
+from users.submodels import Language
+from users.tagindex import tag_index, bitmap_members
+from users.views import member_cards
+
+
+class TagIndexTestCase(TestCase):
+    def setUp(self):
+        self.skill = Skill.objects.create(skill_wikidata_item='Q123')
+        self.language = Language.objects.create(language_name='Portuguese', language_code='pt')
+        self.ana = CustomUser.objects.create_user(username='ana').profile
+        self.bia = CustomUser.objects.create_user(username='bia').profile
+        self.ana.skills_known.add(self.skill)
+        self.ana.language.add(self.language)
+        self.bia.language.add(self.language)
+        tag_index.build()
+
+    def match(self, tags, match_all=True):
+        bitmap = tag_index.match(tags, match_all)
+        self.assertIsNotNone(bitmap)
+        return bitmap_members(bitmap)
+
+    def test_bitmap_members(self):
+        self.assertEqual(bitmap_members(0), [])
+        self.assertEqual(bitmap_members(0b100110), [1, 2, 5])
+
+    def test_match(self):
+        self.assertEqual(self.match([('language', self.language.pk)]), [self.ana.pk, self.bia.pk])
+        self.assertEqual(self.match([('skill_known', self.skill.pk)]), [self.ana.pk])
+        self.assertEqual(self.match([('skill_wanted', self.skill.pk)]), [])
+
+    def test_match_all_and_any(self):
+        tags = [('language', self.language.pk), ('skill_known', self.skill.pk)]
+        self.assertEqual(self.match(tags), [self.ana.pk])
+        self.assertEqual(self.match(tags, match_all=False), [self.ana.pk, self.bia.pk])
+
+    def test_incremental_update(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bia.skills_known.add(self.skill)
+        self.assertEqual(self.match([('skill_known', self.skill.pk)]), [self.ana.pk, self.bia.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana.skills_known.remove(self.skill)
+        self.assertEqual(self.match([('skill_known', self.skill.pk)]), [self.bia.pk])
+
+    def test_incremental_update_reverse(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.skill.user_desired_skils.add(self.bia)
+        self.assertEqual(self.match([('skill_wanted', self.skill.pk)]), [self.bia.pk])
+
+    def test_incremental_update_by_set_relation(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bia.set_relation('skills_known', [self.skill.pk])
+        self.assertEqual(self.match([('skill_known', self.skill.pk)]), [self.ana.pk, self.bia.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bia.set_relation('language', [])
+        self.assertEqual(self.match([('language', self.language.pk)]), [self.ana.pk])
+
+    def test_stale_after_change_elsewhere(self):
+        # Simulates a write made by another process
+        CacheVersion.bump(tag_index.name)
+        self.assertIsNone(tag_index.match([('language', self.language.pk)]))
+
+    def test_not_applied_before_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.bia.skills_known.add(self.skill)
+        self.assertEqual(self.match([('skill_known', self.skill.pk)]), [self.ana.pk])
+        self.assertEqual(len(callbacks), 1)
+
+    def test_stale_after_clear(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana.language.clear()
+        self.assertIsNone(tag_index.match([('language', self.language.pk)]))
+
+    def test_stale_after_profile_deletion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bia.user.delete()
+        self.assertIsNone(tag_index.match([('language', self.language.pk)]))
+
+    def test_rebuilt_in_background(self):
+        CacheVersion.bump(tag_index.name)
+        tag_index._built_at = None
+        self.addCleanup(setattr, tag_index, '_building', False)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertIsNone(tag_index.match([('language', self.language.pk)]))
+            # Only one rebuild is queued
+            self.assertIsNone(tag_index.match([('language', self.language.pk)]))
+        self.assertEqual(len(callbacks), 1)
+
+    def test_not_built_over_memory_bound(self):
+        self.addCleanup(tag_index.build)
+        with self.settings(TAG_INDEX_MAX_BYTES=1):
+            with self.assertLogs('users.tagindex', 'WARNING'):
+                self.assertFalse(tag_index.build())
+        self.assertIsNone(tag_index.match([('language', self.language.pk)]))
+
+    def test_facets(self):
+        bitmap = tag_index.match([('language', self.language.pk)])
+        self.assertEqual(tag_index.facets(bitmap)['skill_known'], {self.skill.pk: 1})
+        self.assertEqual(tag_index.facets(bitmap)['language'], {self.language.pk: 2})
+
+
+class TagIndexViewTestCase(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.language = Language.objects.create(language_name='Portuguese', language_code='pt')
+        self.user.profile.language.add(self.language)
+
+    def test_same_results_with_cold_and_warm_index(self):
+        CacheVersion.bump(tag_index.name)
+        cold = self.client.get('/tags/language/' + str(self.language.pk) + '/')
+        tag_index.build()
+        warm = self.client.get('/tags/language/' + str(self.language.pk) + '/')
+        self.assertEqual(cold.status_code, status.HTTP_200_OK)
+        self.assertEqual(cold.data, warm.data)
+        self.assertEqual([profile['username'] for profile in warm.data], ['test'])
+
+    def test_search_facets_with_warm_index(self):
+        tag_index.build()
+        response = self.client.get('/tags/search/', {'language': self.language.pk})
+        self.assertEqual(response.data['facets']['language'], {self.language.pk: 1})
+
+    def test_paginated_listing_reads_one_page(self):
+        for username in ('ana', 'bia', 'caio', 'dani'):
+            CustomUser.objects.create_user(username=username).profile.language.add(self.language)
+        tag_index.build()
+        url = f'/tags/language/{self.language.pk}/'
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'page_size': 2})
+        # Only the IDs of the page and of the one after it are queried
+        lists = [re.findall(r'IN \(([^)]*)\)', query['sql']) for query in queries if 'users_profile' in query['sql']]
+        self.assertEqual([len(ids.split(',')) for ids in sum(lists, [])], [3])
+
+        pages = [response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(response.data['results'])
+        self.assertEqual(
+            [[profile['username'] for profile in page] for page in pages],
+            [['test', 'ana'], ['bia', 'caio'], ['dani']],
+        )
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(response.data['results'], pages[1])
+
+    def test_member_cards_in_chunks(self):
+        ids = [CustomUser.objects.create_user(username=username).profile.pk for username in ('ana', 'bia', 'caio')]
+        ids.insert(0, self.user.profile.pk)
+        with self.assertNumQueries(2):
+            rows = list(member_cards(ids, chunk_size=2))
+        self.assertEqual([row['card']['username'] for row in rows], ['test', 'ana', 'bia', 'caio'])
@@ -1,12 +1,21 @@
 import profile
 import secrets
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
-from users.models import Profile, CustomUser
+from users.models import Profile, ProfileQuerySet, CustomUser, CacheVersion, AccountDeletion
+from users.taxonomy import taxonomy_caches
+from users.similarity import FeatureMatrix, refresh_similar_profiles, stale_profile_ids
 from users.submodels import Territory, Language, WikimediaProject
-from users.serializers import ProfileSerializer, TerritorySerializer, LanguageSerializer, WikimediaProjectSerializer
+from users.tagindex import tag_index
+from users.search import ProfileSearchFilter
+from users.serializers import profile_cards, ProfileSerializer, TerritorySerializer, LanguageSerializer, WikimediaProjectSerializer
 from skills.models import Skill
 from orgs.models import Organization
 
@@ -45,8 +54,14 @@ class ProfileViewSetTestCase(TestCase):
         self.assertEqual(serializer.data['about'], updated_data['about'])
 
     def test_destroy_profile(self):
-        response = self.client.delete('/profile/' + str(self.user.pk) + '/')
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete('/profile/' + str(self.user.pk) + '/')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        # The account is deactivated at once and deleted in the background
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(AccountDeletion.objects.filter(user=self.user).exists())
+        self.assertEqual(len(callbacks), 1)
 
     def test_create_profile(self):
         response = self.client.post('/profile/')
@@ -101,6 +116,91 @@ class ProfileViewSetTestCase(TestCase):
         response = self.client.put(url, updated_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_get_profile_not_modified(self):
+        url = '/profile/' + str(self.user.pk) + '/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries.captured_queries), 1)
+
+        Profile.objects.get(user=self.user).language.add(
+            Language.objects.create(language_name='test', language_code='test')
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_get_users_list_not_modified(self):
+        response = self.client.get('/users/')
+        etag = response['ETag']
+        response = self.client.get('/users/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # A new profile, a change to a user and a deleted tag all change the list
+        other = CustomUser.objects.create_user(username='test2')
+        response = self.client.get('/users/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = response['ETag']
+        other.email = 'test2@example.org'
+        other.save()
+        response = self.client.get('/users/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        skill = Skill.objects.create(skill_wikidata_item="Q28865")
+        other.profile.skills_known.add(skill)
+        etag = self.client.get('/users/')['ETag']
+        skill.delete()
+        response = self.client.get('/users/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def _relation_writes(self, queries):
+        through_tables = [
+            Profile._meta.get_field(name).remote_field.through._meta.db_table
+            for name in ProfileQuerySet.RELATED_FIELDS
+        ]
+        return [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT', 'DELETE')) and
+                any(table in query['sql'] for table in through_tables)
+        ]
+
+    def test_update_writes_only_changed_relations(self):
+        python = Skill.objects.create(skill_wikidata_item="Q28865")
+        lua = Skill.objects.create(skill_wikidata_item="Q207316")
+        language = Language.objects.create(language_name='test', language_code='test')
+        profile = Profile.objects.get(user=self.user)
+        profile.skills_known.set([python])
+        profile.language.set([language])
+
+        url = '/profile/' + str(self.user.pk) + '/'
+        updated_data = {
+            'user': {},
+            'about': 'unchanged relations',
+            'skills_known': [python.pk],
+            'language': [language.pk],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(url, updated_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        writes = self._relation_writes(queries)
+        self.assertEqual(writes, [])
+
+        updated_data['skills_known'] = [lua.pk]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(url, updated_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['skills_known'], [lua.pk])
+        self.assertEqual(response.data['language'], [language.pk])
+        writes = self._relation_writes(queries)
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(list(profile.skills_known.all()), [lua])
+
     def test_find_user_by_username(self):
         response = self.client.get('/users/?username=test')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -109,6 +209,226 @@ class ProfileViewSetTestCase(TestCase):
         serializer = ProfileSerializer(profiles, many=True)
         self.assertEqual(response.data, serializer.data)
 
+    def test_get_users_list_paginated(self):
+        for username in ['test2', 'test3']:
+            CustomUser.objects.create_user(username=username, password=str(secrets.randbits(16)))
+
+        response = self.client.get('/users/?page_size=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        usernames = [profile['user']['username'] for profile in response.data['results']]
+        self.assertEqual(usernames, ['test', 'test2'])
+
+        response = self.client.get(response.data['next'])
+        usernames = [profile['user']['username'] for profile in response.data['results']]
+        self.assertEqual(usernames, ['test3'])
+        self.assertIsNone(response.data['next'])
+
+    def test_get_users_list_page_size_is_capped(self):
+        response = self.client.get('/users/?page_size=100000')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('results', response.data)
+
+    def _create_profiles_with_tags(self, prefix, count):
+        skill = Skill.objects.create(skill_wikidata_item="Q" + str(secrets.randbelow(10**8) + 1))
+        language = Language.objects.create(language_name=prefix, language_code=prefix)
+        territory = Territory.objects.create(territory_name=prefix)
+        for i in range(count):
+            user = CustomUser.objects.create(username=prefix + str(i))
+            profile = Profile.objects.get(user=user)
+            profile.skills_known.add(skill)
+            profile.skills_available.add(skill)
+            profile.language.add(language)
+            profile.territory.add(territory)
+        return skill
+
+    def test_users_list_query_count_is_constant(self):
+        self._create_profiles_with_tags('a', 2)
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get('/users/')
+        self.assertEqual(len(response.data), 3)
+
+        self._create_profiles_with_tags('b', 10)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/users/')
+        self.assertEqual(len(response.data), 13)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_users_by_tag_query_count_is_constant(self):
+        # The tag index is shared by the whole process, so its state is fixed here
+        skill = self._create_profiles_with_tags('a', 2)
+        tag_index.build()
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/tags/skill_known/' + str(skill.pk) + '/')
+
+        skill = self._create_profiles_with_tags('b', 10)
+        tag_index.build()
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/tags/skill_known/' + str(skill.pk) + '/')
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_users_by_territory_with_descendants(self):
+        america = Territory.objects.create(territory_name='South America')
+        brazil = Territory.objects.create(territory_name='Brazil')
+        brazil.parent_territory.add(america)
+        Profile.objects.get(user=self.user).territory.add(brazil)
+
+        url = '/tags/territory/' + str(america.pk) + '/'
+        self.assertEqual(self.client.get(url).data, [])
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'include_descendants': 'true'})
+        self.assertEqual([profile['username'] for profile in response.data], ['test'])
+
+        response = self.client.get('/tags/language/1/', {'include_descendants': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_users_by_subskills(self):
+        programming = Skill.objects.create(skill_wikidata_item='Q80006')
+        python = Skill.objects.create(skill_wikidata_item='Q28865')
+        django = Skill.objects.create(skill_wikidata_item='Q842014')
+        python.skill_type.add(programming)
+        django.skill_type.add(python)
+        Profile.objects.get(user=self.user).skills_known.add(django)
+
+        url = f'/tags/skill_known/{programming.pk}/'
+        self.assertEqual(self.client.get(url).data, [])
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'include_subskills': 'true'})
+        self.assertEqual([profile['username'] for profile in response.data], ['test'])
+
+        response = self.client.get(f'/users_by_skill/{programming.pk}/', {'include_subskills': 'true'})
+        self.assertEqual([profile['username'] for profile in response.data['known']], ['test'])
+        self.assertEqual(response.data['wanted'], [])
+
+        response = self.client.get('/tags/territory/1/', {'include_subskills': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_territory_tree(self):
+        america = Territory.objects.create(territory_name='South America')
+        brazil = Territory.objects.create(territory_name='Brazil')
+        brazil.parent_territory.add(america)
+        Profile.objects.get(user=self.user).territory.add(brazil)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/territory/tree/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{
+            'id': america.pk,
+            'territory_name': 'South America',
+            'user_count': 1,
+            'organization_count': 0,
+            'children': [{
+                'id': brazil.pk,
+                'territory_name': 'Brazil',
+                'user_count': 1,
+                'organization_count': 0,
+                'children': [],
+            }],
+        }])
+
+    def test_get_users_list_sparse_fieldset(self):
+        self._create_profiles_with_tags('a', 2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/users/', {'fields': 'display_name,profile_image,user'})
+        self.assertEqual(set(response.data[0]), {'display_name', 'profile_image', 'user'})
+        # The ETag aggregate and the profiles with their users, no prefetches
+        self.assertEqual(len(queries.captured_queries), 2)
+        self.assertNotIn('"about"', queries.captured_queries[1]['sql'])
+
+        response = self.client.get('/users/', {'omit': 'about,contact,social,user'})
+        self.assertNotIn('about', response.data[0])
+        self.assertIn('skills_known', response.data[0])
+        self.assertNotIn('user', response.data[0])
+
+    def test_sparse_fieldset_is_ignored_on_update(self):
+        url = '/profile/' + str(self.user.pk) + '/?fields=display_name'
+        response = self.client.put(url, {'user': {'email': 'test@example.org'}, 'display_name': 'Test'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('about', response.data)
+
+class UsersSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.ana = CustomUser.objects.create_user(username='AnaLovelace', email='ana@example.org')
+        self.ana.profile.display_name = 'Ana'
+        self.ana.profile.about = 'I edit articles about mathematics.'
+        self.ana.profile.save()
+
+        self.bob = CustomUser.objects.create_user(username='BobBuilder')
+        self.bob.profile.about = 'Mathematics teacher and Wikidata enthusiast.'
+        self.bob.profile.save()
+
+    def search(self, term):
+        response = self.client.get('/users/', {'search': term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [profile['user']['username'] for profile in response.data]
+
+    def test_search_by_username_prefix(self):
+        self.assertEqual(self.search('analove'), ['AnaLovelace'])
+
+    def test_search_by_email(self):
+        self.assertEqual(self.search('ana@example.org'), ['AnaLovelace'])
+
+    def test_search_ranks_results(self):
+        # A match on the display name weighs more than a match on the bio
+        self.bob.profile.display_name = 'Mathematics'
+        self.bob.profile.save()
+        self.assertEqual(self.search('mathematics'), ['BobBuilder', 'AnaLovelace'])
+
+    def test_search_requires_all_terms(self):
+        self.assertEqual(self.search('mathematics wikidata'), ['BobBuilder'])
+
+    def test_search_no_results(self):
+        self.assertEqual(self.search('astronomy'), [])
+
+    def test_search_ignores_query_syntax(self):
+        self.assertEqual(self.search('"ana" OR *'), ['AnaLovelace'])
+
+    def test_search_follows_username_change(self):
+        self.ana.username = 'AdaLovelace'
+        self.ana.save()
+        self.assertEqual(self.search('ada'), ['AdaLovelace'])
+        self.assertEqual(self.search('analovelace'), [])
+
+    def test_search_drops_deleted_profiles(self):
+        self.bob.delete()
+        self.assertEqual(self.search('mathematics'), ['AnaLovelace'])
+
+    def test_search_paginated_by_rank(self):
+        self.bob.profile.display_name = 'Mathematics'
+        self.bob.profile.save()
+        carol = CustomUser.objects.create_user(username='Carol')
+        carol.profile.about = 'Mathematics'
+        carol.profile.save()
+
+        response = self.client.get('/users/', {'search': 'mathematics', 'page_size': 1})
+        pages = [response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(response.data['results'])
+        self.assertEqual(
+            [profile['user']['username'] for page in pages for profile in page],
+            ['BobBuilder', 'Carol', 'AnaLovelace'],
+        )
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(response.data['results'], pages[1])
+
+    def test_search_pages_past_max_results(self):
+        with patch.object(ProfileSearchFilter, 'max_results', 1):
+            self.assertEqual(len(self.search('mathematics')), 1)
+            response = self.client.get('/users/', {'search': 'mathematics', 'page_size': 1})
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_search_runs_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.search('mathematics')
+        self.assertEqual(len([query for query in queries if 'MATCH' in query['sql']]), 1)
+
 class ListyViewSetTestCase(TestCase):
     def setUp(self):
         self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)))
@@ -151,6 +471,48 @@ class ListyViewSetTestCase(TestCase):
         response = self.client.get('/list_wikimedia_project/1/')
         self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
 
+    def test_list_is_cached_until_changed(self):
+        Territory.objects.create(territory_name='test')
+        response = self.client.get('/list_territory/')
+        etag = response['ETag']
+
+        # Only the version token is read while the listing is unchanged
+        with self.assertNumQueries(1):
+            response = self.client.get('/list_territory/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        territory = Territory.objects.create(territory_name='test2')
+        response = self.client.get('/list_territory/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[territory.pk], 'test2')
+
+        territory.delete()
+        response = self.client.get('/list_territory/')
+        self.assertNotIn(territory.pk, response.data)
+
+    def test_list_is_rebuilt_after_change_elsewhere(self):
+        language = Language.objects.create(language_name='test', language_code='test')
+        self.client.get('/list_language/')
+        # Simulates a write made by another process
+        Language.objects.filter(pk=language.pk).update(language_name='renamed')
+        CacheVersion.bump(taxonomy_caches[Language].name)
+        response = self.client.get('/list_language/')
+        self.assertEqual(response.data, {language.pk: 'renamed'})
+
+
+class ListyViewSetCacheTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_warm_list_does_not_query(self):
+        WikimediaProject.objects.create(wikimedia_project_name='test', wikimedia_project_code='test')
+        expected = self.client.get('/list_wikimedia_project/').data
+        with self.assertNumQueries(0):
+            response = self.client.get('/list_wikimedia_project/')
+        self.assertEqual(response.data, expected)
+
 class UsersBySkillTestCase(TestCase):
     def setUp(self):
         self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)))
@@ -174,11 +536,56 @@ class UsersBySkillTestCase(TestCase):
                 'id': profile['user']['id'],
                 'display_name': profile['display_name'],
                 'username': profile['user']['username'],
-                'profile_image': profile['profile_image']
+                'profile_image': profile['profile_image'],
+                'profile_image_thumbnail': profile['profile_image_thumbnail']
             } for profile in serializer_data
         ]
         self.assertEqual(response_data, simplified_serializer_data)
     
+    def test_get_users_by_skill_buckets(self):
+        skill = Skill.objects.create(skill_wikidata_item="Q123456789")
+        teacher = CustomUser.objects.create_user(username='teacher').profile
+        teacher.skills_known.add(skill)
+        teacher.skills_available.add(skill)
+        learner = CustomUser.objects.create_user(username='learner').profile
+        learner.skills_wanted.add(skill)
+
+        response = self.client.get('/users_by_skill/' + str(skill.pk) + '/')
+        self.assertEqual([user['username'] for user in response.data['known']], ['teacher'])
+        self.assertEqual([user['username'] for user in response.data['available']], ['teacher'])
+        self.assertEqual([user['username'] for user in response.data['wanted']], ['learner'])
+        self.assertEqual(response.data['wanted'][0]['id'], learner.pk)
+
+    def test_get_users_by_skill_query_count_is_constant(self):
+        skill = Skill.objects.create(skill_wikidata_item="Q123456789")
+        url = '/users_by_skill/' + str(skill.pk) + '/'
+
+        def add_holders(prefix, count):
+            for i in range(count):
+                profile = CustomUser.objects.create(username=prefix + str(i)).profile
+                profile.skills_known.add(skill)
+                profile.skills_wanted.add(skill)
+
+        add_holders('a', 2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        add_holders('b', 20)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['known']), 22)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_get_users_by_skill_reads_profiles_by_id(self):
+        skill = Skill.objects.create(skill_wikidata_item="Q123456789")
+        Profile.objects.get(user=self.user).skills_wanted.add(skill)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/users_by_skill/' + str(skill.pk) + '/')
+        self.assertEqual([user['username'] for user in response.data['wanted']], ['test'])
+        # The holders come from the through tables, so the profiles are only read by ID
+        profile_queries = [query['sql'] for query in queries.captured_queries if 'FROM "users_profile"' in query['sql']]
+        self.assertEqual(len(profile_queries), 1)
+        self.assertIn('"users_profile"."id" IN', profile_queries[0])
+
     def test_get_users_by_skill_no_id(self):
         response = self.client.get('/users_by_skill/')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -232,7 +639,8 @@ class UsersByTagTestCase(TestCase):
                     'id': profile['user']['id'],
                     'display_name': profile['display_name'],
                     'username': profile['user']['username'],
-                    'profile_image': profile['profile_image']
+                    'profile_image': profile['profile_image'],
+                    'profile_image_thumbnail': profile['profile_image_thumbnail']
                 } for profile in serializer_data
             ]
             self.assertEqual(response_data, simplified_serializer_data)
@@ -273,7 +681,8 @@ class UsersByTagTestCase(TestCase):
                 'id': profile['user']['id'],
                 'display_name': profile['display_name'],
                 'username': profile['user']['username'],
-                'profile_image': profile['profile_image']
+                'profile_image': profile['profile_image'],
+                'profile_image_thumbnail': profile['profile_image_thumbnail']
             } for profile in serializer_data
         ]
         self.assertEqual(response_data, simplified_serializer_data)
@@ -314,7 +723,8 @@ class UsersByTagTestCase(TestCase):
                 'id': profile['user']['id'],
                 'display_name': profile['display_name'],
                 'username': profile['user']['username'],
-                'profile_image': profile['profile_image']
+                'profile_image': profile['profile_image'],
+                'profile_image_thumbnail': profile['profile_image_thumbnail']
             } for profile in serializer_data
         ]
         self.assertEqual(response_data, simplified_serializer_data)
@@ -355,7 +765,8 @@ class UsersByTagTestCase(TestCase):
                 'id': profile['user']['id'],
                 'display_name': profile['display_name'],
                 'username': profile['user']['username'],
-                'profile_image': profile['profile_image']
+                'profile_image': profile['profile_image'],
+                'profile_image_thumbnail': profile['profile_image_thumbnail']
             } for profile in serializer_data
         ]
         self.assertEqual(response_data, simplified_serializer_data)
@@ -405,7 +816,279 @@ class UsersByTagTestCase(TestCase):
                 'id': profile['user']['id'],
                 'display_name': profile['display_name'],
                 'username': profile['user']['username'],
-                'profile_image': profile['profile_image']
+                'profile_image': profile['profile_image'],
+                'profile_image_thumbnail': profile['profile_image_thumbnail']
             } for profile in serializer_data
         ]
         self.assertEqual(response_data, simplified_serializer_data)    
+
+    def test_get_users_by_tag_reads_cards(self):
+        organization = Organization.objects.create(display_name='New Organization', acronym='NO')
+        for username in ('ana', 'bia'):
+            CustomUser.objects.create_user(username=username).profile.affiliation.set([organization])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/tags/affiliation/{organization.pk}/')
+        self.assertEqual([profile['username'] for profile in response.data], ['ana', 'bia'])
+        # Besides the tag index check, only the profile table is read
+        profile_queries = [query['sql'] for query in queries if 'users_profile' in query['sql']]
+        self.assertEqual(len(profile_queries), 1)
+        self.assertNotIn('users_customuser', profile_queries[0])
+
+    def test_get_users_by_tag_paginated(self):
+        organization = Organization.objects.create(display_name='New Organization', acronym='NO')
+        for username in ('ana', 'bia', 'caio'):
+            CustomUser.objects.create_user(username=username).profile.affiliation.set([organization])
+
+        response = self.client.get(f'/tags/affiliation/{organization.pk}/', {'page_size': 2})
+        self.assertEqual([profile['username'] for profile in response.data['results']], ['ana', 'bia'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([profile['username'] for profile in response.data['results']], ['caio'])
+        self.assertIsNone(response.data['next'])
+
+    def test_profile_cards_in_chunks(self):
+        for username in ('ana', 'bia', 'caio'):
+            CustomUser.objects.create_user(username=username)
+        rows = Profile.objects.order_by('pk').cards()
+        with patch('users.serializers.resolve_thumbnails', return_value={}) as resolve:
+            cards = profile_cards(rows.iterator(), chunk_size=2)
+        self.assertEqual([card['username'] for card in cards], ['test', 'ana', 'bia', 'caio'])
+        self.assertEqual(resolve.call_count, 2)
+
+
+class TagSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.portuguese = Language.objects.create(language_name='Portuguese', language_code='pt-br')
+        self.spanish = Language.objects.create(language_name='Spanish', language_code='es')
+        self.brazil = Territory.objects.create(territory_name='Brazil')
+        self.skill = Skill.objects.create(skill_wikidata_item='Q123')
+
+        self.ana = CustomUser.objects.create_user(username='ana').profile
+        self.ana.language.set([self.portuguese])
+        self.ana.territory.set([self.brazil])
+        self.ana.skills_known.set([self.skill])
+        self.ana.skills_available.set([self.skill])
+
+        self.bia = CustomUser.objects.create_user(username='bia').profile
+        self.bia.language.set([self.portuguese, self.spanish])
+        self.bia.territory.set([self.brazil])
+
+        self.carlos = CustomUser.objects.create_user(username='carlos').profile
+        self.carlos.language.set([self.spanish])
+
+    def usernames(self, response):
+        return sorted(profile['username'] for profile in response.data['results'])
+
+    def test_search_all_tags(self):
+        response = self.client.get('/tags/search/', {
+            'language': self.portuguese.pk,
+            'territory': self.brazil.pk,
+            'skill_available': self.skill.pk,
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.usernames(response), ['ana'])
+
+    def test_search_any_tag(self):
+        response = self.client.get('/tags/search/', {
+            'skill_available': self.skill.pk,
+            'language': self.spanish.pk,
+            'match': 'any',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.usernames(response), ['ana', 'bia', 'carlos'])
+
+    def test_search_several_ids_of_a_tag_type(self):
+        response = self.client.get('/tags/search/', {
+            'language': f'{self.portuguese.pk},{self.spanish.pk}',
+        })
+        self.assertEqual(self.usernames(response), ['bia'])
+
+    def test_search_facets(self):
+        response = self.client.get('/tags/search/', {'territory': self.brazil.pk})
+        facets = response.data['facets']
+        self.assertEqual(facets['language'], {self.portuguese.pk: 2, self.spanish.pk: 1})
+        self.assertEqual(facets['territory'], {self.brazil.pk: 2})
+        self.assertEqual(facets['skill_known'], {self.skill.pk: 1})
+        self.assertEqual(facets['skill_wanted'], {})
+
+    def test_search_paginated(self):
+        response = self.client.get('/tags/search/', {'territory': self.brazil.pk, 'page_size': 1})
+        self.assertEqual(self.usernames(response), ['ana'])
+        self.assertEqual(response.data['facets']['territory'], {self.brazil.pk: 2})
+
+    def test_search_no_tags(self):
+        response = self.client.get('/tags/search/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_invalid_tag_id(self):
+        response = self.client.get('/tags/search/', {'language': 'pt'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_invalid_match(self):
+        response = self.client.get('/tags/search/', {'language': self.spanish.pk, 'match': 'some'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SkillMatchesTestCase(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='test', password=str(secrets.randbits(16)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.python = Skill.objects.create(skill_wikidata_item='Q28865')
+        self.sparql = Skill.objects.create(skill_wikidata_item='Q54871')
+        self.lua = Skill.objects.create(skill_wikidata_item='Q207316')
+
+        profile = self.user.profile
+        profile.skills_wanted.set([self.python, self.sparql])
+        profile.skills_known.set([self.lua])
+        profile.skills_available.set([self.lua])
+
+    def create_profile(self, username, available=(), wanted=()):
+        profile = CustomUser.objects.create_user(username=username).profile
+        profile.skills_known.set(available)
+        profile.skills_available.set(available)
+        profile.skills_wanted.set(wanted)
+        return profile
+
+    def test_matches_ranked(self):
+        self.create_profile('teacher', available=[self.python])
+        self.create_profile('two_skills', available=[self.python, self.sparql])
+        self.create_profile('mutual', available=[self.sparql], wanted=[self.lua])
+        self.create_profile('unrelated', available=[self.lua])
+
+        response = self.client.get('/profile/matches/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([match['username'] for match in response.data], ['mutual', 'two_skills', 'teacher'])
+        self.assertEqual(response.data[0]['can_teach'], [self.sparql.pk])
+        self.assertEqual(response.data[0]['wants_to_learn'], [self.lua.pk])
+        self.assertEqual(response.data[1]['can_teach'], sorted([self.python.pk, self.sparql.pk]))
+
+    def test_matches_limit(self):
+        for i in range(3):
+            self.create_profile('teacher' + str(i), available=[self.python])
+        response = self.client.get('/profile/matches/', {'limit': 2})
+        self.assertEqual(len(response.data), 2)
+        # The ranked profiles, then the skills of the ones kept
+        with self.assertNumQueries(2):
+            matches = self.user.profile.skill_matches(limit=2)
+        self.assertEqual(len(matches), 2)
+
+    def test_matches_invalid_limit(self):
+        response = self.client.get('/profile/matches/', {'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_matches_none(self):
+        response = self.client.get('/profile/matches/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+
+class UsersBatchTestCase(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='Ana', password=str(secrets.randbits(16)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.bia = CustomUser.objects.create_user(username='Bia').profile
+        self.caio = CustomUser.objects.create_user(username='Caio').profile
+
+    def batch(self, **params):
+        response = self.client.get('/users/batch/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [profile['user']['username'] for profile in response.data]
+
+    def test_batch_by_id(self):
+        ids = [self.caio.pk, 0, self.user.profile.pk, self.caio.pk]
+        self.assertEqual(self.batch(id=ids), ['Caio', 'Ana'])
+
+    def test_batch_by_username(self):
+        self.assertEqual(self.batch(username=['bia', 'Nobody', 'ANA']), ['Bia', 'Ana'])
+
+    def test_batch_by_username_differing_in_case(self):
+        CustomUser.objects.create_user(username='BIA')
+        self.assertEqual(self.batch(username=['bia', 'Ana']), ['Bia', 'BIA', 'Ana'])
+
+    def test_batch_queries(self):
+        # The profiles are read in one query, plus the prefetched relations
+        with self.assertNumQueries(1 + len(ProfileQuerySet.RELATED_FIELDS)):
+            self.client.get('/users/batch/', {'username': ['Ana', 'Bia', 'Caio']})
+        self.assertEqual(self.batch(username=['Ana', 'Bia', 'Caio'], fields='display_name,user'), ['Ana', 'Bia', 'Caio'])
+
+    def test_invalid_batch(self):
+        for params in ({}, {'id': 1, 'username': 'Ana'}, {'id': 'a'}, {'id': list(range(301))}):
+            response = self.client.get('/users/batch/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SimilarProfilesTestCase(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='ana', password=str(secrets.randbits(16)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.python = Skill.objects.create(skill_wikidata_item='Q28865')
+        self.sparql = Skill.objects.create(skill_wikidata_item='Q54871')
+        self.portuguese = Language.objects.create(language_name='Portuguese', language_code='pt')
+
+        self.ana = self.user.profile
+        self.ana.skills_known.set([self.python, self.sparql])
+        self.ana.language.set([self.portuguese])
+        self.bia = CustomUser.objects.create_user(username='bia').profile
+        self.bia.skills_known.set([self.python, self.sparql])
+        self.caio = CustomUser.objects.create_user(username='caio').profile
+        self.caio.skills_wanted.set([self.python])
+        self.caio.language.set([self.portuguese])
+        # Profiles without neighbours are always refreshed, at no cost
+        self.dani = CustomUser.objects.create_user(username='dani').profile
+
+    def similar(self, profile, **params):
+        response = self.client.get(f'/users/{profile.pk}/similar/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(similar['username'], round(similar['score'], 2)) for similar in response.data]
+
+    def test_similar_profiles(self):
+        refresh_similar_profiles()
+        self.assertEqual(self.similar(self.ana), [('bia', 0.67), ('caio', 0.25)])
+        self.assertEqual(self.similar(self.ana, limit=1), [('bia', 0.67)])
+        # A known and a wanted skill are different features
+        self.assertEqual(self.similar(self.bia), [('ana', 0.67)])
+
+    def test_similar_profiles_are_read_from_storage(self):
+        refresh_similar_profiles()
+        with self.assertNumQueries(2):
+            self.client.get(f'/users/{self.ana.pk}/similar/')
+
+    def test_incremental_refresh(self):
+        refresh_similar_profiles()
+        self.assertEqual(stale_profile_ids(), [self.dani.pk])
+
+        self.caio.skills_known.set([self.python, self.sparql])
+        self.assertIn(self.caio.pk, stale_profile_ids())
+        call_command('refresh_similar_profiles', stdout=StringIO())
+        self.assertEqual(self.similar(self.caio)[0], ('ana', 0.75))
+
+    def test_partial_refresh_loads_profiles_sharing_tags(self):
+        matrix = FeatureMatrix.load([self.bia.pk])
+        # Caio wants the skill Bia knows, which is a different feature
+        self.assertEqual(set(matrix.rows), {self.ana.pk, self.bia.pk})
+        self.assertEqual(matrix.neighbours(self.bia.pk), [(self.ana.pk, 2 / 3)])
+        self.assertEqual(FeatureMatrix.load([self.dani.pk]).neighbours(self.dani.pk), [])
+
+    def test_common_features_are_not_walked(self):
+        matrix = FeatureMatrix.load(max_postings=1, max_candidates=1)
+        # Ana only holds common features, so her candidates are the first
+        # profiles holding the least common of them
+        self.assertEqual(matrix.neighbours(self.ana.pk), [(self.caio.pk, 0.25)])
+        partial = FeatureMatrix.load([self.ana.pk], max_postings=1, max_candidates=1)
+        self.assertEqual(partial.neighbours(self.ana.pk), [(self.caio.pk, 0.25)])
+        # Nobody else wants Caio's wanted skill, so the candidates are topped
+        # up from the common language
+        self.assertEqual(matrix.neighbours(self.caio.pk), [(self.ana.pk, 0.25)])
+
+    def test_invalid_limit(self):
+        response = self.client.get(f'/users/{self.ana.pk}/similar/', {'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
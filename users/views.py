@@ -1,10 +1,19 @@
-from .models import Profile, Territory, Language, WikimediaProject
+from .models import Profile, SimilarProfile, Territory, TerritoryClosure, Language, WikimediaProject, TAG_FIELDS, tag_through
 from orgs.models import Organization
-from .serializers import ProfileSerializer, TerritorySerializer, LanguageSerializer, WikimediaProjectSerializer, UsersBySkillSerializer, UsersByTagSerializer
-from skills.models import Skill
+from .search import ProfileSearchFilter
+from .tagindex import tag_index, bitmap_members
+from .taxonomy import CachedTaxonomyListMixin
+from .deletion import request_account_deletion
+from .similarity import TOP_K
+from .serializers import ProfileSerializer, TerritorySerializer, LanguageSerializer, WikimediaProjectSerializer, UsersBySkillSerializer, UsersByTagSerializer, profile_cards
+from skills.models import Skill, SkillClosure
 from rest_framework import status, viewsets, filters
 from rest_framework.response import Response
+from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
+from django.db.models import F, Q, Value
+from CapX.conditional import ConditionalGetMixin
+from CapX.fieldsets import SparseFieldsetViewMixin, SPARSE_FIELDSET_PARAMETERS
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiTypes, OpenApiExample, OpenApiResponse
 
 
@@ -12,44 +21,136 @@ from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiPara
     list=extend_schema(
         summary='List all users.',
         description='This endpoint lists all users.',
+        parameters=SPARSE_FIELDSET_PARAMETERS,
     ),
     retrieve=extend_schema(
         summary='Retrieve a user by ID.',
         description='This endpoint retrieves a user by their ID.',
+        parameters=SPARSE_FIELDSET_PARAMETERS,
     ),
 )
-class UsersViewSet(viewsets.ModelViewSet):
+class UsersViewSet(ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     serializer_class = ProfileSerializer
     queryset = Profile.objects.all()
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [ProfileSearchFilter]
+    # Only used on databases without a full-text index
     search_fields = ['user__username', 'user__email', 'display_name', 'about']
     http_method_names = ['get', 'head', 'options']
+    # Profiles are created together with their user, so the primary key
+    # follows the date the user joined
+    cursor_ordering = 'pk'
+    # Maximum number of users retrieved by one batch request
+    batch_limit = 300
 
     def get_queryset(self):
-        queryset = Profile.objects.all()
+        queryset = Profile.objects.with_relations()
         username = self.request.query_params.get('username', None)
         if username is not None:
             queryset = queryset.filter(user__username=username)
-        return queryset
+        return self.sparse_queryset(queryset)
+
+    @extend_schema(
+        summary='Retrieve several users by ID or username.',
+        description='This endpoint retrieves up to 300 users at once, in the order they were requested. ' \
+            'Usernames are matched case-insensitively, and every user matching a username is returned. ' \
+            'Unknown users are left out.',
+        parameters=[
+            OpenApiParameter(
+                'id',
+                OpenApiTypes.INT,
+                OpenApiParameter.QUERY,
+                required=False,
+                many=True,
+                description='ID of a user to retrieve. Repeat the parameter for each user.',
+            ),
+            OpenApiParameter(
+                'username',
+                OpenApiTypes.STR,
+                OpenApiParameter.QUERY,
+                required=False,
+                many=True,
+                description='Username of a user to retrieve. Repeat the parameter for each user.',
+            ),
+            *SPARSE_FIELDSET_PARAMETERS,
+        ],
+    )
+    @action(detail=False)
+    def batch(self, request, *args, **kwargs):
+        ids = request.query_params.getlist('id')
+        usernames = request.query_params.getlist('username')
+        if bool(ids) == bool(usernames):
+            return Response({'message': 'Please provide either IDs or usernames.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) + len(usernames) > self.batch_limit:
+            return Response({'message': f'At most {self.batch_limit} users can be retrieved at once.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(profile_id.isdigit() for profile_id in ids):
+            return Response({'message': 'User IDs must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = Profile.objects.with_relations()
+        if ids:
+            keys = [int(profile_id) for profile_id in ids]
+            queryset = queryset.filter(pk__in=keys)
+        else:
+            keys = [username.lower() for username in usernames]
+            queryset = queryset.filter(user__username_lower__in=keys).annotate(username_lower=F('user__username_lower'))
+        # Usernames differing only in case belong to distinct accounts, which
+        # are all returned for the username, in ID order
+        profiles = {}
+        for profile in self.sparse_queryset(queryset.order_by('pk')):
+            profiles.setdefault(profile.pk if ids else profile.username_lower, []).append(profile)
+        found = [profile for key in dict.fromkeys(keys) for profile in profiles.get(key, [])]
+        return Response(self.get_serializer(found, many=True).data)
+
+    @extend_schema(
+        summary='List the users most similar to a user.',
+        description='This endpoint lists the users with the most similar known skills, wanted skills, ' \
+            'languages and Wikimedia projects, by Jaccard similarity. The list is precomputed ' \
+            'periodically, so recent changes may not be reflected yet.',
+        parameters=[
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                OpenApiParameter.QUERY,
+                required=False,
+                description=f'Maximum number of users to return (default 10, maximum {TOP_K}).',
+            ),
+        ],
+    )
+    @action(detail=True)
+    def similar(self, request, *args, **kwargs):
+        limit = request.query_params.get('limit', '10')
+        if not limit.isdigit() or not 0 < int(limit) <= TOP_K:
+            return Response({'message': f'Limit must be an integer between 1 and {TOP_K}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        profile = get_object_or_404(Profile, pk=kwargs['pk'])
+        neighbours = list(
+            SimilarProfile.objects.filter(profile=profile).order_by('rank')
+            .values('similar_id', 'similar__card', 'score')[:int(limit)]
+        )
+        data = profile_cards({'pk': row['similar_id'], 'card': row['similar__card']} for row in neighbours)
+        for similar, neighbour in zip(data, neighbours):
+            similar['score'] = neighbour['score']
+        return Response(data)
 
 @extend_schema_view(
     list=extend_schema(
         summary='List the profile of the logged-in user.',
         description='This endpoint lists the profile of the logged-in user.',
+        parameters=SPARSE_FIELDSET_PARAMETERS,
     ),
     retrieve=extend_schema(
         summary='Retrieve the profile of the logged-in user.',
         description='This endpoint retrieves the profile of the logged-in user.',
+        parameters=SPARSE_FIELDSET_PARAMETERS,
     ),
 )
-class ProfileViewSet(viewsets.ModelViewSet):
+class ProfileViewSet(ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     serializer_class = ProfileSerializer
     queryset = Profile.objects.all()
     http_method_names = ['get', 'put', 'head', 'delete', 'options']
 
     def get_queryset(self):
         # Only allow the logged-in user to access their own profile
-        return Profile.objects.filter(user=self.request.user)
+        return self.sparse_queryset(Profile.objects.with_relations().filter(user=self.request.user))
 
 
     @extend_schema(
@@ -110,37 +211,73 @@ class ProfileViewSet(viewsets.ModelViewSet):
             no_value = object()
 
             if request.data.get('skills_known', no_value) is no_value:
-                skills_known = set(map(str, instance.skills_known.all().values_list('id', flat=True)))
+                skills_known = {str(skill.pk) for skill in instance.skills_known.all()}
             else:
-                skills_known = set(request.data.get('skills_known'))
+                skills_known = set(map(str, request.data.get('skills_known')))
 
             if request.data.get('skills_available', no_value) is no_value:
-                skills_available = set(map(str, instance.skills_available.all().values_list('id', flat=True)))
+                skills_available = {str(skill.pk) for skill in instance.skills_available.all()}
             else:    
-                skills_available = set(request.data.get('skills_available'))
+                skills_available = set(map(str, request.data.get('skills_available')))
 
             if skills_available - skills_known:
                 response = {'message': 'You cannot add a skill to skills_available that is not in skills_known.'}
                 return Response(response, status=status.HTTP_409_CONFLICT)
             else:
-                return super().update(request, *args, **kwargs)
+                # Update the instance already loaded, with its prefetched relations
+                serializer = self.get_serializer(instance, data=request.data, partial=kwargs.pop('partial', False))
+                serializer.is_valid(raise_exception=True)
+                self.perform_update(serializer)
+                instance._prefetched_objects_cache = {}
+                return Response(serializer.data)
 
     
     @extend_schema(
         summary='Delete the profile of the logged-in user.',
-        description='This endpoint deletes the profile of the logged-in user.',
+        description='This endpoint deletes the profile and the account of the logged-in user. ' \
+            'The account is deactivated right away and deleted in the background.',
+        responses={202: OpenApiResponse(description='The account will be deleted.')},
     )
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         if instance.user == request.user:
             self.perform_destroy(instance)
-            return Response(status=status.HTTP_204_NO_CONTENT)
+            return Response({'message': 'The account will be deleted.'}, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(
+        summary='List skill exchange matches for the logged-in user.',
+        description='This endpoint lists the users who can teach skills the logged-in user wants ' \
+            'to learn, or want to learn skills the logged-in user can teach. Users matching in ' \
+            'both directions are listed first, then by number of matching skills.',
+        parameters=[
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                OpenApiParameter.QUERY,
+                required=False,
+                description='Maximum number of matches to return (default 20, maximum 100).',
+            ),
+        ],
+    )
+    @action(detail=False)
+    def matches(self, request, *args, **kwargs):
+        limit = request.query_params.get('limit', '20')
+        if not limit.isdigit() or not 0 < int(limit) <= 100:
+            return Response({'message': 'Limit must be an integer between 1 and 100.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        profile = get_object_or_404(Profile, user=request.user)
+        matches = profile.skill_matches(limit=int(limit))
+        cards = {row['pk']: row for row in Profile.objects.filter(pk__in=[profile_id for profile_id, _, _ in matches]).cards()}
+
+        data = profile_cards(cards[profile_id] for profile_id, _, _ in matches)
+        for match, (_, can_teach, wants_to_learn) in zip(data, matches):
+            match['can_teach'] = can_teach
+            match['wants_to_learn'] = wants_to_learn
+        return Response(data)
 
     def perform_destroy(self, instance):
-        # Delete the associated CustomUser when a Profile is deleted
-        user = instance.user
-        instance.delete()
-        user.delete()
+        # The profile is deleted together with the associated CustomUser
+        request_account_deletion(instance.user)
 
 @extend_schema_view(
     list=extend_schema(
@@ -156,8 +293,43 @@ class TerritoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Territory.objects.all()
     serializer_class = TerritorySerializer
 
-
-class ListTerritoryViewSet(viewsets.ReadOnlyModelViewSet):
+    @extend_schema(
+        summary='Territory tree with user and organization counts.',
+        description='This endpoint lists the territories as a tree, starting from the territories ' \
+            'without a parent. Each node has the number of users and organizations in the territory ' \
+            'or in any territory under it, each counted once.',
+    )
+    @action(detail=False)
+    def tree(self, request, *args, **kwargs):
+        # One row per territory and parent, with the precomputed counts
+        rows = Territory.objects.values(
+            'id', 'territory_name', 'parent_territory', 'rollup__user_count', 'rollup__organization_count'
+        ).order_by('territory_name', 'id')
+
+        nodes = {}
+        children = {}
+        for row in rows:
+            nodes.setdefault(row['id'], {
+                'id': row['id'],
+                'territory_name': row['territory_name'],
+                'user_count': row['rollup__user_count'] or 0,
+                'organization_count': row['rollup__organization_count'] or 0,
+            })
+            children.setdefault(row['parent_territory'], []).append(row['id'])
+
+        def build(territory_id, path):
+            # Territories with several parents appear under each of them,
+            # and cycles are cut where a territory repeats in the path
+            path = path | {territory_id}
+            return {
+                **nodes[territory_id],
+                'children': [build(child, path) for child in children.get(territory_id, []) if child not in path],
+            }
+
+        return Response([build(territory_id, frozenset()) for territory_id in children.get(None, [])])
+
+
+class ListTerritoryViewSet(CachedTaxonomyListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Territory.objects.all()
     serializer_class = TerritorySerializer
 
@@ -167,15 +339,13 @@ class ListTerritoryViewSet(viewsets.ReadOnlyModelViewSet):
         deprecated=True
     )
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        data = {territory.id: str(territory) for territory in queryset}
-        return Response(data)
+        return super().list(request, *args, **kwargs)
 
     @extend_schema(exclude=True)
     def retrieve(self, request, *args, **kwargs):
         return Response({'message': 'Method not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-class ListLanguageViewSet(viewsets.ReadOnlyModelViewSet):
+class ListLanguageViewSet(CachedTaxonomyListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Language.objects.all()
     serializer_class = LanguageSerializer
 
@@ -185,16 +355,14 @@ class ListLanguageViewSet(viewsets.ReadOnlyModelViewSet):
         deprecated=True
     )
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        data = {language.id: str(language) for language in queryset}
-        return Response(data)
+        return super().list(request, *args, **kwargs)
 
     @extend_schema(exclude=True)
     def retrieve(self, request, *args, **kwargs):
         return Response({'message': 'Method not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
-class ListWikimediaProjectViewSet(viewsets.ReadOnlyModelViewSet):
+class ListWikimediaProjectViewSet(CachedTaxonomyListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = WikimediaProject.objects.all()
     serializer_class = WikimediaProjectSerializer
 
@@ -204,9 +372,7 @@ class ListWikimediaProjectViewSet(viewsets.ReadOnlyModelViewSet):
         deprecated=True
     )
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        data = {project.id: str(project) for project in queryset}
-        return Response(data)
+        return super().list(request, *args, **kwargs)
 
     @extend_schema(exclude=True)
     def retrieve(self, request, *args, **kwargs):
@@ -220,20 +386,42 @@ class UsersBySkillViewSet(viewsets.ReadOnlyModelViewSet):
     @extend_schema(
         summary='List users by skill.',
         description='Deprecated. This endpoint lists users by skill. Please use the /tags/ endpoint instead.',
-        deprecated=True
+        deprecated=True,
+        parameters=[
+            OpenApiParameter(
+                "include_subskills",
+                OpenApiTypes.BOOL,
+                OpenApiParameter.QUERY,
+                required=False,
+                description='Also list the users of every skill under the given one.',
+            ),
+        ],
     )
     def retrieve(self, request, *args, **kwargs):
         skill_id = self.kwargs['pk']
         skill = get_object_or_404(Skill, pk=skill_id)
-
-        known_users = Profile.objects.filter(skills_known=skill)
-        available_users = Profile.objects.filter(skills_available=skill)
-        wanted_users = Profile.objects.filter(skills_wanted=skill)
-        data = {
-            'known': [{'id': user.id, 'display_name': user.display_name, 'username': user.user.username, 'profile_image': user.profile_image} for user in known_users],
-            'available': [{'id': user.id, 'display_name': user.display_name, 'username': user.user.username, 'profile_image': user.profile_image} for user in available_users],
-            'wanted': [{'id': user.id, 'display_name': user.display_name, 'username': user.user.username, 'profile_image': user.profile_image} for user in wanted_users],
-        }
+        if request.query_params.get('include_subskills', 'false').lower() in ('true', '1'):
+            skills = Q(skill_id__in=SkillClosure.objects.filter(ancestor_id=skill.pk).values('descendant_id'))
+        else:
+            skills = Q(skill_id=skill.pk)
+
+        # Read the holders of the skill and their buckets from the through tables alone
+        buckets = {'known': 'skill_known', 'available': 'skill_available', 'wanted': 'skill_wanted'}
+        rows = [
+            tag_through(tag_type)[0].objects.filter(skills)
+            .annotate(bucket=Value(bucket)).values_list('profile_id', 'bucket')
+            for bucket, tag_type in buckets.items()
+        ]
+        holders = {}
+        for profile_id, bucket in rows[0].union(*rows[1:], all=True):
+            holders.setdefault(profile_id, set()).add(bucket)
+
+        cards = Profile.objects.filter(pk__in=holders).order_by('pk').cards()
+        data = {bucket: [] for bucket in buckets}
+        for card in profile_cards(cards):
+            for bucket in buckets:
+                if bucket in holders[card['id']]:
+                    data[bucket].append(card)
         return Response(data)
 
     @extend_schema(exclude=True)
@@ -245,6 +433,7 @@ class UsersBySkillViewSet(viewsets.ReadOnlyModelViewSet):
 class UsersByTagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Profile.objects.all()
     serializer_class = UsersByTagSerializer
+    cursor_ordering = 'pk'
 
     @extend_schema(
         summary='Lists users by tag.',
@@ -265,6 +454,20 @@ class UsersByTagViewSet(viewsets.ReadOnlyModelViewSet):
                 required=True,
                 description='The ID of the tag to search for.',
             ),
+            OpenApiParameter(
+                "include_descendants",
+                OpenApiTypes.BOOL,
+                OpenApiParameter.QUERY,
+                required=False,
+                description='Territory tags only. Also list the users of every territory under the given one.',
+            ),
+            OpenApiParameter(
+                "include_subskills",
+                OpenApiTypes.BOOL,
+                OpenApiParameter.QUERY,
+                required=False,
+                description='Skill tags only. Also list the users of every skill under the given one.',
+            ),
         ],
     )
     def list(self, request, *args, **kwargs):
@@ -273,21 +476,118 @@ class UsersByTagViewSet(viewsets.ReadOnlyModelViewSet):
         if not tag_type or not tag_id:
             return Response({'message': 'Please provide a valid tag type and tag ID.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if tag_type == 'skill_known':
-            queryset = Profile.objects.filter(skills_known__id=tag_id)
-        elif tag_type == 'skill_available':
-            queryset = Profile.objects.filter(skills_available__id=tag_id)
-        elif tag_type == 'skill_wanted':
-            queryset = Profile.objects.filter(skills_wanted__id=tag_id)
-        elif tag_type == 'language':
-            queryset = Profile.objects.filter(language__id=tag_id)
-        elif tag_type == 'territory':
-            queryset = Profile.objects.filter(territory__id=tag_id)
-        elif tag_type == 'wikimedia_project':
-            queryset = Profile.objects.filter(wikimedia_project__id=tag_id)
-        elif tag_type == 'affiliation':
-            queryset = Profile.objects.filter(affiliation__id=tag_id)
-        else:
+        if tag_type not in TAG_FIELDS:
             return Response({'message': 'Invalid tag type. Options are: skill_known, skill_available, skill_wanted, language, territory, wikimedia_project, affiliation.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(self.get_serializer(queryset, many=True).data)
\ No newline at end of file
+        include_descendants = request.query_params.get('include_descendants', 'false').lower() in ('true', '1')
+        if include_descendants and tag_type != 'territory':
+            return Response({'message': 'Descendants can only be included for territory tags.'}, status=status.HTTP_400_BAD_REQUEST)
+        include_subskills = request.query_params.get('include_subskills', 'false').lower() in ('true', '1')
+        if include_subskills and not tag_type.startswith('skill_'):
+            return Response({'message': 'Subskills can only be included for skill tags.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        closure = TerritoryClosure if include_descendants else SkillClosure if include_subskills else None
+        bitmap = None if closure else tag_index.match([(tag_type, tag_id)])
+        if closure:
+            through, column = tag_through(tag_type)
+            descendants = closure.objects.filter(ancestor_id=tag_id).values('descendant_id')
+            queryset = Profile.objects.filter(
+                pk__in=through.objects.filter(**{column + '__in': descendants}).values('profile_id')
+            )
+        elif bitmap is None:
+            queryset = Profile.objects.filter(**{TAG_FIELDS[tag_type] + '__id': tag_id})
+        else:
+            members = bitmap_members(bitmap)
+            queryset = Profile.objects.filter(pk__in=self.paginator.window(request, members))
+
+        # The stored cards are read from the profile table alone. Without a
+        # page, the rows are read in chunks, but the response still holds
+        # every card
+        queryset = queryset.cards()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(profile_cards(page))
+        if bitmap is not None:
+            return Response(profile_cards(member_cards(members)))
+        return Response(profile_cards(queryset.iterator(chunk_size=500)))
+
+
+def member_cards(profile_ids, chunk_size=500):
+    """
+    Yield the card rows of a sorted list of profile IDs, as read by
+    ProfileQuerySet.cards, querying chunk_size IDs at a time so the number
+    of query parameters does not grow with the list.
+    """
+    for start in range(0, len(profile_ids), chunk_size):
+        yield from Profile.objects.filter(pk__in=profile_ids[start:start + chunk_size]).order_by('pk').cards()
+
+
+class TagSearchViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Profile.objects.all()
+    serializer_class = UsersByTagSerializer
+    cursor_ordering = 'pk'
+
+    @extend_schema(
+        summary='Search users by several tags.',
+        description='This endpoint lists the users matching a combination of tags, ' \
+            'together with the number of matching users for each tag (facets). ' \
+            'Each tag type takes a comma-separated list of tag IDs.',
+        parameters=[
+            *[
+                OpenApiParameter(
+                    tag_type,
+                    OpenApiTypes.STR,
+                    OpenApiParameter.QUERY,
+                    required=False,
+                    description=f'Comma-separated IDs of the {tag_type} tags to search for.',
+                )
+                for tag_type in TAG_FIELDS
+            ],
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                OpenApiParameter.QUERY,
+                required=False,
+                description='Whether users must have all the tags or any of them. Defaults to all.',
+                enum=['all', 'any'],
+            ),
+        ],
+    )
+    def list(self, request, *args, **kwargs):
+        tags = []
+        for tag_type in TAG_FIELDS:
+            value = request.query_params.get(tag_type)
+            if not value:
+                continue
+            ids = value.split(',')
+            if not all(tag_id.isdigit() for tag_id in ids):
+                return Response({'message': f'Tag IDs of {tag_type} must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+            tags += [(tag_type, int(tag_id)) for tag_id in ids]
+
+        if not tags:
+            return Response({'message': 'Please provide at least one tag.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        match = request.query_params.get('match', 'all')
+        if match not in ('all', 'any'):
+            return Response({'message': 'Invalid match. Options are: all, any.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        bitmap = tag_index.match(tags, match_all=match == 'all')
+        if bitmap is None:
+            queryset = Profile.objects.with_tags(tags, match_all=match == 'all')
+            facets = queryset.tag_facets()
+        else:
+            members = bitmap_members(bitmap)
+            queryset = Profile.objects.filter(pk__in=self.paginator.window(request, members))
+            facets = tag_index.facets(bitmap)
+
+        queryset = queryset.cards()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(profile_cards(page))
+            response.data['facets'] = facets
+            return response
+        rows = queryset.iterator(chunk_size=500) if bitmap is None else member_cards(members)
+        return Response({
+            'results': profile_cards(rows),
+            'facets': facets,
+        })
\ No newline at end of file